@@ -0,0 +1,51 @@
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+import os
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from pathlib import Path
+from pymongo import UpdateOne
+
+from broadcasts import LAST_VISIT_BACKFILL_ID
+
+# Load .env file
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# MongoDB connection
+mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+db_name = os.environ.get('DB_NAME', 'carwash_db')
+
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
+db = client[db_name]
+
+BATCH_SIZE = 500
+
+async def backfill_last_visit():
+    print("🔄 Setting customers.last_visit_at from transactions...")
+    cursor = db.transactions.aggregate([
+        {"$match": {"customer_id": {"$type": "string"}}},
+        {"$group": {"_id": "$customer_id", "last_visit": {"$max": "$created_at"}}},
+    ], allowDiskUse=True)
+
+    updated = 0
+    operations = []
+    async for row in cursor:
+        # $max keeps a newer visit recorded by the running app
+        operations.append(UpdateOne({"id": row['_id']}, {"$max": {"last_visit_at": row['last_visit']}}))
+        if len(operations) >= BATCH_SIZE:
+            updated += (await db.customers.bulk_write(operations, ordered=False)).modified_count
+            operations = []
+    if operations:
+        updated += (await db.customers.bulk_write(operations, ordered=False)).modified_count
+    # Lets the server offer the lapsed broadcast segment
+    await db.migrations.update_one(
+        {"_id": LAST_VISIT_BACKFILL_ID},
+        {"$set": {"done": True, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    print(f"✅ Updated {updated} customers")
+
+if __name__ == "__main__":
+    asyncio.run(backfill_last_visit())
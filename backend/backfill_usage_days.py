@@ -0,0 +1,61 @@
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+import os
+
+from dotenv import load_dotenv
+from pathlib import Path
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from membership_usage import usage_day
+
+# Load .env file
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# MongoDB connection
+mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+db_name = os.environ.get('DB_NAME', 'carwash_db')
+outlet_timezone = os.environ.get('OUTLET_TIMEZONE', 'Asia/Jakarta')
+
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
+db = client[db_name]
+
+BATCH_SIZE = 500
+DUPLICATE_KEY = 11000
+
+async def write(operations: list) -> tuple:
+    try:
+        result = await db.membership_usage.bulk_write(operations, ordered=False)
+        return result.modified_count, 0
+    except BulkWriteError as e:
+        errors = e.details.get('writeErrors', [])
+        if any(err.get('code') != DUPLICATE_KEY for err in errors):
+            raise
+        return e.details.get('nModified', 0), len(errors)
+
+async def backfill_usage_days():
+    print(f"🔄 Stamping membership_usage.day ({outlet_timezone})...")
+    cursor = db.membership_usage.find(
+        {"day": {"$exists": False}, "used_at": {"$type": "date"}}, {"_id": 1, "used_at": 1}
+    ).sort("used_at", 1)
+
+    updated = 0
+    duplicates = 0
+    operations = []
+    async for usage in cursor:
+        operations.append(UpdateOne({"_id": usage['_id']}, {"$set": {"day": usage_day(usage['used_at'], outlet_timezone)}}))
+        if len(operations) >= BATCH_SIZE:
+            modified, skipped = await write(operations)
+            updated += modified
+            duplicates += skipped
+            operations = []
+    if operations:
+        modified, skipped = await write(operations)
+        updated += modified
+        duplicates += skipped
+    # Where a day already had repeats, one record holds the day key and the rest stay unstamped
+    print(f"✅ Stamped {updated} usage records" + (f", {duplicates} same-day repeats left unstamped" if duplicates else ""))
+
+if __name__ == "__main__":
+    asyncio.run(backfill_usage_days())
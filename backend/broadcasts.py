@@ -0,0 +1,137 @@
+"""
+Broadcasts Module
+Promotion broadcasts to customer segments, queued through the notification queue
+"""
+
+from datetime import datetime, timedelta, timezone
+from string import Template
+from typing import Optional
+
+from dates import as_datetime
+
+BROADCAST_BATCH_SIZE = 500
+
+SEGMENTS = ["all", "active_members", "lapsed"]
+
+DEFAULT_TEMPLATE = (
+    "Halo $name! Promo $promo_name di OTOPIA Car Wash: gunakan kode *$code* "
+    "untuk potongan $value. Berlaku sampai $end_date."
+)
+
+PLACEHOLDERS = ["name", "promo_name", "code", "value", "end_date"]
+
+# db.migrations checkpoint written by backfill_last_visit.py
+LAST_VISIT_BACKFILL_ID = "last-visit"
+
+
+def compile_template(text: str) -> Template:
+    """Compile a message template; raises ValueError for unknown or malformed placeholders"""
+    template = Template(text)
+    try:
+        template.substitute({key: "" for key in PLACEHOLDERS})
+    except KeyError as e:
+        raise ValueError(f"Unknown placeholder ${e.args[0]} (available: {', '.join(PLACEHOLDERS)})")
+    return template
+
+
+def promotion_fields(promotion: dict) -> dict:
+    end_date = as_datetime(promotion['end_date'])
+    if promotion['promotion_type'] == "percentage":
+        value = f"{promotion['value']:g}%"
+    else:
+        value = f"Rp {promotion['value']:,.0f}".replace(',', '.')
+    return {
+        "promo_name": promotion['name'],
+        "code": promotion['code'],
+        "value": value,
+        "end_date": end_date.strftime('%d/%m/%Y') if end_date else '-',
+    }
+
+
+def recipients(db, segment: str, days_inactive: int):
+    """Cursor of {id, name, phone} for a segment, each served by an index"""
+    projection = {"_id": 0, "id": 1, "name": 1, "phone": 1}
+    if segment == "active_members":
+        return db.memberships.aggregate([
+            {"$match": {"end_date": {"$gte": datetime.now(timezone.utc)}}},
+            {"$group": {"_id": "$customer_id"}},
+            {"$lookup": {"from": "customers", "localField": "_id", "foreignField": "id", "as": "customer"}},
+            {"$unwind": "$customer"},
+            {"$replaceRoot": {"newRoot": "$customer"}},
+            {"$project": projection},
+        ], batchSize=BROADCAST_BATCH_SIZE)
+    if segment == "lapsed":
+        cutoff = datetime.now(timezone.utc) - timedelta(days=days_inactive)
+        # Customers without a recorded visit count as lapsed once they joined before the cutoff
+        query = {"$or": [
+            {"last_visit_at": {"$lt": cutoff}},
+            {"last_visit_at": None, "join_date": {"$lt": cutoff}},
+        ]}
+        return db.customers.find(query, projection, batch_size=BROADCAST_BATCH_SIZE)
+    return db.customers.find({}, projection, batch_size=BROADCAST_BATCH_SIZE)
+
+
+async def last_visit_backfilled(db) -> bool:
+    """
+    Whether customers.last_visit_at covers visits from before it was maintained; until then
+    the lapsed segment would include every regular customer. Recorded as done when no
+    customer-linked transaction exists (nothing to backfill).
+    """
+    if await db.migrations.find_one({"_id": LAST_VISIT_BACKFILL_ID, "done": True}, {"_id": 1}):
+        return True
+    if await db.transactions.find_one({"customer_id": {"$type": "string"}}, {"_id": 1}):
+        return False
+    await db.migrations.update_one(
+        {"_id": LAST_VISIT_BACKFILL_ID},
+        {"$set": {"done": True, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    return True
+
+
+async def queue_broadcast(db, notifications, broadcast: dict, promotion: dict) -> dict:
+    """
+    Render and queue one message per recipient of a broadcast
+
+    Messages carry `broadcast:<id>:<customer>` dedupe keys, so running this again
+    for the same broadcast (e.g. an outbox retry) queues nothing twice.
+    """
+    template = compile_template(broadcast['template'])
+    fields = promotion_fields(promotion)
+    queued = 0
+    recipient_count = 0
+    skipped = 0
+    docs = []
+    async for customer in recipients(db, broadcast['segment'], broadcast.get('days_inactive') or 60):
+        if not customer.get('phone'):
+            skipped += 1
+            continue
+        recipient_count += 1
+        docs.append(notifications.build(
+            "promotion", customer['phone'],
+            template.safe_substitute(fields, name=customer.get('name', '')),
+            reference=broadcast['id'], dedupe_key=f"broadcast:{broadcast['id']}:{customer['id']}"
+        ))
+        if len(docs) >= BROADCAST_BATCH_SIZE:
+            queued += await notifications.enqueue_many(docs)
+            docs = []
+    if docs:
+        queued += await notifications.enqueue_many(docs)
+
+    summary = {"recipients": recipient_count, "skipped_no_phone": skipped, "status": "queued",
+               "queued_at": datetime.now(timezone.utc)}
+    await db.broadcasts.update_one({"id": broadcast['id']}, {"$set": summary})
+    return {**summary, "newly_queued": queued}
+
+
+async def broadcast_progress(db, broadcast_id: str) -> Optional[dict]:
+    """A broadcast with its messages counted by delivery status"""
+    broadcast = await db.broadcasts.find_one({"id": broadcast_id}, {"_id": 0})
+    if not broadcast:
+        return None
+    counts = await db.notifications.aggregate([
+        {"$match": {"reference": broadcast_id}},
+        {"$group": {"_id": "$status", "count": {"$sum": 1}}},
+    ]).to_list(None)
+    broadcast['delivery'] = {row['_id']: row['count'] for row in counts}
+    return broadcast
@@ -0,0 +1,99 @@
+"""
+Cache Helper Module
+In-process TTL cache with write invalidation and single-flight computation
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class _LeaderCancelled(Exception):
+    """The computation a waiter was sharing was cancelled with its caller"""
+
+
+class TTLCache:
+    """
+    Small LRU cache whose entries expire after `ttl_seconds`
+
+    Concurrent misses for the same key share one computation. `invalidate`
+    bumps a generation counter, so a computation that started before a write
+    still answers its waiters but is not stored.
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int = 128):
+        self.ttl = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._generation = 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key: Optional[Hashable] = None):
+        """Drop one key, or everything when no key is given"""
+        self._generation += 1
+        if key is None:
+            self._entries.clear()
+            self._inflight.clear()
+        else:
+            self._entries.pop(key, None)
+            self._inflight.pop(key, None)
+
+    async def get_or_compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        while True:
+            value = self.get(key)
+            if value is not None:
+                return value
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                return await self._compute(key, compute)
+            try:
+                return await asyncio.shield(inflight)
+            except _LeaderCancelled:
+                # The caller computing this key went away; one of the waiters takes over
+                continue
+
+    async def _compute(self, key: Hashable, compute: Callable[[], Awaitable[Any]]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        generation = self._generation
+        try:
+            value = await compute()
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception retrieved when nobody else was waiting
+            future.exception()
+            raise
+        except BaseException:
+            # Only this caller was cancelled; waiters retry instead of being cancelled too
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            if generation == self._generation:
+                self.set(key, value)
+            return value
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
@@ -0,0 +1,190 @@
+"""
+Daily Sales Module
+Incrementally maintained per-(outlet, local date) sales rollup
+"""
+
+import re
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
+from zoneinfo import ZoneInfo
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from outbox import APPLIED_FIELD, already_applied, apply_once, record_applied
+
+NO_OUTLET = "none"
+DUPLICATE_KEY = 11000
+
+
+def _field_key(value: str) -> str:
+    """Make a value safe to use as a field name inside an update path"""
+    return re.sub(r'[.$]', '_', str(value))
+
+
+def _created_at(transaction: dict) -> datetime:
+    created_at = transaction['created_at']
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at
+
+
+def add_transaction(updates: Dict[str, dict], transaction: dict, tz: ZoneInfo) -> str:
+    """Merge one transaction's increments into `updates` (rollup _id -> {"key", "inc", "set"}); returns the _id"""
+    local = _created_at(transaction).astimezone(tz)
+    outlet_id = transaction.get('outlet_id') or NO_OUTLET
+    day = local.strftime("%Y-%m-%d")
+    doc_id = f"{outlet_id}:{day}"
+
+    update = updates.setdefault(doc_id, {
+        "key": {"outlet_id": outlet_id, "date": day},
+        "inc": {},
+        "set": {}
+    })
+    inc = update['inc']
+    total = transaction.get('total', 0)
+
+    def add(path, amount):
+        inc[path] = inc.get(path, 0) + amount
+
+    add("revenue", total)
+    add("count", 1)
+    add("commission", transaction.get('total_commission', 0))
+    add(f"payments.{_field_key(transaction.get('payment_method', 'unknown'))}", total)
+
+    kasir = _field_key(transaction.get('kasir_id', 'unknown'))
+    add(f"kasir.{kasir}.revenue", total)
+    add(f"kasir.{kasir}.count", 1)
+    update['set'][f"kasir.{kasir}.name"] = transaction.get('kasir_name', 'Unknown')
+
+    hour = local.strftime("%H")
+    add(f"hours.{hour}.revenue", total)
+    add(f"hours.{hour}.count", 1)
+
+    for item in transaction.get('items', []):
+        name = item.get('service_name') or item.get('product_name') or 'Unknown'
+        service = _field_key(item.get('service_id') or item.get('product_id') or name)
+        quantity = item.get('quantity', 1)
+        add(f"services.{service}.quantity", quantity)
+        add(f"services.{service}.revenue", item.get('price', 0) * quantity)
+        update['set'][f"services.{service}.name"] = name
+    return doc_id
+
+
+def rollup_operations(updates: Dict[str, dict], key: Optional[str] = None):
+    """
+    Upserts for the rollup; with an apply `key`, a day that already recorded the key
+    is skipped (its upsert then fails with a duplicate _id, which callers ignore)
+    """
+    now = datetime.now(timezone.utc)
+    not_applied, mark_applied = apply_once(key) if key else ({}, None)
+    operations = []
+    for doc_id, update in updates.items():
+        change = {
+            "$inc": update['inc'],
+            "$set": {**update['set'], "updated_at": now},
+            "$setOnInsert": update['key']
+        }
+        if mark_applied:
+            change["$push"] = mark_applied
+        operations.append(UpdateOne({"_id": doc_id, **not_applied}, change, upsert=True))
+    return operations
+
+
+async def apply_transactions(db, transactions: Iterable[dict], tz_name: str, key: Optional[str] = None) -> int:
+    """Add stored transactions to the rollup with one bulk_write; returns documents touched"""
+    tz = ZoneInfo(tz_name)
+    updates = {}
+    for transaction in transactions:
+        add_transaction(updates, transaction, tz)
+    if not updates or (key and await already_applied(db, key, "daily_sales")):
+        return 0
+    try:
+        await db.daily_sales.bulk_write(rollup_operations(updates, key), ordered=False)
+    except BulkWriteError as e:
+        # Duplicate _id: the day already has this key applied
+        if any(err.get('code') != DUPLICATE_KEY for err in e.details.get('writeErrors', [])):
+            raise
+    if key:
+        await record_applied(db, key, "daily_sales", {"_id": {"$in": list(updates)}})
+    return len(updates)
+
+
+async def rebuild(db, tz_name: str, batch_size: int = 1000) -> int:
+    """
+    Regenerate the whole rollup from raw transactions
+
+    Safe to run while the server takes sales. Increments applied to the old
+    collection during the rebuild are lost at the swap, but only for
+    transactions the scan already counted. Outbox effects still pending for
+    counted transactions have their apply key recorded on the rebuilt days, so
+    applying them after the swap is a no-op; sales stored after the scan are
+    applied normally.
+    """
+    tz = ZoneInfo(tz_name)
+    updates = {}
+    counted = {}  # transaction id -> rollup _id
+    cursor = db.transactions.find(
+        {},
+        {"_id": 0, "id": 1, "created_at": 1, "outlet_id": 1, "total": 1, "total_commission": 1, "payment_method": 1,
+         "kasir_id": 1, "kasir_name": 1, "items": 1}
+    ).batch_size(batch_size)
+    async for transaction in cursor:
+        counted[transaction['id']] = add_transaction(updates, transaction, tz)
+
+    # Scanned after the transactions, so every counted sale with an unapplied effect is seen
+    applied = {}
+    pending = db.outbox.find(
+        {"status": {"$in": ["pending", "processing", "failed"]}, "source_collection": "transactions",
+         "pending": "daily_sales"},
+        {"_id": 0, "id": 1, "payload.transaction_ids": 1}
+    ).sort("created_at", 1)
+    async for event in pending:
+        for transaction_id in event['payload'].get('transaction_ids', []):
+            if transaction_id in counted:
+                keys = applied.setdefault(counted[transaction_id], [])
+                key = f"{event['id']}:daily_sales"
+                if key not in keys:
+                    keys.append(key)
+    for doc_id, keys in applied.items():
+        updates[doc_id]['set'][APPLIED_FIELD] = keys
+
+    # Build aside and swap in, so readers never see a half-built rollup
+    await db.daily_sales_rebuild.drop()
+    operations = rollup_operations(updates)
+    for start in range(0, len(operations), batch_size):
+        await db.daily_sales_rebuild.bulk_write(operations[start:start + batch_size], ordered=False)
+    if operations:
+        await db.daily_sales_rebuild.rename("daily_sales", dropTarget=True)
+    else:
+        await db.daily_sales.delete_many({})
+    return len(operations)
+
+
+async def period_totals(db, date_from: str, date_to: str, outlet_id: Optional[str] = None) -> dict:
+    """Sum the rollup between two local dates (YYYY-MM-DD, inclusive)"""
+    query = {"date": {"$gte": date_from, "$lte": date_to}}
+    if outlet_id:
+        query["outlet_id"] = outlet_id
+    days = await db.daily_sales.find(query, {"_id": 0, APPLIED_FIELD: 0}).sort("date", 1).to_list(None)
+
+    totals = {"revenue": 0, "count": 0, "commission": 0, "payments": {}, "services": {}, "kasir": {}, "hours": {}}
+    for day in days:
+        for field in ("revenue", "count", "commission"):
+            totals[field] += day.get(field, 0)
+        for method, amount in day.get('payments', {}).items():
+            totals['payments'][method] = totals['payments'].get(method, 0) + amount
+        for group in ("services", "kasir", "hours"):
+            for key, values in day.get(group, {}).items():
+                entry = totals[group].setdefault(key, {})
+                for field, value in values.items():
+                    if isinstance(value, (int, float)):
+                        entry[field] = entry.get(field, 0) + value
+                    else:
+                        entry[field] = value
+
+    totals['days'] = [
+        {"date": day['date'], "outlet_id": day['outlet_id'], "revenue": day.get('revenue', 0), "count": day.get('count', 0)}
+        for day in days
+    ]
+    return totals
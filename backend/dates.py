@@ -0,0 +1,93 @@
+"""
+Dates Module
+Native BSON datetimes, with a tolerant read path for records written as ISO strings
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+from zoneinfo import ZoneInfo
+
+MIGRATION_ID = "native-dates"
+
+# Date fields that older versions stored as ISO strings
+DATE_FIELDS = {
+    "users": ["created_at"],
+    "outlets": ["created_at"],
+    "shifts": ["opened_at", "closed_at", "start_time", "end_time"],
+    "petty_cash_logs": ["created_at"],
+    "customers": ["join_date", "created_at"],
+    "memberships": ["start_date", "end_date", "created_at", "last_used"],
+    "membership_usage": ["used_at"],
+    "transactions": ["created_at"],
+    "services": ["created_at"],
+    "products": ["created_at"],
+    "inventory": ["last_purchase_date", "created_at"],
+    "inventory_logs": ["created_at"],
+    "promotions": ["start_date", "end_date", "created_at"],
+    "expenses": ["date", "created_at"],
+    "payouts": ["date"],
+    "landing_config": ["updated_at"],
+}
+
+
+def parse_date(value: str) -> Optional[datetime]:
+    """Parse an ISO string (with or without offset / trailing Z) as a UTC datetime"""
+    try:
+        parsed = datetime.fromisoformat(value.strip())
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def as_datetime(value) -> Optional[datetime]:
+    """
+    A stored date as an aware datetime, also when migrate_dates.py has not converted it yet;
+    None when it is missing or unreadable. Only for values used in Python; range queries
+    still need the migration.
+    """
+    if isinstance(value, str):
+        return parse_date(value)
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    return None
+
+
+def days_left(end_date, now: datetime) -> int:
+    """Whole days until a stored end date; 0 once it has passed or when it is unreadable"""
+    end = as_datetime(end_date)
+    return max((end - now).days, 0) if end else 0
+
+
+def day_bounds(at: datetime, tz_name: str) -> Tuple[datetime, datetime]:
+    """UTC start and end of the outlet-local day containing `at`"""
+    start = at.astimezone(ZoneInfo(tz_name)).replace(hour=0, minute=0, second=0, microsecond=0)
+    end = start + timedelta(days=1)
+    return start.astimezone(timezone.utc), end.astimezone(timezone.utc)
+
+
+def string_filter(fields: list) -> dict:
+    return {"$or": [{field: {"$type": "string"}} for field in fields]}
+
+
+async def unmigrated_collections(db) -> list:
+    """
+    Collections that still hold ISO string dates. A collection found clean is
+    checkpointed as done, so each one is scanned at most until it is migrated.
+    """
+    state = await db.migrations.find_one({"_id": MIGRATION_ID}, {"progress": 1}) or {}
+    progress = state.get("progress", {})
+    pending = []
+    for name, fields in DATE_FIELDS.items():
+        if progress.get(name, {}).get("done"):
+            continue
+        if await db[name].find_one(string_filter(fields), {"_id": 1}):
+            pending.append(name)
+            continue
+        await db.migrations.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {f"progress.{name}.done": True, "updated_at": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+    return pending
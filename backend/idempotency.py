@@ -0,0 +1,106 @@
+"""
+Idempotency Module
+Replays the stored response for retried requests that carry the same Idempotency-Key
+"""
+
+import asyncio
+import hashlib
+import json
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from pymongo.errors import DuplicateKeyError
+
+
+def fingerprint(body: Any) -> str:
+    """Stable hash of a request body, to detect a key reused for a different request"""
+    encoded = json.dumps(jsonable_encoder(body), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class IdempotencyStore:
+    """Idempotency keys backed by the `idempotency_keys` collection (expired by a TTL index)"""
+
+    def __init__(self, db, ttl_hours: int = 24, lease_seconds: int = 60):
+        self.db = db
+        self.ttl_seconds = ttl_hours * 3600
+        self.lease = timedelta(seconds=lease_seconds)
+
+    async def ensure_indexes(self):
+        await self.db.idempotency_keys.create_index("created_at", expireAfterSeconds=self.ttl_seconds)
+
+    async def run(self, scope: str, key: Optional[str], handler: Callable[[], Awaitable[Any]],
+                  body: Any = None) -> Any:
+        """
+        Run `handler` once per (scope, key)
+
+        The first request claims the key with an owner token and a short lease, which
+        it renews while the handler runs, and stores the handler's response; retries
+        get that response back without running the handler again. If the handler
+        fails the claim is released so the client can retry, and a claim whose lease
+        ran out (the process died mid-request) is taken over by the next retry.
+        Releasing and completing only touch a claim this request still owns. A key
+        reused with a different `body` is rejected with 422. Without a key the handler
+        simply runs.
+        """
+        if not key:
+            return await handler()
+
+        doc_id = f"{scope}:{key}"
+        body_hash = fingerprint(body)
+        owner = str(uuid.uuid4())
+        now = datetime.now(timezone.utc)
+        try:
+            await self.db.idempotency_keys.insert_one({
+                "_id": doc_id,
+                "status": "in_progress",
+                "owner": owner,
+                "fingerprint": body_hash,
+                "locked_until": now + self.lease,
+                "created_at": now
+            })
+        except DuplicateKeyError:
+            existing = await self.db.idempotency_keys.find_one({"_id": doc_id}) or {}
+            if existing.get('fingerprint', body_hash) != body_hash:
+                raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+            if existing.get('status') == 'completed':
+                return existing['response']
+            # Take over a claim whose owner stopped renewing it (e.g. crashed mid-request)
+            taken = await self.db.idempotency_keys.find_one_and_update(
+                {"_id": doc_id, "status": "in_progress", "locked_until": {"$not": {"$gte": now}}},
+                {"$set": {"locked_until": now + self.lease, "owner": owner, "fingerprint": body_hash}}
+            )
+            if not taken:
+                raise HTTPException(status_code=409, detail="Request with this Idempotency-Key is still being processed")
+
+        claim = {"_id": doc_id, "owner": owner}
+        renewal = asyncio.create_task(self._renew(claim))
+        try:
+            result = await handler()
+        except BaseException:
+            renewal.cancel()
+            await self.db.idempotency_keys.delete_one(claim)
+            raise
+        renewal.cancel()
+
+        await self.db.idempotency_keys.update_one(
+            claim,
+            {"$set": {"status": "completed", "response": jsonable_encoder(result)},
+             "$unset": {"locked_until": "", "owner": ""}}
+        )
+        return result
+
+    async def _renew(self, claim: dict):
+        """Extend the lease every third of its length until cancelled or the claim is lost"""
+        interval = self.lease.total_seconds() / 3
+        while True:
+            await asyncio.sleep(interval)
+            result = await self.db.idempotency_keys.update_one(
+                {**claim, "status": "in_progress"},
+                {"$set": {"locked_until": datetime.now(timezone.utc) + self.lease}}
+            )
+            if not result.matched_count:
+                return
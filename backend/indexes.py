@@ -0,0 +1,202 @@
+"""
+Indexes Module
+Declared MongoDB indexes, created idempotently at application startup
+"""
+
+import logging
+from typing import Dict, List
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+
+def _unique_id(collection: str) -> IndexModel:
+    return IndexModel([("id", ASCENDING)], name=f"{collection}_id_unique", unique=True)
+
+
+# Every query path in server.py and the workers should be served by one of these.
+# Names are explicit so the startup audit can compare declared and existing indexes.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        _unique_id("users"),
+        IndexModel([("username", ASCENDING)], name="users_username_unique", unique=True),
+        IndexModel([("outlet_id", ASCENDING), ("is_active", ASCENDING)], name="users_outlet_active"),
+        IndexModel([("role", ASCENDING), ("is_active", ASCENDING)], name="users_role_active"),
+    ],
+    "outlets": [
+        _unique_id("outlets"),
+        IndexModel([("is_active", ASCENDING)], name="outlets_active"),
+    ],
+    "shifts": [
+        _unique_id("shifts"),
+        IndexModel([("kasir_id", ASCENDING), ("status", ASCENDING)], name="shifts_kasir_status"),
+        # At most one open shift per cashier
+        IndexModel(
+            [("kasir_id", ASCENDING)], name="shifts_one_open_per_kasir", unique=True,
+            partialFilterExpression={"status": "open"}
+        ),
+        IndexModel([("opened_at", DESCENDING)], name="shifts_opened_at"),
+    ],
+    "petty_cash_logs": [
+        IndexModel([("shift_id", ASCENDING), ("created_at", DESCENDING)], name="petty_cash_shift_created"),
+    ],
+    "customers": [
+        _unique_id("customers"),
+        IndexModel([("phone", ASCENDING)], name="customers_phone"),
+        # Lapsed-customer broadcast segment
+        IndexModel([("last_visit_at", ASCENDING), ("join_date", ASCENDING)], name="customers_last_visit_join"),
+    ],
+    "memberships": [
+        _unique_id("memberships"),
+        IndexModel([("customer_id", ASCENDING), ("end_date", DESCENDING)], name="memberships_customer_end"),
+        IndexModel([("status", ASCENDING), ("end_date", ASCENDING)], name="memberships_status_end"),
+        IndexModel([("end_date", ASCENDING)], name="memberships_end_date"),
+    ],
+    "membership_usage": [
+        IndexModel([("membership_id", ASCENDING), ("used_at", DESCENDING)], name="membership_usage_membership_used"),
+        # One usage per membership per outlet-local day; records from before the day key are not covered
+        IndexModel(
+            [("membership_id", ASCENDING), ("day", ASCENDING)], name="membership_usage_membership_day_unique", unique=True,
+            partialFilterExpression={"day": {"$type": "string"}}
+        ),
+    ],
+    "services": [
+        _unique_id("services"),
+        IndexModel([("is_active", ASCENDING)], name="services_active"),
+    ],
+    "products": [
+        _unique_id("products"),
+        IndexModel([("is_active", ASCENDING)], name="products_active"),
+    ],
+    "inventory": [
+        _unique_id("inventory"),
+    ],
+    "inventory_logs": [
+        # Deterministic ids make a retried deduction reuse its ledger rows
+        _unique_id("inventory_logs"),
+        IndexModel([("inventory_id", ASCENDING), ("created_at", DESCENDING)], name="inventory_logs_item_created"),
+    ],
+    "transactions": [
+        _unique_id("transactions"),
+        IndexModel([("invoice_number", ASCENDING)], name="transactions_invoice_number_unique", unique=True),
+        # Offline POS sync dedupe; only sales uploaded through /transactions/batch carry a client_ref
+        IndexModel(
+            [("client_ref", ASCENDING)], name="transactions_client_ref_unique", unique=True,
+            partialFilterExpression={"client_ref": {"$type": "string"}}
+        ),
+        # Keyset pagination and filters for GET /transactions, dashboard and reports ranges
+        IndexModel([("created_at", DESCENDING), ("id", DESCENDING)], name="transactions_created"),
+        IndexModel([("kasir_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="transactions_kasir_created"),
+        IndexModel([("customer_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="transactions_customer_created"),
+        IndexModel([("shift_id", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="transactions_shift_created"),
+        IndexModel([("payment_method", ASCENDING), ("created_at", DESCENDING), ("id", DESCENDING)], name="transactions_payment_created"),
+        IndexModel([("outlet_id", ASCENDING), ("created_at", DESCENDING)], name="transactions_outlet_created"),
+    ],
+    "promotions": [
+        _unique_id("promotions"),
+        # Active promo codes are unique; retired promotions may reuse a code
+        IndexModel(
+            [("code", ASCENDING)], name="promotions_active_code_unique", unique=True,
+            partialFilterExpression={"is_active": True}
+        ),
+    ],
+    "expenses": [
+        _unique_id("expenses"),
+        IndexModel([("date", DESCENDING)], name="expenses_date"),
+    ],
+    "payouts": [
+        IndexModel([("date", DESCENDING)], name="payouts_date"),
+    ],
+    "landing_config": [
+        _unique_id("landing_config"),
+    ],
+    "daily_sales": [
+        IndexModel([("date", ASCENDING), ("outlet_id", ASCENDING)], name="daily_sales_date_outlet"),
+    ],
+    "notifications": [
+        _unique_id("notifications"),
+        IndexModel([("status", ASCENDING), ("priority", ASCENDING), ("available_at", ASCENDING)],
+                   name="notifications_status_priority_available"),
+        IndexModel([("status", ASCENDING), ("locked_at", ASCENDING)], name="notifications_status_locked"),
+        IndexModel([("status", ASCENDING), ("created_at", DESCENDING)], name="notifications_status_created"),
+        IndexModel([("created_at", DESCENDING)], name="notifications_created"),
+        # Per-broadcast delivery progress
+        IndexModel([("reference", ASCENDING), ("status", ASCENDING)], name="notifications_reference_status"),
+        # Receipts and reminders carry a dedupe_key so retries never queue them twice
+        IndexModel(
+            [("dedupe_key", ASCENDING)], name="notifications_dedupe_key_unique", unique=True,
+            partialFilterExpression={"dedupe_key": {"$type": "string"}}
+        ),
+    ],
+    "broadcasts": [
+        _unique_id("broadcasts"),
+        IndexModel([("created_at", DESCENDING)], name="broadcasts_created"),
+    ],
+    "outbox": [
+        IndexModel([("status", ASCENDING), ("available_at", ASCENDING)], name="outbox_status_available"),
+        IndexModel([("status", ASCENDING), ("locked_at", ASCENDING)], name="outbox_status_locked"),
+    ],
+    "applied_effects": [
+        IndexModel([("key", ASCENDING), ("target", ASCENDING)], name="applied_effects_key_target_unique", unique=True),
+        # Far longer than an event can stay pending or be redelivered
+        IndexModel([("applied_at", ASCENDING)], name="applied_effects_applied_ttl", expireAfterSeconds=30 * 24 * 3600),
+    ],
+}
+
+# Older indexes superseded by a declared index on the same keys: collection -> {old name: declared name}
+REPLACED_INDEXES: Dict[str, Dict[str, str]] = {
+    "transactions": {"transactions_invoice_number": "transactions_invoice_number_unique"},
+}
+
+# Raised when an index with the same keys already exists under another name
+INDEX_OPTIONS_CONFLICT = 85
+
+
+async def ensure_indexes(db) -> Dict[str, List[str]]:
+    """
+    Create every declared index (no-op when it already exists) and log the difference
+    between declared and existing indexes. A failing index (e.g. a unique index over
+    duplicate legacy data) is logged and does not stop startup.
+
+    Collections not listed in INDEXES (e.g. idempotency_keys, whose TTL index is owned by
+    IdempotencyStore) are not audited. Returns {"failed": [...], "extra": [...]} as
+    "collection.index" names.
+    """
+    report = {"failed": [], "extra": []}
+    for collection, models in INDEXES.items():
+        replaced = {new: old for old, new in REPLACED_INDEXES.get(collection, {}).items()}
+        existing_names = set(await db[collection].index_information()) if replaced else set()
+        for model in models:
+            name = model.document['name']
+            old = replaced.get(name)
+            if old in existing_names:
+                try:
+                    await db[collection].drop_index(old)
+                except OperationFailure:
+                    # Dropped by another process starting at the same time
+                    pass
+            try:
+                await db[collection].create_indexes([model])
+            except OperationFailure as e:
+                if e.code == INDEX_OPTIONS_CONFLICT:
+                    logger.warning("Index %s.%s already exists under another name: %s", collection, name, e)
+                    continue
+                report['failed'].append(f"{collection}.{name}")
+                logger.error("Index %s.%s could not be created: %s", collection, name, e)
+                if old in existing_names:
+                    # Keep serving queries from the old index until the data is fixed
+                    await db[collection].create_index(list(model.document['key'].items()), name=old)
+
+        declared_keys = [list(model.document['key'].items()) for model in models]
+        existing = await db[collection].index_information()
+        for name, info in sorted(existing.items()):
+            if name == "_id_" or info['key'] in declared_keys:
+                continue
+            report['extra'].append(f"{collection}.{name}")
+            logger.warning("Index %s.%s exists but is not declared in indexes.py", collection, name)
+
+    if report['failed']:
+        logger.error("Missing indexes: %s", ", ".join(report['failed']))
+    return report
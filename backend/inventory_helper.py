@@ -0,0 +1,118 @@
+"""
+Inventory Helper Module
+Catalog resolution and batched stock deduction shared by checkout and membership usage
+"""
+
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+from outbox import already_applied, apply_once, record_applied
+
+DUPLICATE_KEY = 11000
+
+
+async def resolve_catalog(db, items: List[dict]) -> Tuple[Dict[str, dict], Dict[str, dict]]:
+    """Fetch every service and product referenced by the items in one `$in` query per collection"""
+    service_ids = list({item['service_id'] for item in items if item.get('service_id')})
+    product_ids = list({item['product_id'] for item in items if item.get('product_id')})
+
+    async def fetch(collection, ids):
+        if not ids:
+            return {}
+        docs = await collection.find({"id": {"$in": ids}}, {"_id": 0}).to_list(len(ids))
+        return {doc['id']: doc for doc in docs}
+
+    services, products = await asyncio.gather(
+        fetch(db.services, service_ids),
+        fetch(db.products, product_ids)
+    )
+    return services, products
+
+
+def stock_quantities(items: List[dict], services_by_id: Dict[str, dict], products_by_id: Dict[str, dict]) -> Dict[str, float]:
+    """
+    Merge the stock consumed by the items into one quantity per inventory_id
+
+    Services consume their BOM lines times the item quantity; products linked
+    to an inventory item consume the item quantity itself.
+    """
+    quantities = defaultdict(float)
+    for item in items:
+        quantity = item.get('quantity', 1)
+        if item.get('service_id'):
+            service = services_by_id.get(item['service_id'])
+            for bom_item in (service or {}).get('bom') or []:
+                quantities[bom_item['inventory_id']] += bom_item['quantity'] * quantity
+        elif item.get('product_id'):
+            product = products_by_id.get(item['product_id'])
+            if product and product.get('inventory_id'):
+                quantities[product['inventory_id']] += quantity
+    return dict(quantities)
+
+
+async def deduct_inventory(db, quantities: Dict[str, float], reason: str, key: str,
+                           user_id: Optional[str] = None, user_name: Optional[str] = None) -> int:
+    """
+    Deduct merged stock quantities with one unordered bulk_write, at most once per `key`
+
+    The ledger is written first with deterministic ids ("<key>:<inventory_id>", duplicates
+    ignored) and logs each item's change; previous/new stock are left unset because a
+    bulk update does not return them. Each $inc is guarded by the key, so a retry after
+    any partial failure completes the missing writes without deducting twice.
+
+    Args:
+        db: Motor database
+        quantities: inventory_id -> quantity to deduct
+        reason: Log reason (e.g. invoice number)
+        key: Apply key of this deduction (outbox apply key, usage record id, ...)
+        user_id, user_name: Who triggered the deduction
+
+    Returns:
+        Number of inventory items updated by this call
+    """
+    quantities = {inv_id: qty for inv_id, qty in quantities.items() if qty}
+    if not quantities:
+        return 0
+
+    items, done = await asyncio.gather(
+        db.inventory.find({"id": {"$in": list(quantities)}}, {"_id": 0, "id": 1, "name": 1}).to_list(len(quantities)),
+        already_applied(db, key, "inventory")
+    )
+    if done or not items:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    logs = [{
+        "id": f"{key}:{item['id']}",
+        "inventory_id": item['id'],
+        "inventory_name": item.get('name', ''),
+        "change_amount": -quantities[item['id']],
+        "previous_stock": None,
+        "new_stock": None,
+        "reason": reason,
+        "user_id": user_id or "system",
+        "user_name": user_name or "System",
+        "created_at": now
+    } for item in items]
+    try:
+        await db.inventory_logs.insert_many(logs, ordered=False)
+    except BulkWriteError as e:
+        # Rows left by an earlier attempt of the same deduction
+        if any(err.get('code') != DUPLICATE_KEY for err in e.details.get('writeErrors', [])):
+            raise
+
+    not_applied, mark_applied = apply_once(key)
+    result = await db.inventory.bulk_write([
+        UpdateOne(
+            {"id": item['id'], **not_applied},
+            {"$inc": {"current_stock": -quantities[item['id']]}, "$push": mark_applied}
+        )
+        for item in items
+    ], ordered=False)
+    await record_applied(db, key, "inventory", {"id": {"$in": list(quantities)}})
+    return result.modified_count
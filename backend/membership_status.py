@@ -0,0 +1,148 @@
+"""
+Membership Status Module
+Stored membership status kept current by an asyncio scheduler
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from dates import MIGRATION_ID as DATES_MIGRATION_ID
+
+logger = logging.getLogger(__name__)
+
+ACTIVE = "active"
+EXPIRING_SOON = "expiring_soon"
+EXPIRED = "expired"
+
+# Not expired; what the dashboard counts as an active membership
+CURRENT = [ACTIVE, EXPIRING_SOON]
+
+# A membership is expiring soon while it has at most 7 whole days left
+EXPIRING_WINDOW = timedelta(days=8)
+
+
+def status_for(end_date: datetime, now: Optional[datetime] = None) -> str:
+    now = now or datetime.now(timezone.utc)
+    if end_date < now:
+        return EXPIRED
+    if end_date < now + EXPIRING_WINDOW:
+        return EXPIRING_SOON
+    return ACTIVE
+
+
+async def refresh_statuses(db, now: Optional[datetime] = None) -> dict:
+    """
+    Bring every stored status in line with `status_for` using end_date range updates;
+    only documents whose status actually changes are written
+    """
+    now = now or datetime.now(timezone.utc)
+    ranges = {
+        EXPIRED: {"$lt": now},
+        EXPIRING_SOON: {"$gte": now, "$lt": now + EXPIRING_WINDOW},
+        ACTIVE: {"$gte": now + EXPIRING_WINDOW},
+    }
+    changed = {}
+    for status, end_range in ranges.items():
+        result = await db.memberships.update_many(
+            {"end_date": end_range, "status": {"$ne": status}},
+            {"$set": {"status": status}}
+        )
+        changed[status] = result.modified_count
+    return changed
+
+
+async def unmigrated_end_dates(db) -> int:
+    """
+    Memberships whose end_date is not a BSON date, which the range updates never match;
+    0 without a scan once migrate_dates.py has finished the memberships collection
+    """
+    state = await db.migrations.find_one({"_id": DATES_MIGRATION_ID}, {"progress.memberships": 1}) or {}
+    if state.get("progress", {}).get("memberships", {}).get("done"):
+        return 0
+    return await db.memberships.count_documents({"end_date": {"$exists": True, "$not": {"$type": "date"}}})
+
+
+async def next_transition(db, now: datetime) -> Optional[datetime]:
+    """When the earliest stored status becomes stale"""
+    expiring = await db.memberships.find_one(
+        {"status": EXPIRING_SOON, "end_date": {"$gte": now}}, {"end_date": 1}, sort=[("end_date", 1)]
+    )
+    active = await db.memberships.find_one(
+        {"status": ACTIVE, "end_date": {"$gte": now}}, {"end_date": 1}, sort=[("end_date", 1)]
+    )
+    candidates = []
+    if expiring:
+        candidates.append(expiring['end_date'])
+    if active:
+        candidates.append(active['end_date'] - EXPIRING_WINDOW)
+    return min(candidates) if candidates else None
+
+
+class MembershipStatusScheduler:
+    """
+    Background task that flips membership statuses when they fall due
+
+    After each refresh it sleeps until the next membership crosses a boundary
+    (found with two indexed lookups), but never longer than `max_interval_seconds`
+    so changes made by other processes are picked up too. On start it warns about
+    memberships whose end_date is still an ISO string, since those are never refreshed.
+    """
+
+    def __init__(self, db, max_interval_seconds: float = 3600, on_change=None):
+        self.db = db
+        self.max_interval = max_interval_seconds
+        self.on_change = on_change
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> float:
+        """Refresh statuses; returns how long to wait before the next run"""
+        now = datetime.now(timezone.utc)
+        changed = await refresh_statuses(self.db, now)
+        if any(changed.values()):
+            logger.info("Membership statuses updated: %s", changed)
+            if self.on_change:
+                self.on_change()
+        due = await next_transition(self.db, now)
+        if due is None:
+            return self.max_interval
+        # One second late so the boundary has passed when we wake up
+        return min(max((due - now).total_seconds() + 1, 1), self.max_interval)
+
+    async def _check_migration(self):
+        try:
+            stale = await unmigrated_end_dates(self.db)
+        except Exception as e:
+            logger.error(f"Membership end_date check failed: {e}")
+            return
+        if stale:
+            logger.warning(
+                "%d memberships have a non-date end_date and keep their stored status "
+                "until migrate_dates.py has run", stale
+            )
+
+    async def _run(self):
+        await self._check_migration()
+        while True:
+            try:
+                wait = await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Membership status refresh failed: {e}")
+                wait = 60
+            await asyncio.sleep(wait)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,40 @@
+"""
+Membership Usage Module
+Once-per-day membership usage enforced by a unique (membership_id, day) index
+"""
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from pymongo.errors import DuplicateKeyError
+
+from dates import day_bounds
+
+
+def usage_day(at: datetime, tz_name: str) -> str:
+    """Outlet-local calendar day of a usage, e.g. 2024-05-31"""
+    return at.astimezone(ZoneInfo(tz_name)).strftime("%Y-%m-%d")
+
+
+def legacy_usage_filter(membership_id: str, at: datetime, tz_name: str) -> dict:
+    """Records stored before the `day` key on the same local day; not covered by the unique index"""
+    start, end = day_bounds(at, tz_name)
+    return {"membership_id": membership_id, "day": {"$exists": False}, "used_at": {"$gte": start, "$lt": end}}
+
+
+async def insert_usage(db, record: dict, tz_name: str) -> bool:
+    """
+    Store a usage record stamped with its `day`; False when the membership was
+    already used that day. The insert is the check, so concurrent taps at two
+    kiosks cannot both succeed.
+    """
+    record['day'] = usage_day(record['used_at'], tz_name)
+    # Kept for one release: until backfill_usage_days.py has run, today's record may lack a day
+    if await db.membership_usage.find_one(legacy_usage_filter(record['membership_id'], record['used_at'], tz_name), {"_id": 1}):
+        return False
+    try:
+        await db.membership_usage.insert_one(record)
+    except DuplicateKeyError:
+        return False
+    record.pop('_id', None)
+    return True
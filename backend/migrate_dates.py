@@ -0,0 +1,92 @@
+import argparse
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+import os
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from pathlib import Path
+from pymongo import UpdateOne
+
+from dates import DATE_FIELDS, MIGRATION_ID, parse_date, string_filter
+
+# Load .env file
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# MongoDB connection
+mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+db_name = os.environ.get('DB_NAME', 'carwash_db')
+
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
+db = client[db_name]
+
+async def migrate_collection(name: str, fields: list, batch_size: int, restart: bool):
+    state = await db.migrations.find_one({"_id": MIGRATION_ID}) or {}
+    progress = state.get("progress", {}).get(name, {})
+    if progress.get("done") and not restart:
+        print(f"  ⏭️  {name}: already migrated")
+        return
+    last_id = None if restart else progress.get("last_id")
+
+    strings = string_filter(fields)
+    converted = 0
+    skipped = 0
+    while True:
+        query = {"$and": [strings, {"_id": {"$gt": last_id}}]} if last_id is not None else strings
+        docs = await db[name].find(query, {field: 1 for field in fields}).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+
+        operations = []
+        for doc in docs:
+            updates = {}
+            unchanged = {}
+            for field in fields:
+                value = doc.get(field)
+                if not isinstance(value, str):
+                    continue
+                parsed = parse_date(value)
+                if parsed is None:
+                    skipped += 1
+                    print(f"  ⚠️  {name} {doc['_id']}: cannot parse {field}={value!r}")
+                    continue
+                updates[field] = parsed
+                unchanged[field] = value
+            if updates:
+                # Only overwrite values that were not changed by the app since we read them
+                operations.append(UpdateOne({"_id": doc['_id'], **unchanged}, {"$set": updates}))
+
+        if operations:
+            result = await db[name].bulk_write(operations, ordered=False)
+            converted += result.modified_count
+
+        last_id = docs[-1]['_id']
+        await db.migrations.update_one(
+            {"_id": MIGRATION_ID},
+            {"$set": {f"progress.{name}": {"last_id": last_id, "done": False}}},
+            upsert=True
+        )
+
+    await db.migrations.update_one(
+        {"_id": MIGRATION_ID},
+        {"$set": {f"progress.{name}": {"last_id": last_id, "done": True}, "updated_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+    print(f"  ✅ {name}: {converted} documents converted" + (f", {skipped} values skipped" if skipped else ""))
+
+async def migrate_dates(batch_size: int, restart: bool, only: list):
+    print("📅 Converting ISO string dates to BSON datetimes...")
+    for name, fields in DATE_FIELDS.items():
+        if only and name not in only:
+            continue
+        await migrate_collection(name, fields, batch_size, restart)
+    print("✅ Date migration finished")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert stored ISO string dates to native BSON datetimes")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--restart", action="store_true", help="Ignore saved progress and rescan every collection")
+    parser.add_argument("collections", nargs="*", help="Only migrate these collections")
+    args = parser.parse_args()
+    asyncio.run(migrate_dates(args.batch_size, args.restart, args.collections))
@@ -0,0 +1,236 @@
+"""
+Notification Queue Module
+Mongo-backed WhatsApp message queue drained by a rate-limited asyncio worker
+"""
+
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+Sender = Callable[[str, str], Awaitable[Dict]]
+
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+DEAD = "dead"
+
+DUPLICATE_KEY = 11000
+
+# Lower goes first; a receipt is claimed ahead of a broadcast queued before it
+PRIORITIES = {"receipt": 0, "membership_reminder": 1, "promotion": 2}
+DEFAULT_PRIORITY = 1
+
+
+class NotificationQueue:
+    """
+    Outgoing WhatsApp messages backed by the `notifications` collection
+
+    Handlers enqueue a rendered message and return immediately. The worker sends
+    at most `rate_per_minute` messages, most urgent kind first (see PRIORITIES),
+    retries failures with exponential backoff and dead-letters a message after
+    `max_attempts`. While the gateway's circuit breaker is open, messages are held
+    back without using up an attempt. Every message keeps its status, attempts and
+    last error so it can be looked up by id.
+    """
+
+    def __init__(self, db, sender: Sender, rate_per_minute: int = 30, max_attempts: int = 6,
+                 base_backoff_seconds: int = 15, poll_interval: float = 2.0, lock_timeout_seconds: int = 120):
+        self.db = db
+        self.sender = sender
+        self.min_interval = 60.0 / rate_per_minute if rate_per_minute > 0 else 0
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff_seconds
+        self.poll_interval = poll_interval
+        self.lock_timeout = timedelta(seconds=lock_timeout_seconds)
+        self._next_send_at = 0.0
+        self._paused_until = 0.0
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def build(self, kind: str, phone: str, message: str, reference: Optional[str] = None,
+              dedupe_key: Optional[str] = None) -> dict:
+        """Build a queued message; `dedupe_key` makes enqueueing the same message twice a no-op"""
+        now = datetime.now(timezone.utc)
+        doc = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "phone": phone,
+            "message": message,
+            "reference": reference,
+            "status": QUEUED,
+            "priority": PRIORITIES.get(kind, DEFAULT_PRIORITY),
+            "attempts": 0,
+            "last_error": None,
+            "available_at": now,
+            "created_at": now,
+            "sent_at": None,
+        }
+        if dedupe_key:
+            doc["dedupe_key"] = dedupe_key
+        return doc
+
+    async def enqueue(self, kind: str, phone: str, message: str, reference: Optional[str] = None,
+                      dedupe_key: Optional[str] = None) -> dict:
+        doc = self.build(kind, phone, message, reference, dedupe_key)
+        try:
+            await self.db.notifications.insert_one(doc)
+        except DuplicateKeyError:
+            existing = await self.db.notifications.find_one({"dedupe_key": dedupe_key}, {"_id": 0})
+            if existing:
+                return existing
+            raise
+        doc.pop('_id', None)
+        self._wakeup.set()
+        return doc
+
+    async def enqueue_many(self, docs: List[dict]) -> int:
+        """Insert messages made with `build`; duplicates (by dedupe_key) are skipped"""
+        if not docs:
+            return 0
+        try:
+            result = await self.db.notifications.insert_many(docs, ordered=False)
+            inserted = len(result.inserted_ids)
+        except BulkWriteError as e:
+            if any(err.get('code') != DUPLICATE_KEY for err in e.details.get('writeErrors', [])):
+                raise
+            inserted = e.details.get('nInserted', 0)
+        self._wakeup.set()
+        return inserted
+
+    async def get(self, notification_id: str) -> Optional[dict]:
+        return await self.db.notifications.find_one({"id": notification_id}, {"_id": 0})
+
+    async def retry(self, notification_id: str) -> Optional[dict]:
+        """Put a dead-lettered message back in the queue"""
+        doc = await self.db.notifications.find_one_and_update(
+            {"id": notification_id, "status": DEAD},
+            {"$set": {"status": QUEUED, "attempts": 0, "available_at": datetime.now(timezone.utc)}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if doc:
+            self._wakeup.set()
+        return doc
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        return await self.db.notifications.find_one_and_update(
+            {"$or": [
+                {"status": QUEUED, "available_at": {"$lte": now}},
+                {"status": SENDING, "locked_at": {"$lte": now - self.lock_timeout}},
+            ]},
+            {"$set": {"status": SENDING, "locked_at": now}},
+            sort=[("priority", 1), ("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _throttle(self):
+        wait = self._next_send_at - time.monotonic()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self._next_send_at = time.monotonic() + self.min_interval
+
+    async def _send(self, doc: dict) -> float:
+        """Send one claimed message; returns how long to pause draining (0 to continue)"""
+        await self._throttle()
+        result = {}
+        try:
+            result = await self.sender(doc['phone'], doc['message'])
+            error = None if result.get('success') else result.get('error', 'Failed to send WhatsApp')
+        except Exception as e:
+            error = str(e)
+
+        now = datetime.now(timezone.utc)
+        if result.get('circuit_open'):
+            # The gateway is known to be down: put the message back without using up an attempt
+            pause = max(result.get('retry_after') or 0, self.poll_interval)
+            await self.db.notifications.update_one(
+                {"id": doc['id']},
+                {"$set": {"status": QUEUED, "last_error": error, "available_at": now + timedelta(seconds=pause)}}
+            )
+            return pause
+        if error is None:
+            await self.db.notifications.update_one(
+                {"id": doc['id']},
+                {"$set": {"status": SENT, "sent_at": now, "last_error": None}, "$inc": {"attempts": 1}}
+            )
+            return 0
+
+        attempts = doc.get('attempts', 0) + 1
+        update = {"attempts": attempts, "last_error": error}
+        if attempts >= self.max_attempts:
+            update["status"] = DEAD
+            logger.error(f"Notification {doc['id']} to {doc['phone']} dead-lettered: {error}")
+        else:
+            update["status"] = QUEUED
+            update["available_at"] = now + timedelta(seconds=min(self.base_backoff * 2 ** (attempts - 1), 3600))
+            logger.warning(f"Notification {doc['id']} failed (attempt {attempts}): {error}")
+        await self.db.notifications.update_one({"id": doc['id']}, {"$set": update})
+        return 0
+
+    async def drain(self) -> int:
+        """
+        Send every message that is currently due; returns how many were attempted.
+        Stops while the gateway's circuit is open, so queued messages wait instead of failing.
+        """
+        handled = 0
+        while time.monotonic() >= self._paused_until:
+            doc = await self._claim()
+            if not doc:
+                return handled
+            pause = await self._send(doc)
+            handled += 1
+            if pause:
+                self._paused_until = time.monotonic() + pause
+        return handled
+
+    async def backfill_priorities(self) -> int:
+        """Give messages queued before priorities existed one, so they don't sort ahead of receipts"""
+        updated = 0
+        unset = {"status": {"$in": [QUEUED, SENDING]}, "priority": {"$exists": False}}
+        for kind, priority in PRIORITIES.items():
+            result = await self.db.notifications.update_many({**unset, "kind": kind}, {"$set": {"priority": priority}})
+            updated += result.modified_count
+        result = await self.db.notifications.update_many(unset, {"$set": {"priority": DEFAULT_PRIORITY}})
+        return updated + result.modified_count
+
+    async def _run(self):
+        try:
+            await self.backfill_priorities()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Notification priority backfill failed: {e}")
+        while True:
+            try:
+                await self.drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Notification worker error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
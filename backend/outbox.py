@@ -0,0 +1,212 @@
+"""
+Outbox Module
+Persisted post-commit side effects drained by an asyncio background worker
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timezone, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple, Union
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict, str], Awaitable[None]]
+
+# Apply key of an effect in flight on a document it changes; removed once recorded in applied_effects
+APPLIED_FIELD = "applied_events"
+
+
+def apply_once(key: str) -> Tuple[dict, dict]:
+    """Filter and $push fragments that make an update a no-op on a document already carrying `key`"""
+    return {APPLIED_FIELD: {"$ne": key}}, {APPLIED_FIELD: key}
+
+
+async def already_applied(db, key: str, target: str) -> bool:
+    """Whether the effect `key` was recorded as applied to the `target` collection"""
+    return await db.applied_effects.find_one({"key": key, "target": target}, {"_id": 1}) is not None
+
+
+async def record_applied(db, key: str, target: str, query: dict):
+    """
+    Record `key` as applied to `target`, then drop it from the documents matching
+    `query` that carry it, so they do not grow with every effect
+    """
+    try:
+        await db.applied_effects.insert_one({"key": key, "target": target, "applied_at": datetime.now(timezone.utc)})
+    except DuplicateKeyError:
+        pass
+    await db[target].update_many({**query, APPLIED_FIELD: key}, {"$pull": {APPLIED_FIELD: key}})
+
+
+class Outbox:
+    """
+    Side-effect outbox backed by the `outbox` collection
+
+    Each event lists the effects still pending for one source document (e.g. a
+    transaction). The event is written *before* its source document, so a
+    durable source always has its event; the worker skips effects until the
+    source exists and discards events whose source never appeared.
+
+    Effects run at least once: each one is removed from `pending` as soon as it
+    succeeds, and handlers get an apply key ("<event id>:<effect>") so a retry
+    after a crash or lock takeover does not apply their writes twice. A handler
+    skips a target recorded in `applied_effects`; otherwise its writes are
+    guarded with `apply_once`, which leaves the key on each changed document
+    until `record_applied` moves it to `applied_effects`.
+    """
+
+    def __init__(self, db, poll_interval: float = 1.0, max_attempts: int = 8,
+                 source_grace_seconds: int = 120, lock_timeout_seconds: int = 300):
+        self.db = db
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.source_grace = timedelta(seconds=source_grace_seconds)
+        self.lock_timeout = timedelta(seconds=lock_timeout_seconds)
+        self.handlers: Dict[str, Handler] = {}
+        self._wakeup = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def register(self, effect: str, handler: Handler):
+        """Register the coroutine that applies one effect; it receives the event payload and apply key"""
+        self.handlers[effect] = handler
+
+    def build_event(self, source_collection: str, source_id: Union[str, List[str]], effects: List[str],
+                    payload: dict) -> dict:
+        """
+        Build an outbox document; insert it with `enqueue`/`enqueue_many` before the source.
+        A list of source ids (one bulk insert) counts as present once any of them exists.
+        """
+        now = datetime.now(timezone.utc)
+        return {
+            "id": str(uuid.uuid4()),
+            "source_collection": source_collection,
+            "source_id": source_id,
+            "pending": list(effects),
+            "payload": payload,
+            "status": "pending",
+            "attempts": 0,
+            "last_error": None,
+            "available_at": now,
+            "created_at": now,
+        }
+
+    async def enqueue(self, event: dict):
+        await self.db.outbox.insert_one(event)
+        self._wakeup.set()
+
+    async def enqueue_many(self, events: List[dict]):
+        if events:
+            await self.db.outbox.insert_many(events, ordered=False)
+            self._wakeup.set()
+
+    def notify(self):
+        """Wake the worker now instead of at the next poll"""
+        self._wakeup.set()
+
+    async def _claim(self) -> Optional[dict]:
+        now = datetime.now(timezone.utc)
+        return await self.db.outbox.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "available_at": {"$lte": now}},
+                {"status": "processing", "locked_at": {"$lte": now - self.lock_timeout}},
+            ]},
+            {"$set": {"status": "processing", "locked_at": now}},
+            sort=[("available_at", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _process(self, event: dict):
+        now = datetime.now(timezone.utc)
+        source_id = event['source_id']
+        source = await self.db[event['source_collection']].find_one(
+            {"id": {"$in": source_id}} if isinstance(source_id, list) else {"id": source_id}, {"_id": 1}
+        )
+        if not source:
+            if now - event['created_at'].replace(tzinfo=timezone.utc) > self.source_grace:
+                await self.db.outbox.update_one(
+                    {"id": event['id']},
+                    {"$set": {"status": "discarded", "last_error": "source document missing"}}
+                )
+            else:
+                # Source write may still be in flight
+                await self.db.outbox.update_one(
+                    {"id": event['id']},
+                    {"$set": {"status": "pending", "available_at": now + timedelta(seconds=2)}}
+                )
+            return
+
+        remaining = []
+        error = None
+        for effect in event['pending']:
+            handler = self.handlers.get(effect)
+            if handler is None:
+                remaining.append(effect)
+                error = f"no handler for '{effect}'"
+                continue
+            try:
+                await handler(event['payload'], f"{event['id']}:{effect}")
+            except Exception as e:
+                logger.warning(f"Outbox effect '{effect}' failed for {event['source_id']}: {e}")
+                remaining.append(effect)
+                error = str(e)
+                continue
+            # Persist progress right away so a crash never re-runs a finished effect
+            await self.db.outbox.update_one({"id": event['id']}, {"$pull": {"pending": effect}})
+
+        if not remaining:
+            await self.db.outbox.update_one(
+                {"id": event['id']},
+                {"$set": {"status": "done", "pending": [], "completed_at": datetime.now(timezone.utc)}}
+            )
+            return
+
+        attempts = event.get('attempts', 0) + 1
+        update = {"pending": remaining, "attempts": attempts, "last_error": error}
+        if attempts >= self.max_attempts:
+            update["status"] = "failed"
+            logger.error(f"Outbox event {event['id']} failed permanently: {remaining} ({error})")
+        else:
+            update["status"] = "pending"
+            update["available_at"] = datetime.now(timezone.utc) + timedelta(seconds=min(2 ** attempts, 300))
+        await self.db.outbox.update_one({"id": event['id']}, {"$set": update})
+
+    async def drain(self) -> int:
+        """Process every event that is currently due; returns how many were handled"""
+        handled = 0
+        while True:
+            event = await self._claim()
+            if not event:
+                return handled
+            await self._process(event)
+            handled += 1
+
+    async def _run(self):
+        while True:
+            try:
+                await self.drain()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox worker error: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
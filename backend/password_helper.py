@@ -0,0 +1,175 @@
+"""
+Password Helper Module
+bcrypt hashing on a dedicated, bounded thread pool so logins never block the event loop
+"""
+
+import asyncio
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, TypeVar
+
+import bcrypt
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# settings document holding the bcrypt cost shared by all workers
+PASSWORD_HASH_SETTING = "password_hash"
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt on its own thread pool
+
+    At most `workers` hashes run at once (bcrypt releases the GIL, so they run
+    in parallel with request handling); up to `max_waiting` further calls queue,
+    beyond that callers get 503. Queue time (call -> worker start) is tracked
+    and slow waits are logged.
+
+    New hashes use `rounds` (bcrypt's default of 12 until the shared cost is
+    loaded); `needs_rehash` flags stored hashes made with a lower cost.
+    """
+
+    def __init__(self, workers: int = 2, max_waiting: int = 64, slow_queue_seconds: float = 1.0, rounds: int = 12):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_waiting = max_waiting
+        self.slow_queue_seconds = slow_queue_seconds
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._slots = asyncio.Semaphore(workers)
+        self._waiting = 0
+        self._completed = 0
+        self._queue_total = 0.0
+        self._queue_max = 0.0
+        self._rejected = 0
+
+    async def _run(self, func: Callable[[], T]) -> T:
+        if self._waiting >= self.max_waiting:
+            self._rejected += 1
+            raise HTTPException(status_code=503, detail="Server busy, please try again")
+
+        queued_at = time.monotonic()
+        self._waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self._waiting -= 1
+        try:
+            started = {}
+
+            def timed():
+                started['at'] = time.monotonic()
+                return func()
+
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+        finally:
+            self._slots.release()
+
+        queue_time = started.get('at', queued_at) - queued_at
+        self._completed += 1
+        self._queue_total += queue_time
+        self._queue_max = max(self._queue_max, queue_time)
+        if queue_time >= self.slow_queue_seconds:
+            logger.warning("Password hashing waited %.2fs for a worker", queue_time)
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(
+            lambda: bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=self.rounds)).decode('utf-8')
+        )
+
+    async def verify(self, password: str, hashed: str) -> bool:
+        return await self._run(
+            lambda: bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+        )
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """True when a stored hash ($2b$<cost>$...) was made with a lower cost; stronger hashes are kept"""
+        try:
+            return int(hashed.split('$')[2]) < self.rounds
+        except (IndexError, ValueError):
+            return False
+
+    async def calibrate(self, target_ms: float, min_rounds: int = 10, max_rounds: int = 16) -> int:
+        """
+        Pick the highest cost whose hash time stays within `target_ms` on this machine
+
+        Each extra round doubles the work, so one timing at `min_rounds` predicts the rest.
+        """
+        def measure():
+            started = time.perf_counter()
+            bcrypt.hashpw(b"calibration", bcrypt.gensalt(rounds=min_rounds))
+            return (time.perf_counter() - started) * 1000
+
+        base_ms = await self._run(measure)
+        rounds = min_rounds
+        while rounds < max_rounds and base_ms * 2 ** (rounds + 1 - min_rounds) <= target_ms:
+            rounds += 1
+        self.rounds = rounds
+        logger.info("bcrypt cost %d (~%.0f ms per hash, target %.0f ms)",
+                    rounds, base_ms * 2 ** (rounds - min_rounds), target_ms)
+        return rounds
+
+    async def load_shared_rounds(self, db, target_ms: float, recalibrate: bool = False) -> int:
+        """
+        Use the cost stored in `settings`; calibrate when none is stored, when it was
+        calibrated for another target_ms, or when `recalibrate` is set
+
+        The first worker to finish calibrating stores its result and every other
+        worker (and every restart) adopts it, so timing noise between machines or
+        boots cannot make logins rehash back and forth. To recalibrate, e.g. after
+        moving to new hardware, change PASSWORD_HASH_TARGET_MS or restart once with
+        PASSWORD_HASH_RECALIBRATE=1.
+        """
+        setting = await db.settings.find_one({"_id": PASSWORD_HASH_SETTING})
+        if not setting or setting.get('target_ms') != target_ms or recalibrate:
+            measured = await self.calibrate(target_ms)
+            # Only replace the setting we read, so workers calibrating together adopt one result
+            seen = setting.get('calibrated_at') if setting else None
+            try:
+                setting = await db.settings.find_one_and_update(
+                    {"_id": PASSWORD_HASH_SETTING, "calibrated_at": seen},
+                    {"$set": {"rounds": measured, "target_ms": target_ms,
+                              "calibrated_at": datetime.now(timezone.utc)}},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            except DuplicateKeyError:
+                setting = await db.settings.find_one({"_id": PASSWORD_HASH_SETTING})
+        self.rounds = setting['rounds']
+        logger.info("bcrypt cost %d (shared setting, target %.0f ms)", self.rounds, setting.get('target_ms', target_ms))
+        return self.rounds
+
+    def stats(self) -> dict:
+        return {
+            "rounds": self.rounds,
+            "workers": self.workers,
+            "waiting": self._waiting,
+            "completed": self._completed,
+            "rejected": self._rejected,
+            "avg_queue_ms": round(self._queue_total / self._completed * 1000, 1) if self._completed else 0,
+            "max_queue_ms": round(self._queue_max * 1000, 1)
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+passwords = PasswordHasher(
+    workers=int(os.getenv('PASSWORD_HASH_WORKERS', '2')),
+    max_waiting=int(os.getenv('PASSWORD_HASH_MAX_WAITING', '64')),
+    rounds=int(os.getenv('PASSWORD_HASH_ROUNDS', '12'))
+)
+
+# Target time for one hash; the shared cost is not used when PASSWORD_HASH_ROUNDS is set
+PASSWORD_HASH_TARGET_MS = float(os.getenv('PASSWORD_HASH_TARGET_MS', '250'))
+PASSWORD_HASH_PINNED = 'PASSWORD_HASH_ROUNDS' in os.environ
+# Set for one restart to measure the shared cost again on this hardware
+PASSWORD_HASH_RECALIBRATE = os.getenv('PASSWORD_HASH_RECALIBRATE', '').lower() in ('1', 'true', 'yes')
@@ -0,0 +1,28 @@
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+import os
+
+from dotenv import load_dotenv
+from pathlib import Path
+
+import daily_sales
+
+# Load .env file
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+# MongoDB connection
+mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+db_name = os.environ.get('DB_NAME', 'carwash_db')
+outlet_timezone = os.environ.get('OUTLET_TIMEZONE', 'Asia/Jakarta')
+
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
+db = client[db_name]
+
+async def rebuild_daily_sales():
+    print(f"🔄 Rebuilding daily_sales from transactions ({outlet_timezone})...")
+    days = await daily_sales.rebuild(db, outlet_timezone)
+    print(f"✅ Rebuilt {days} outlet-day documents")
+
+if __name__ == "__main__":
+    asyncio.run(rebuild_daily_sales())
@@ -0,0 +1,103 @@
+"""
+Receipt Templates Module
+WhatsApp receipt text from templates compiled once per outlet branding
+"""
+
+from datetime import datetime, timezone
+from string import Template
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from cache_helper import TTLCache
+from dates import as_datetime
+
+RULE = "━━━━━━━━━━━━━━━━━━━━"
+
+HEADER = "🧼 *OTOPIA CAR WASH*\n" + RULE + "\n\n"
+
+BODY = (
+    "📅 $date\n"
+    "🎫 Invoice: $invoice\n\n"
+    "*LAYANAN:*\n"
+    "$items"
+    "\n" + RULE + "\n"
+    "*TOTAL:* Rp $total\n"
+    "💳 Pembayaran: $payment_method\n\n"
+)
+
+FOOTER = (
+    "Terima kasih atas kunjungan Anda!\n"
+    "Simpan struk ini sebagai bukti.\n\n"
+    "📍 {address}\n"
+    "📞 {phone}"
+)
+
+ITEM_LINE = "• {name} x{quantity}\n  Rp {total:,.0f}\n"
+
+DEFAULT_ADDRESS = "Jl. Sukun Raya No.47C, Semarang"
+DEFAULT_PHONE = "0822-2702-5335"
+
+
+def _literal(text: str) -> str:
+    """Escape branding text so it is not read as template placeholders"""
+    return text.replace('$', '$$')
+
+
+class ReceiptTemplates:
+    """
+    Renders every WhatsApp receipt
+
+    The outlet's branding (address and phone from the outlet, falling back to the
+    landing page config) is baked into a compiled template and cached per outlet,
+    so a receipt is one substitution. Call `invalidate` when branding changes.
+    """
+
+    def __init__(self, db, tz_name: str, ttl_seconds: float = 600):
+        self.db = db
+        self.tz = ZoneInfo(tz_name)
+        self._compiled = TTLCache(ttl_seconds)
+
+    def compile(self, address: str, phone: str) -> Template:
+        footer = FOOTER.format(address=address, phone=phone)
+        return Template(HEADER + BODY + _literal(footer))
+
+    async def _load(self, outlet_id: Optional[str]) -> Template:
+        config = await self.db.landing_config.find_one({"id": "default"}, {"_id": 0}) or {}
+        outlet = await self.db.outlets.find_one({"id": outlet_id}, {"_id": 0}) if outlet_id else None
+        outlet = outlet or {}
+        return self.compile(
+            outlet.get('address') or config.get('contact_address') or DEFAULT_ADDRESS,
+            outlet.get('phone') or config.get('contact_phone') or DEFAULT_PHONE
+        )
+
+    async def template_for(self, outlet_id: Optional[str]) -> Template:
+        return await self._compiled.get_or_compute(outlet_id or "default", lambda: self._load(outlet_id))
+
+    async def warm(self):
+        """Compile the default template (call at startup)"""
+        await self.template_for(None)
+
+    def invalidate(self, outlet_id: Optional[str] = None):
+        """Drop one outlet's template, or all of them when the shared branding changes"""
+        self._compiled.invalidate(outlet_id)
+
+    def fill(self, template: Template, transaction: dict) -> str:
+        created_at = as_datetime(transaction.get('created_at')) or datetime.now(timezone.utc)
+        items = "".join(
+            ITEM_LINE.format(
+                name=item.get('service_name') or item.get('product_name') or item.get('name') or 'Unknown',
+                quantity=item.get('quantity', 1),
+                total=item.get('price', 0) * item.get('quantity', 1)
+            )
+            for item in transaction.get('items', [])
+        )
+        return template.substitute(
+            date=created_at.astimezone(self.tz).strftime("%d/%m/%Y %H:%M"),
+            invoice=transaction.get('invoice_number', 'N/A'),
+            items=items,
+            total=f"{transaction.get('total', 0):,.0f}",
+            payment_method=str(transaction.get('payment_method', 'cash')).upper()
+        )
+
+    async def render(self, transaction: dict) -> str:
+        return self.fill(await self.template_for(transaction.get('outlet_id')), transaction)
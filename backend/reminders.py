@@ -0,0 +1,81 @@
+"""
+Reminders Module
+Membership expiry reminders queued in bulk from a single customer $lookup
+"""
+
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+from dates import day_bounds
+from membership_status import CURRENT
+
+REMINDER_BATCH_SIZE = 500
+
+
+def expiry_message(name: str, membership_type: str, end_date: datetime) -> str:
+    return (f"Halo {name}, Membership {membership_type} Anda di OTOPIA akan berakhir pada "
+            f"{end_date.strftime('%d/%m/%Y')}. Segera perpanjang!")
+
+
+async def _flush(db, notifications, docs: list, membership_ids: list, marker: dict) -> int:
+    inserted = await notifications.enqueue_many(docs)
+    # Marked only after queueing; a crash in between is covered by the notifications dedupe_key
+    await db.memberships.update_many({"id": {"$in": membership_ids}}, [{"$set": marker}])
+    return inserted
+
+
+async def queue_expiry_reminders(db, notifications, days_ahead: int = 3, tz_name: str = "UTC",
+                                 batch_size: int = REMINDER_BATCH_SIZE) -> dict:
+    """
+    Queue a WhatsApp reminder for every active membership ending on the outlet-local day
+    (`tz_name`) `days_ahead` days from now
+
+    Customers are joined in the same aggregation and results are streamed, so there is
+    no per-membership lookup and no cap on how many members are reminded. Each reminded
+    membership stores `expiry_reminder_for` (the end_date it was reminded about); re-runs
+    skip those, and a renewed membership (new end_date) is reminded again.
+    Delivery itself is paced by the notification queue.
+    """
+    now = datetime.now(timezone.utc)
+    tz = ZoneInfo(tz_name)
+    target_start, target_end = day_bounds(now + timedelta(days=days_ahead), tz_name)
+    pipeline = [
+        {"$match": {
+            "status": {"$in": CURRENT},
+            "end_date": {"$gte": target_start, "$lt": target_end},
+            "$expr": {"$ne": ["$expiry_reminder_for", "$end_date"]}
+        }},
+        {"$lookup": {
+            "from": "customers",
+            "localField": "customer_id",
+            "foreignField": "id",
+            "as": "customer"
+        }},
+        {"$unwind": "$customer"},
+        {"$project": {"_id": 0, "id": 1, "membership_type": 1, "end_date": 1,
+                      "customer.name": 1, "customer.phone": 1}},
+    ]
+
+    queued = 0
+    skipped = 0
+    docs, membership_ids = [], []
+    marker = {"expiry_reminder_for": "$end_date", "expiry_reminder_at": now}
+    async for m in db.memberships.aggregate(pipeline, batchSize=batch_size):
+        phone = m['customer'].get('phone')
+        if not phone:
+            skipped += 1
+            continue
+        docs.append(notifications.build(
+            "membership_reminder", phone,
+            expiry_message(m['customer'].get('name', ''), m['membership_type'], m['end_date'].astimezone(tz)),
+            reference=m['id'], dedupe_key=f"expiring:{m['id']}:{m['end_date'].date().isoformat()}"
+        ))
+        membership_ids.append(m['id'])
+        if len(docs) >= batch_size:
+            queued += await _flush(db, notifications, docs, membership_ids, marker)
+            docs, membership_ids = [], []
+    if docs:
+        queued += await _flush(db, notifications, docs, membership_ids, marker)
+
+    return {"queued": queued, "skipped_no_phone": skipped,
+            "target_date": target_start.astimezone(tz).date().isoformat()}
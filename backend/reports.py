@@ -0,0 +1,189 @@
+"""
+Reports Module
+Server-side aggregations behind the reports page
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from membership_status import ACTIVE, EXPIRING_SOON
+
+
+def date_range_match(field: str, date_from: Optional[datetime], date_to: Optional[datetime]) -> dict:
+    """$match stage for an inclusive date range"""
+    condition = {}
+    if date_from:
+        condition["$gte"] = date_from
+    if date_to:
+        condition["$lte"] = date_to
+    return {"$match": {field: condition}} if condition else {"$match": {}}
+
+
+async def sales_summary(db, date_from: Optional[datetime], date_to: Optional[datetime],
+                        outlet_id: Optional[str], tz_name: str) -> dict:
+    """
+    Revenue, payment breakdown, 7-day revenue, top services, hourly distribution
+    and top customers for a period, in one $facet aggregation over transactions
+    """
+    tz = ZoneInfo(tz_name)
+    now = datetime.now(tz)
+    week_start = (now - timedelta(days=6)).replace(hour=0, minute=0, second=0, microsecond=0).astimezone(timezone.utc)
+    # Naive bounds are UTC, like the stored timestamps
+    if date_from and date_from.tzinfo is None:
+        date_from = date_from.replace(tzinfo=timezone.utc)
+    if date_to and date_to.tzinfo is None:
+        date_to = date_to.replace(tzinfo=timezone.utc)
+
+    # Outer bound covers both the requested range and the fixed 7-day chart
+    outer = {}
+    if outlet_id:
+        outer["outlet_id"] = outlet_id
+    if date_from:
+        outer["created_at"] = {"$gte": min(date_from, week_start)}
+
+    in_range = date_range_match("ts", date_from, date_to)
+    pipeline = [
+        {"$match": outer},
+        {"$project": {
+            "ts": "$created_at",
+            "total": 1,
+            "payment_method": 1,
+            "customer_name": 1,
+            "items.service_name": 1,
+            "items.product_name": 1,
+            "items.quantity": 1
+        }},
+        {"$facet": {
+            "totals": [in_range, {"$group": {"_id": None, "revenue": {"$sum": "$total"}, "count": {"$sum": 1}}}],
+            "payments": [in_range, {"$group": {"_id": "$payment_method", "total": {"$sum": "$total"}}}],
+            "daily": [
+                {"$match": {"ts": {"$gte": week_start}}},
+                {"$group": {
+                    "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$ts", "timezone": tz_name}},
+                    "revenue": {"$sum": "$total"}
+                }}
+            ],
+            "services": [
+                in_range,
+                {"$unwind": "$items"},
+                {"$group": {
+                    "_id": {"$ifNull": ["$items.service_name", {"$ifNull": ["$items.product_name", "Unknown"]}]},
+                    "count": {"$sum": "$items.quantity"}
+                }},
+                {"$sort": {"count": -1}},
+                {"$limit": 5}
+            ],
+            "hourly": [in_range, {"$group": {"_id": {"$hour": {"date": "$ts", "timezone": tz_name}}, "count": {"$sum": 1}}}],
+            "customers": [
+                in_range,
+                {"$match": {"customer_name": {"$nin": [None, ""]}}},
+                {"$group": {"_id": "$customer_name", "spending": {"$sum": "$total"}}},
+                {"$sort": {"spending": -1}},
+                {"$limit": 5}
+            ]
+        }}
+    ]
+
+    expense_pipeline = [
+        date_range_match("date", date_from, date_to),
+        {"$group": {"_id": None, "total": {"$sum": "$amount"}}}
+    ]
+
+    facets, expenses = await asyncio.gather(
+        db.transactions.aggregate(pipeline).to_list(1),
+        db.expenses.aggregate(expense_pipeline).to_list(1)
+    )
+    facets = facets[0]
+
+    totals = facets['totals'][0] if facets['totals'] else {"revenue": 0, "count": 0}
+    total_expenses = expenses[0]['total'] if expenses else 0
+
+    payment_breakdown = {"cash": 0, "card": 0, "qr": 0, "subscription": 0}
+    for row in facets['payments']:
+        payment_breakdown[row['_id']] = row['total']
+
+    daily_totals = {row['_id']: row['revenue'] for row in facets['daily']}
+    daily_revenue = []
+    for offset in range(6, -1, -1):
+        day = (now - timedelta(days=offset)).strftime("%Y-%m-%d")
+        daily_revenue.append({"date": day, "revenue": daily_totals.get(day, 0)})
+
+    hourly_distribution = [0] * 24
+    for row in facets['hourly']:
+        hourly_distribution[row['_id']] = row['count']
+
+    return {
+        "total_revenue": totals['revenue'],
+        "transaction_count": totals['count'],
+        "avg_transaction": totals['revenue'] / totals['count'] if totals['count'] else 0,
+        "total_expenses": total_expenses,
+        "net_profit": totals['revenue'] - total_expenses,
+        "payment_breakdown": payment_breakdown,
+        "daily_revenue": daily_revenue,
+        "top_services": [[row['_id'], row['count']] for row in facets['services']],
+        "hourly_distribution": hourly_distribution,
+        "peak_hour": hourly_distribution.index(max(hourly_distribution)),
+        "top_customers": [[row['_id'], row['spending']] for row in facets['customers']]
+    }
+
+
+async def period_sales(db, since: datetime) -> dict:
+    """Revenue, count and per-cashier performance for transactions since `since`"""
+    result = await db.transactions.aggregate([
+        {"$match": {"created_at": {"$gte": since}}},
+        {"$facet": {
+            "totals": [{"$group": {"_id": None, "revenue": {"$sum": "$total"}, "count": {"$sum": 1}}}],
+            "kasir": [{"$group": {
+                "_id": {"$ifNull": ["$kasir_name", "Unknown"]},
+                "count": {"$sum": 1},
+                "revenue": {"$sum": "$total"}
+            }}]
+        }}
+    ]).to_list(1)
+    facets = result[0]
+    totals = facets['totals'][0] if facets['totals'] else {"revenue": 0, "count": 0}
+    return {
+        "revenue": totals['revenue'],
+        "count": totals['count'],
+        "kasir": {row['_id']: {"count": row['count'], "revenue": row['revenue']} for row in facets['kasir']}
+    }
+
+
+async def membership_counts(db) -> dict:
+    """Active (not yet ended) and expiring-soon membership counts from the stored status"""
+    result = await db.memberships.aggregate([
+        {"$match": {"status": {"$in": [ACTIVE, EXPIRING_SOON]}}},
+        {"$facet": {
+            "active": [{"$count": "n"}],
+            "expiring": [
+                {"$match": {"status": EXPIRING_SOON}},
+                {"$count": "n"}
+            ]
+        }}
+    ]).to_list(1)
+    facets = result[0]
+    return {
+        "active": facets['active'][0]['n'] if facets['active'] else 0,
+        "expiring": facets['expiring'][0]['n'] if facets['expiring'] else 0
+    }
+
+
+async def low_stock_count(db) -> int:
+    """Number of inventory items at or below their minimum stock"""
+    return await db.inventory.count_documents({"$expr": {"$lte": ["$current_stock", "$min_stock"]}})
+
+
+async def inventory_summary(db) -> dict:
+    """Total stock value and number of items at or below their minimum stock"""
+    result = await db.inventory.aggregate([
+        {"$group": {
+            "_id": None,
+            "total_value": {"$sum": {"$multiply": ["$current_stock", "$unit_cost"]}},
+            "low_stock": {"$sum": {"$cond": [{"$lte": ["$current_stock", "$min_stock"]}, 1, 0]}}
+        }}
+    ]).to_list(1)
+    if not result:
+        return {"total_value": 0, "low_stock": 0}
+    return {"total_value": result[0]['total_value'], "low_stock": result[0]['low_stock']}
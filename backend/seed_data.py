@@ -39,7 +39,7 @@ async def seed_data():
             "phone": "021-12345678",
             "manager_name": "Budi Santoso",
             "is_active": True,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": str(uuid.uuid4()),
@@ -48,7 +48,7 @@ async def seed_data():
             "phone": "021-87654321",
             "manager_name": "Siti Rahayu",
             "is_active": True,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
     ]
     
@@ -80,7 +80,7 @@ async def seed_data():
             "role": "owner",
             "phone": "081234567890",
             "is_active": True,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
         await db.users.insert_one(admin_user)
         print("✅ Admin user created (admin / admin123)")
@@ -101,7 +101,7 @@ async def seed_data():
             "email": "budi@otopia.com",
             "outlet_id": outlet_sudirman_id,
             "is_active": True,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": str(uuid.uuid4()),
@@ -113,7 +113,7 @@ async def seed_data():
             "email": "siti@otopia.com",
             "outlet_id": outlet_kuningan_id,
             "is_active": True,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         },
         {
             "id": str(uuid.uuid4()),
@@ -125,7 +125,7 @@ async def seed_data():
             "email": "andi@otopia.com",
             "outlet_id": outlet_sudirman_id,
             "is_active": True,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "created_at": datetime.now(timezone.utc)
         }
     ]
     
@@ -509,7 +509,7 @@ async def seed_data():
             "total_visits": 15,
             "total_spending": 750000,
             "notes": "Pelanggan setia, prefer cuci eksterior + waxing",
-            "created_at": (datetime.now(timezone.utc) - timedelta(days=90)).isoformat()
+            "created_at": (datetime.now(timezone.utc) - timedelta(days=90))
         },
         {
             "id": str(uuid.uuid4()),
@@ -520,7 +520,7 @@ async def seed_data():
             "license_plate": "B 5678 DEF",
             "total_visits": 8,
             "total_spending": 400000,
-            "created_at": (datetime.now(timezone.utc) - timedelta(days=60)).isoformat()
+            "created_at": (datetime.now(timezone.utc) - timedelta(days=60))
         },
         {
             "id": str(uuid.uuid4()),
@@ -532,7 +532,7 @@ async def seed_data():
             "total_visits": 20,
             "total_spending": 1200000,
             "notes": "VIP member, sering polish + coating",
-            "created_at": (datetime.now(timezone.utc) - timedelta(days=120)).isoformat()
+            "created_at": (datetime.now(timezone.utc) - timedelta(days=120))
         },
         {
             "id": str(uuid.uuid4()),
@@ -543,7 +543,7 @@ async def seed_data():
             "license_plate": "B 3456 JKL",
             "total_visits": 5,
             "total_spending": 275000,
-            "created_at": (datetime.now(timezone.utc) - timedelta(days=30)).isoformat()
+            "created_at": (datetime.now(timezone.utc) - timedelta(days=30))
         },
         {
             "id": str(uuid.uuid4()),
@@ -554,7 +554,7 @@ async def seed_data():
             "license_plate": "B 7890 MNO",
             "total_visits": 3,
             "total_spending": 225000,
-            "created_at": (datetime.now(timezone.utc) - timedelta(days=15)).isoformat()
+            "created_at": (datetime.now(timezone.utc) - timedelta(days=15))
         }
     ]
     
@@ -589,12 +589,12 @@ async def seed_data():
             "customer_phone": "081234567001",
             "membership_type": "premium",
             "price": 500000,
-            "start_date": (datetime.now(timezone.utc) - timedelta(days=15)).isoformat(),
-            "end_date": (datetime.now(timezone.utc) + timedelta(days=15)).isoformat(),
+            "start_date": (datetime.now(timezone.utc) - timedelta(days=15)),
+            "end_date": (datetime.now(timezone.utc) + timedelta(days=15)),
             "status": "active",
             "payment_method": "card",
             "notes": "Member premium sejak 2 minggu lalu",
-            "created_at": (datetime.now(timezone.utc) - timedelta(days=15)).isoformat()
+            "created_at": (datetime.now(timezone.utc) - timedelta(days=15))
         },
         {
             "id": str(uuid.uuid4()),
@@ -603,12 +603,12 @@ async def seed_data():
             "customer_phone": "081234567003",
             "membership_type": "vip",
             "price": 750000,
-            "start_date": (datetime.now(timezone.utc) - timedelta(days=5)).isoformat(),
-            "end_date": (datetime.now(timezone.utc) + timedelta(days=25)).isoformat(),
+            "start_date": (datetime.now(timezone.utc) - timedelta(days=5)),
+            "end_date": (datetime.now(timezone.utc) + timedelta(days=25)),
             "status": "active",
             "payment_method": "card",
             "notes": "VIP member, priority service",
-            "created_at": (datetime.now(timezone.utc) - timedelta(days=5)).isoformat()
+            "created_at": (datetime.now(timezone.utc) - timedelta(days=5))
         }
     ]
     
@@ -631,8 +631,8 @@ async def seed_data():
             "type": "percentage",
             "discount_value": 15,
             "min_transaction": 100000,
-            "start_date": datetime.now(timezone.utc).isoformat(),
-            "end_date": (datetime.now(timezone.utc) + timedelta(days=90)).isoformat(),
+            "start_date": datetime.now(timezone.utc),
+            "end_date": (datetime.now(timezone.utc) + timedelta(days=90)),
             "is_active": True,
             "terms": "Berlaku Sabtu-Minggu, min transaksi Rp 100.000"
         },
@@ -643,8 +643,8 @@ async def seed_data():
             "type": "fixed",
             "discount_value": 25000,
             "min_transaction": 150000,
-            "start_date": datetime.now(timezone.utc).isoformat(),
-            "end_date": (datetime.now(timezone.utc) + timedelta(days=7)).isoformat(),
+            "start_date": datetime.now(timezone.utc),
+            "end_date": (datetime.now(timezone.utc) + timedelta(days=7)),
             "is_active": True,
             "terms": "Berlaku hari ini, min transaksi Rp 150.000"
         },
@@ -656,8 +656,8 @@ async def seed_data():
             "buy_quantity": 2,
             "get_quantity": 1,
             "applicable_items": ["Cuci Eksterior Small", "Cuci Eksterior Medium", "Cuci Eksterior Large"],
-            "start_date": datetime.now(timezone.utc).isoformat(),
-            "end_date": (datetime.now(timezone.utc) + timedelta(days=30)).isoformat(),
+            "start_date": datetime.now(timezone.utc),
+            "end_date": (datetime.now(timezone.utc) + timedelta(days=30)),
             "is_active": True,
             "terms": "Berlaku untuk semua tipe Cuci Eksterior"
         }
@@ -689,8 +689,8 @@ async def seed_data():
         "total_cash_sales": 350000,
         "petty_cash": 60000,
         "cash_drop": 0,
-        "start_time": yesterday.replace(hour=8, minute=0).isoformat(),
-        "end_time": yesterday.replace(hour=17, minute=0).isoformat(),
+        "start_time": yesterday.replace(hour=8, minute=0),
+        "end_time": yesterday.replace(hour=17, minute=0),
         "status": "closed",
         "notes": "Shift kemarin, variance minus Rp 5.000"
     }
@@ -727,7 +727,7 @@ async def seed_data():
                 "payment_method": "cash",
                 "amount_paid": 60000,
                 "change": 4500,
-                "created_at": yesterday.replace(hour=9, minute=30).isoformat()
+                "created_at": yesterday.replace(hour=9, minute=30)
             },
             {
                 "id": str(uuid.uuid4()),
@@ -755,7 +755,7 @@ async def seed_data():
                 "amount_paid": 0,
                 "change": 0,
                 "notes": "Member Premium - Unlimited wash",
-                "created_at": yesterday.replace(hour=11, minute=15).isoformat()
+                "created_at": yesterday.replace(hour=11, minute=15)
             },
             {
                 "id": str(uuid.uuid4()),
@@ -790,7 +790,7 @@ async def seed_data():
                 "amount_paid": 70763,
                 "change": 0,
                 "promo_applied": "Weekend Special - 15% OFF",
-                "created_at": yesterday.replace(hour=14, minute=45).isoformat()
+                "created_at": yesterday.replace(hour=14, minute=45)
             }
         ]
         
@@ -800,14 +800,14 @@ async def seed_data():
         # Create expense from petty cash
         expense_yesterday = {
             "id": str(uuid.uuid4()),
-            "date": yesterday.replace(hour=12, minute=0).isoformat(),
+            "date": yesterday.replace(hour=12, minute=0),
             "amount": 60000,
             "category": "operational",
             "description": "Petty Cash - Beli tissue, air galon, dll",
             "payment_method": "cash",
             "recorded_by": kasir1_id,
             "shift_id": shift_yesterday["id"],
-            "created_at": yesterday.replace(hour=12, minute=5).isoformat()
+            "created_at": yesterday.replace(hour=12, minute=5)
         }
         await db.expenses.insert_one(expense_yesterday)
         print("✅ Sample expense created (from petty cash)")
@@ -819,7 +819,7 @@ async def seed_data():
     expenses = [
         {
             "id": str(uuid.uuid4()),
-            "date": (datetime.now(timezone.utc) - timedelta(days=7)).isoformat(),
+            "date": (datetime.now(timezone.utc) - timedelta(days=7)),
             "amount": 2500000,
             "category": "gaji",
             "description": "Gaji Bulanan - Kasir & Teknisi",
@@ -829,7 +829,7 @@ async def seed_data():
         },
         {
             "id": str(uuid.uuid4()),
-            "date": (datetime.now(timezone.utc) - timedelta(days=5)).isoformat(),
+            "date": (datetime.now(timezone.utc) - timedelta(days=5)),
             "amount": 500000,
             "category": "utilities",
             "description": "Tagihan Listrik Bulan Lalu",
@@ -838,7 +838,7 @@ async def seed_data():
         },
         {
             "id": str(uuid.uuid4()),
-            "date": (datetime.now(timezone.utc) - timedelta(days=3)).isoformat(),
+            "date": (datetime.now(timezone.utc) - timedelta(days=3)),
             "amount": 1500000,
             "category": "supplies",
             "description": "Pembelian Wax Premium - 20L",
@@ -848,7 +848,7 @@ async def seed_data():
         },
         {
             "id": str(uuid.uuid4()),
-            "date": (datetime.now(timezone.utc) - timedelta(days=2)).isoformat(),
+            "date": (datetime.now(timezone.utc) - timedelta(days=2)),
             "amount": 350000,
             "category": "maintenance",
             "description": "Service Mesin Cuci Tekanan Tinggi",
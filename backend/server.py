@@ -1,28 +1,71 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Header, Query, Response, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 import os
+import asyncio
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field, ConfigDict, EmailStr
 from typing import List, Optional
 import uuid
+from collections import defaultdict
+import base64
 from datetime import datetime, timezone, timedelta
-import bcrypt
 import jwt
 from enum import Enum
 from whatsapp_helper import whatsapp
+from inventory_helper import resolve_catalog, stock_quantities, deduct_inventory
+from outbox import Outbox, apply_once, already_applied, record_applied, APPLIED_FIELD
+from idempotency import IdempotencyStore
+from reports import sales_summary, period_sales, membership_counts, low_stock_count, inventory_summary
+import daily_sales
+from cache_helper import TTLCache
+from indexes import ensure_indexes
+from notification_queue import NotificationQueue
+from reminders import queue_expiry_reminders
+from receipt_templates import ReceiptTemplates
+from membership_usage import insert_usage
+from dates import as_datetime, days_left, unmigrated_collections
+from membership_status import MembershipStatusScheduler, status_for, CURRENT as CURRENT_MEMBERSHIP_STATUSES
+from broadcasts import SEGMENTS, DEFAULT_TEMPLATE, compile_template, queue_broadcast, broadcast_progress, last_visit_backfilled
+from password_helper import passwords, PASSWORD_HASH_TARGET_MS, PASSWORD_HASH_PINNED, PASSWORD_HASH_RECALIBRATE
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+# Dates are stored as BSON datetimes; tz_aware returns them as UTC-aware datetimes
+client = AsyncIOMotorClient(mongo_url, tz_aware=True)
 db = client[os.environ['DB_NAME']]
 
+# Post-checkout side effects (customer stats, stock, receipts) drained in the background
+outbox = Outbox(db)
+
+# Cached responses for retried POS writes (Idempotency-Key header)
+idempotency = IdempotencyStore(db)
+# Outgoing WhatsApp messages (receipts, reminders) sent by a rate-limited background worker
+notifications = NotificationQueue(
+    db, whatsapp.send_message,
+    rate_per_minute=int(os.environ.get('WHATSAPP_RATE_PER_MINUTE', '30'))
+)
+dashboard_cache = TTLCache(ttl_seconds=float(os.environ.get('DASHBOARD_CACHE_SECONDS', '15')))
+# Resolved principals for get_current_user, evicted by the user management routes
+user_cache = TTLCache(ttl_seconds=float(os.environ.get('USER_CACHE_SECONDS', '30')), max_entries=1024)
+
+# Local time zone of the outlets (day boundaries, hourly reports)
+OUTLET_TIMEZONE = os.environ.get('OUTLET_TIMEZONE', 'Asia/Jakarta')
+
+# Flips stored membership statuses (active / expiring_soon / expired) as they fall due
+membership_statuses = MembershipStatusScheduler(db, on_change=dashboard_cache.invalidate)
+
+# WhatsApp receipt templates, compiled per outlet branding
+receipts = ReceiptTemplates(db, OUTLET_TIMEZONE)
+
 # JWT Config
 JWT_SECRET = os.environ.get('JWT_SECRET', 'carwash-pos-secret-key-change-in-production')
 JWT_ALGORITHM = 'HS256'
@@ -39,6 +82,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Prev-Cursor"],
 )
 
 api_router = APIRouter(prefix="/api")
@@ -236,6 +280,7 @@ class Customer(BaseModel):
     join_date: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     total_visits: int = 0
     total_spending: float = 0.0
+    last_visit_at: Optional[datetime] = None
 
 class CustomerCreate(BaseModel):
     name: str
@@ -338,8 +383,9 @@ class InventoryLog(BaseModel):
     inventory_id: str
     inventory_name: str
     change_amount: float
-    previous_stock: float
-    new_stock: float
+    # Filled once the stock update of a deduction has applied
+    previous_stock: Optional[float] = None
+    new_stock: Optional[float] = None
     reason: str
     user_id: str
     user_name: str
@@ -429,6 +475,7 @@ class Transaction(BaseModel):
     invoice_number: str
     kasir_id: str
     kasir_name: str
+    outlet_id: Optional[str] = None
     customer_id: Optional[str] = None
     customer_name: Optional[str] = None
     shift_id: str
@@ -442,6 +489,7 @@ class Transaction(BaseModel):
     gross_margin: float = 0.0
     total_commission: float = 0.0  # Total commission for this transaction
     notes: Optional[str] = None
+    client_ref: Optional[str] = None  # Set for sales uploaded by offline POS sync
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
 class TransactionCreate(BaseModel):
@@ -450,6 +498,14 @@ class TransactionCreate(BaseModel):
     payment_method: PaymentMethod
     payment_received: float
     notes: Optional[str] = None
+    receipt_phone: Optional[str] = None  # Send WhatsApp receipt after checkout
+
+class TransactionBatchItem(TransactionCreate):
+    client_ref: Optional[str] = None  # POS-side id of the queued sale, used to skip re-uploads
+    created_at: Optional[datetime] = None  # When the sale happened offline
+
+class TransactionBatchCreate(BaseModel):
+    transactions: List[TransactionBatchItem]
 
 class Promotion(BaseModel):
     model_config = ConfigDict(extra="ignore")
@@ -497,15 +553,10 @@ class ValidatePromoRequest(BaseModel):
     code: str
     subtotal: float
 
-class NotificationService:
-    @staticmethod
-    async def send_whatsapp(phone: str, message: str):
-        # In production this would call an API like Twilio or WA Gateway
-        print(f"==========================================")
-        print(f"SIMULATED WA SEND to {phone}:")
-        print(f"{message}")
-        print(f"==========================================")
-        return True
+class BroadcastRequest(BaseModel):
+    segment: str = "all"
+    days_inactive: int = Field(60, ge=1)
+    template: str = DEFAULT_TEMPLATE
 
 class SendReceiptRequest(BaseModel):
     transaction_id: str
@@ -513,11 +564,11 @@ class SendReceiptRequest(BaseModel):
 
 
 # Helper Functions
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+async def hash_password(password: str) -> str:
+    return await passwords.hash(password)
 
-def verify_password(password: str, hashed: str) -> bool:
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+async def verify_password(password: str, hashed: str) -> bool:
+    return await passwords.verify(password, hashed)
 
 def create_token(user_id: str, role: str) -> str:
     payload = {
@@ -527,14 +578,22 @@ def create_token(user_id: str, role: str) -> str:
     }
     return jwt.encode(payload, JWT_SECRET, algorithm=JWT_ALGORITHM)
 
+async def load_user(user_id: str) -> Optional[User]:
+    user = await db.users.find_one({"id": user_id}, {"_id": 0, "password_hash": 0})
+    return User(**user) if user else None
+
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     try:
         token = credentials.credentials
         payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user = await db.users.find_one({"id": payload['user_id']}, {"_id": 0})
+        user = await user_cache.get_or_compute(payload['user_id'], lambda: load_user(payload['user_id']))
         if not user:
             raise HTTPException(status_code=401, detail="User not found")
-        return User(**user)
+        if not user.is_active:
+            raise HTTPException(status_code=401, detail="Account is deactivated")
+        return user
+    except HTTPException:
+        raise
     except jwt.ExpiredSignatureError:
         raise HTTPException(status_code=401, detail="Token expired")
     except Exception:
@@ -558,8 +617,7 @@ async def register(user_data: UserCreate):
     user = User(**user_dict)
     
     doc = user.model_dump()
-    doc['password_hash'] = hash_password(user_data.password)
-    doc['created_at'] = doc['created_at'].isoformat()
+    doc['password_hash'] = await hash_password(user_data.password)
     
     await db.users.insert_one(doc)
     return user
@@ -570,15 +628,20 @@ async def login(login_data: LoginRequest):
     if not user_doc:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
-    if not verify_password(login_data.password, user_doc['password_hash']):
+    if not await verify_password(login_data.password, user_doc['password_hash']):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
     if not user_doc.get('is_active', True):
         raise HTTPException(status_code=401, detail="Account is deactivated")
     
+    # Upgrade hashes made with a lower cost while we have the plaintext
+    if passwords.needs_rehash(user_doc['password_hash']):
+        await db.users.update_one(
+            {"id": user_doc['id'], "password_hash": user_doc['password_hash']},
+            {"$set": {"password_hash": await hash_password(login_data.password)}}
+        )
+    
     user_doc.pop('password_hash', None)
-    if isinstance(user_doc.get('created_at'), str):
-        user_doc['created_at'] = datetime.fromisoformat(user_doc['created_at'])
     
     user = User(**user_doc)
     token = create_token(user.id, user.role.value)
@@ -605,9 +668,6 @@ async def get_users(current_user: User = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="Not authorized")
     
     users = await db.users.find({}, {"_id": 0, "password_hash": 0}).to_list(1000)
-    for user in users:
-        if isinstance(user.get('created_at'), str):
-            user['created_at'] = datetime.fromisoformat(user['created_at'])
     return users
 
 @api_router.put("/users/{user_id}")
@@ -633,11 +693,10 @@ async def update_user(user_id: str, update_data: UserUpdate, current_user: User
     
     if filtered_data:
         await db.users.update_one({"id": user_id}, {"$set": filtered_data})
+        user_cache.invalidate(user_id)
         user.update(filtered_data)
     
     user.pop('password_hash', None)
-    if isinstance(user.get('created_at'), str):
-        user['created_at'] = datetime.fromisoformat(user['created_at'])
     
     return user
 
@@ -651,12 +710,13 @@ async def reset_user_password(user_id: str, password_data: PasswordReset, curren
         raise HTTPException(status_code=404, detail="User not found")
     
     # Hash new password
-    new_password_hash = hash_password(password_data.new_password)
+    new_password_hash = await hash_password(password_data.new_password)
     
     await db.users.update_one(
         {"id": user_id},
         {"$set": {"password_hash": new_password_hash}}
     )
+    user_cache.invalidate(user_id)
     
     return {"message": "Password reset successfully"}
 
@@ -674,6 +734,7 @@ async def delete_user(user_id: str, current_user: User = Depends(get_current_use
         raise HTTPException(status_code=400, detail="User has open shift. Please close shift first.")
     
     result = await db.users.update_one({"id": user_id}, {"$set": {"is_active": False}})
+    user_cache.invalidate(user_id)
     if result.modified_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
     
@@ -712,6 +773,7 @@ async def update_outlet(outlet_id: str, outlet_data: OutletUpdate, current_user:
     result = await db.outlets.update_one({"id": outlet_id}, {"$set": update_data})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Outlet not found")
+    receipts.invalidate(outlet_id)
     
     outlet = await db.outlets.find_one({"id": outlet_id}, {"_id": 0})
     return outlet
@@ -729,6 +791,7 @@ async def delete_outlet(outlet_id: str, current_user: User = Depends(get_current
     result = await db.outlets.update_one({"id": outlet_id}, {"$set": {"is_active": False}})
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="Outlet not found")
+    receipts.invalidate(outlet_id)
     
     return {"message": "Outlet deleted successfully"}
 
@@ -748,12 +811,15 @@ async def open_shift(shift_data: ShiftOpen, current_user: User = Depends(get_cur
     )
     
     doc = shift.model_dump()
-    doc['opened_at'] = doc['opened_at'].isoformat()
     # Handle denominations nested model
     if doc.get('opening_denominations'):
         doc['opening_denominations'] = shift_data.denominations.model_dump()
     
-    await db.shifts.insert_one(doc)
+    try:
+        await db.shifts.insert_one(doc)
+    except DuplicateKeyError:
+        # A concurrent request opened one first (unique open shift per kasir)
+        raise HTTPException(status_code=400, detail="Shift already open for this kasir")
     return shift
 
 @api_router.post("/shifts/petty-cash", response_model=PettyCashLog)
@@ -774,7 +840,6 @@ async def add_petty_cash(data: PettyCashCreate, current_user: User = Depends(get
     )
     
     log_doc = log.model_dump()
-    log_doc['created_at'] = log_doc['created_at'].isoformat()
     
     await db.petty_cash_logs.insert_one(log_doc)
     
@@ -814,17 +879,12 @@ async def close_shift(shift_data: ShiftClose, current_user: User = Depends(get_c
     shift_doc['closing_denominations'] = shift_data.denominations.model_dump() if shift_data.denominations else None
     shift_doc['expected_balance'] = expected_balance
     shift_doc['variance'] = variance
-    shift_doc['closed_at'] = datetime.now(timezone.utc).isoformat()
+    shift_doc['closed_at'] = datetime.now(timezone.utc)
     shift_doc['status'] = 'closed'
     shift_doc['notes'] = shift_data.notes
     
     await db.shifts.update_one({"id": shift_data.shift_id}, {"$set": shift_doc})
     
-    if isinstance(shift_doc.get('opened_at'), str):
-        shift_doc['opened_at'] = datetime.fromisoformat(shift_doc['opened_at'])
-    if isinstance(shift_doc.get('closed_at'), str):
-        shift_doc['closed_at'] = datetime.fromisoformat(shift_doc['closed_at'])
-    
     return Shift(**shift_doc)
 
 @api_router.get("/shifts/{shift_id}/summary")
@@ -877,19 +937,11 @@ async def get_current_shift(kasir_id: str, current_user: User = Depends(get_curr
     if not shift:
         return None
     
-    if isinstance(shift.get('opened_at'), str):
-        shift['opened_at'] = datetime.fromisoformat(shift['opened_at'])
-    
     return shift
 
 @api_router.get("/shifts", response_model=List[Shift])
 async def get_shifts(current_user: User = Depends(get_current_user)):
     shifts = await db.shifts.find({}, {"_id": 0}).sort("opened_at", -1).to_list(100)
-    for shift in shifts:
-        if isinstance(shift.get('opened_at'), str):
-            shift['opened_at'] = datetime.fromisoformat(shift['opened_at'])
-        if isinstance(shift.get('closed_at'), str):
-            shift['closed_at'] = datetime.fromisoformat(shift['closed_at'])
     return shifts
 
 # Routes - Customers
@@ -897,30 +949,24 @@ async def get_shifts(current_user: User = Depends(get_current_user)):
 async def create_customer(customer_data: CustomerCreate, current_user: User = Depends(get_current_user)):
     customer = Customer(**customer_data.model_dump())
     doc = customer.model_dump()
-    doc['join_date'] = doc['join_date'].isoformat()
     await db.customers.insert_one(doc)
     return customer
 
 @api_router.get("/customers", response_model=List[Customer])
 async def get_customers(current_user: User = Depends(get_current_user)):
-    customers = await db.customers.find({}, {"_id": 0}).to_list(1000)
-    for customer in customers:
-        if isinstance(customer.get('join_date'), str):
-            customer['join_date'] = datetime.fromisoformat(customer['join_date'])
+    customers = await db.customers.find({}, {"_id": 0, APPLIED_FIELD: 0}).to_list(1000)
     return customers
 
 @api_router.get("/customers/{customer_id}", response_model=Customer)
 async def get_customer(customer_id: str, current_user: User = Depends(get_current_user)):
-    customer = await db.customers.find_one({"id": customer_id}, {"_id": 0})
+    customer = await db.customers.find_one({"id": customer_id}, {"_id": 0, APPLIED_FIELD: 0})
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
-    if isinstance(customer.get('join_date'), str):
-        customer['join_date'] = datetime.fromisoformat(customer['join_date'])
     return customer
 
 @api_router.put("/customers/{customer_id}", response_model=Customer)
 async def update_customer(customer_id: str, customer_data: CustomerUpdate, current_user: User = Depends(get_current_user)):
-    customer = await db.customers.find_one({"id": customer_id}, {"_id": 0})
+    customer = await db.customers.find_one({"id": customer_id}, {"_id": 0, APPLIED_FIELD: 0})
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     
@@ -929,9 +975,6 @@ async def update_customer(customer_id: str, customer_data: CustomerUpdate, curre
         await db.customers.update_one({"id": customer_id}, {"$set": update_data})
         customer.update(update_data)
     
-    if isinstance(customer.get('join_date'), str):
-        customer['join_date'] = datetime.fromisoformat(customer['join_date'])
-    
     return Customer(**customer)
 
 @api_router.delete("/customers/{customer_id}")
@@ -940,8 +983,9 @@ async def delete_customer(customer_id: str, current_user: User = Depends(get_cur
         raise HTTPException(status_code=403, detail="Not authorized")
     
     # Check if customer has active memberships
-    memberships = await db.memberships.find({"customer_id": customer_id}).to_list(10)
-    active_memberships = [m for m in memberships if datetime.fromisoformat(m['end_date'] if isinstance(m['end_date'], str) else m['end_date'].isoformat()) >= datetime.now(timezone.utc)]
+    active_memberships = await db.memberships.count_documents(
+        {"customer_id": customer_id, "status": {"$in": CURRENT_MEMBERSHIP_STATUSES}}
+    )
     
     if active_memberships:
         raise HTTPException(status_code=400, detail="Cannot delete customer with active memberships")
@@ -959,16 +1003,12 @@ async def get_customer_transactions(customer_id: str, current_user: User = Depen
         {"_id": 0}
     ).sort("created_at", -1).to_list(1000)
     
-    for t in transactions:
-        if isinstance(t.get('created_at'), str):
-            t['created_at'] = datetime.fromisoformat(t['created_at'])
-    
     return transactions
 
 # Routes - Memberships
 @api_router.post("/memberships", response_model=Membership)
 async def create_membership(membership_data: MembershipCreate, current_user: User = Depends(get_current_user)):
-    customer = await db.customers.find_one({"id": membership_data.customer_id}, {"_id": 0})
+    customer = await db.customers.find_one({"id": membership_data.customer_id}, {"_id": 0, APPLIED_FIELD: 0})
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
     
@@ -991,41 +1031,20 @@ async def create_membership(membership_data: MembershipCreate, current_user: Use
         membership_type=membership_data.membership_type,
         start_date=start_date,
         end_date=end_date,
-        status=MembershipStatus.ACTIVE,
+        status=status_for(end_date),
         price=membership_data.price
     )
     
     doc = membership.model_dump()
-    doc['start_date'] = doc['start_date'].isoformat()
-    doc['end_date'] = doc['end_date'].isoformat()
-    doc['created_at'] = doc['created_at'].isoformat()
     
     await db.memberships.insert_one(doc)
+    dashboard_cache.invalidate()
     return membership
 
 @api_router.get("/memberships", response_model=List[Membership])
-async def get_memberships(current_user: User = Depends(get_current_user)):
-    memberships = await db.memberships.find({}, {"_id": 0}).to_list(1000)
-    now = datetime.now(timezone.utc)
-    
-    for membership in memberships:
-        if isinstance(membership.get('start_date'), str):
-            membership['start_date'] = datetime.fromisoformat(membership['start_date'])
-        if isinstance(membership.get('end_date'), str):
-            membership['end_date'] = datetime.fromisoformat(membership['end_date'])
-        if isinstance(membership.get('created_at'), str):
-            membership['created_at'] = datetime.fromisoformat(membership['created_at'])
-        if isinstance(membership.get('last_used'), str):
-            membership['last_used'] = datetime.fromisoformat(membership['last_used'])
-        
-        # Update status based on expiry
-        if membership['end_date'] < now:
-            membership['status'] = MembershipStatus.EXPIRED
-        elif (membership['end_date'] - now).days <= 7:
-            membership['status'] = MembershipStatus.EXPIRING_SOON
-        else:
-            membership['status'] = MembershipStatus.ACTIVE
-    
+async def get_memberships(status: Optional[MembershipStatus] = None, current_user: User = Depends(get_current_user)):
+    query = {"status": status.value} if status else {}
+    memberships = await db.memberships.find(query, {"_id": 0}).to_list(1000)
     return memberships
 
 @api_router.get("/memberships/{membership_id}")
@@ -1040,31 +1059,9 @@ async def get_membership_detail(membership_id: str, current_user: User = Depends
         {"_id": 0}
     ).sort("used_at", -1).to_list(1000)
     
-    for usage in usage_history:
-        if isinstance(usage.get('used_at'), str):
-            usage['used_at'] = datetime.fromisoformat(usage['used_at'])
-    
-    # Convert dates
-    if isinstance(membership.get('start_date'), str):
-        membership['start_date'] = datetime.fromisoformat(membership['start_date'])
-    if isinstance(membership.get('end_date'), str):
-        membership['end_date'] = datetime.fromisoformat(membership['end_date'])
-    if isinstance(membership.get('created_at'), str):
-        membership['created_at'] = datetime.fromisoformat(membership['created_at'])
-    if isinstance(membership.get('last_used'), str):
-        membership['last_used'] = datetime.fromisoformat(membership['last_used'])
-    
-    # Update status
     now = datetime.now(timezone.utc)
-    if membership['end_date'] < now:
-        membership['status'] = MembershipStatus.EXPIRED
-    elif (membership['end_date'] - now).days <= 7:
-        membership['status'] = MembershipStatus.EXPIRING_SOON
-    else:
-        membership['status'] = MembershipStatus.ACTIVE
-    
     membership['usage_history'] = usage_history
-    membership['days_remaining'] = (membership['end_date'] - now).days if membership['end_date'] >= now else 0
+    membership['days_remaining'] = days_left(membership['end_date'], now)
     
     return membership
 
@@ -1075,13 +1072,16 @@ async def extend_membership(membership_id: str, days: int, current_user: User =
     if not membership:
         raise HTTPException(status_code=404, detail="Membership not found")
     
-    end_date = datetime.fromisoformat(membership['end_date']) if isinstance(membership['end_date'], str) else membership['end_date']
+    end_date = as_datetime(membership['end_date'])
+    if end_date is None:
+        raise HTTPException(status_code=400, detail="Membership end date is unreadable; run migrate_dates.py")
     new_end_date = end_date + timedelta(days=days)
     
     await db.memberships.update_one(
         {"id": membership_id},
-        {"$set": {"end_date": new_end_date.isoformat()}}
+        {"$set": {"end_date": new_end_date, "status": status_for(new_end_date)}}
     )
+    dashboard_cache.invalidate()
     
     return {"message": f"Membership extended by {days} days", "new_end_date": new_end_date.isoformat()}
 
@@ -1100,45 +1100,39 @@ async def delete_membership(membership_id: str, current_user: User = Depends(get
     return {"message": "Membership deleted successfully"}
 
 @api_router.post("/memberships/use")
-async def record_membership_usage(usage_data: MembershipUsage, current_user: User = Depends(get_current_user)):
+async def record_membership_usage(
+    usage_data: MembershipUsage,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: User = Depends(get_current_user)
+):
+    return await idempotency.run(
+        f"memberships-use:{current_user.id}", idempotency_key,
+        lambda: _record_membership_usage(usage_data, current_user),
+        body=usage_data
+    )
+
+async def _record_membership_usage(usage_data: MembershipUsage, current_user: User):
     # Find customer by phone
-    customer = await db.customers.find_one({"phone": usage_data.phone}, {"_id": 0})
+    customer = await db.customers.find_one({"phone": usage_data.phone}, {"_id": 0, APPLIED_FIELD: 0})
     if not customer:
         raise HTTPException(status_code=404, detail="Nomor telepon tidak terdaftar")
     
-    # Find active membership
+    # Find active All You Can Wash membership and the service
     now = datetime.now(timezone.utc)
-    memberships = await db.memberships.find(
-        {"customer_id": customer['id']},
-        {"_id": 0}
-    ).to_list(100)
-    
-    active_membership = None
-    for m in memberships:
-        end_date = datetime.fromisoformat(m['end_date']) if isinstance(m['end_date'], str) else m['end_date']
-        if end_date >= now and m['membership_type'] != 'regular':
-            active_membership = m
-            break
+    active_membership, service = await asyncio.gather(
+        db.memberships.find_one(
+            {"customer_id": customer['id'], "end_date": {"$gte": now}, "membership_type": {"$ne": "regular"}},
+            {"_id": 0}
+        ),
+        db.services.find_one({"id": usage_data.service_id}, {"_id": 0})
+    )
     
     if not active_membership:
         raise HTTPException(status_code=400, detail="Tidak ada membership All You Can Wash yang aktif")
-    
-    # Check if already used today
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    today_usage = await db.membership_usage.find_one({
-        "membership_id": active_membership['id'],
-        "used_at": {"$gte": today_start.isoformat()}
-    })
-    
-    if today_usage:
-        raise HTTPException(status_code=400, detail="Membership sudah digunakan hari ini. Limit 1x per hari.")
-    
-    # Get service info
-    service = await db.services.find_one({"id": usage_data.service_id}, {"_id": 0})
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
     
-    # Record usage
+    # Record usage; the unique (membership_id, day) index allows one per outlet-local day
     usage_record = {
         "id": str(uuid.uuid4()),
         "membership_id": active_membership['id'],
@@ -1148,36 +1142,37 @@ async def record_membership_usage(usage_data: MembershipUsage, current_user: Use
         "service_name": service['name'],
         "kasir_id": current_user.id,
         "kasir_name": current_user.full_name,
-        "used_at": now.isoformat()
+        "used_at": now
     }
     
-    await db.membership_usage.insert_one(usage_record)
+    if not await insert_usage(db, usage_record, OUTLET_TIMEZONE):
+        raise HTTPException(status_code=400, detail="Membership sudah digunakan hari ini. Limit 1x per hari.")
     
     # Update membership usage count and last_used
     await db.memberships.update_one(
         {"id": active_membership['id']},
         {
             "$inc": {"usage_count": 1},
-            "$set": {"last_used": now.isoformat()}
+            "$set": {"last_used": now}
         }
     )
     
     # Deduct inventory if service has BOM
-    if service.get('bom') and len(service['bom']) > 0:
-        for bom_item in service['bom']:
-            await db.inventory.update_one(
-                {"id": bom_item['inventory_id']},
-                {"$inc": {"current_stock": -bom_item['quantity']}}
-            )
-    
-    end_date_obj = datetime.fromisoformat(active_membership['end_date']) if isinstance(active_membership['end_date'], str) else active_membership['end_date']
+    await deduct_inventory(
+        db,
+        stock_quantities([{"service_id": service['id'], "quantity": 1}], {service['id']: service}, {}),
+        reason=f"Membership usage - {service['name']}",
+        key=f"membership-usage:{usage_record['id']}",
+        user_id=current_user.id,
+        user_name=current_user.full_name
+    )
     
     return {
         "message": "Pencatatan berhasil!",
         "customer_name": customer['name'],
         "service_name": service['name'],
         "membership_type": active_membership['membership_type'],
-        "remaining_days": (end_date_obj - now).days,
+        "remaining_days": days_left(active_membership['end_date'], now),
         "usage_count": active_membership['usage_count'] + 1
     }
 
@@ -1238,7 +1233,7 @@ async def get_products(current_user: User = Depends(get_current_user)):
     # Add stock info from inventory
     for product in products:
         if product.get('inventory_id'):
-            inventory_item = await db.inventory.find_one({"id": product['inventory_id']}, {"_id": 0})
+            inventory_item = await db.inventory.find_one({"id": product['inventory_id']}, {"_id": 0, APPLIED_FIELD: 0})
             if inventory_item:
                 product['stock'] = inventory_item.get('current_stock', 0)
                 product['unit'] = inventory_item.get('unit', 'pcs')
@@ -1291,30 +1286,25 @@ async def create_inventory_item(item_data: InventoryItemCreate, current_user: Us
 
 @api_router.get("/inventory", response_model=List[InventoryItem])
 async def get_inventory(current_user: User = Depends(get_current_user)):
-    items = await db.inventory.find({}, {"_id": 0}).to_list(1000)
-    for item in items:
-        if isinstance(item.get('last_purchase_date'), str):
-            item['last_purchase_date'] = datetime.fromisoformat(item['last_purchase_date'])
+    items = await db.inventory.find({}, {"_id": 0, APPLIED_FIELD: 0}).to_list(1000)
     return items
 
 @api_router.get("/inventory/low-stock")
 async def get_low_stock(current_user: User = Depends(get_current_user)):
-    items = await db.inventory.find({}, {"_id": 0}).to_list(1000)
+    items = await db.inventory.find({}, {"_id": 0, APPLIED_FIELD: 0}).to_list(1000)
     low_stock = [item for item in items if item['current_stock'] <= item['min_stock']]
     return low_stock
 
 @api_router.get("/inventory/{item_id}", response_model=InventoryItem)
 async def get_inventory_item(item_id: str, current_user: User = Depends(get_current_user)):
-    item = await db.inventory.find_one({"id": item_id}, {"_id": 0})
+    item = await db.inventory.find_one({"id": item_id}, {"_id": 0, APPLIED_FIELD: 0})
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
-    if isinstance(item.get('last_purchase_date'), str):
-        item['last_purchase_date'] = datetime.fromisoformat(item['last_purchase_date'])
     return item
 
 @api_router.put("/inventory/{item_id}", response_model=InventoryItem)
 async def update_inventory_item(item_id: str, item_data: InventoryItemUpdate, current_user: User = Depends(get_current_user)):
-    item = await db.inventory.find_one({"id": item_id}, {"_id": 0})
+    item = await db.inventory.find_one({"id": item_id}, {"_id": 0, APPLIED_FIELD: 0})
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
     
@@ -1323,9 +1313,6 @@ async def update_inventory_item(item_id: str, item_data: InventoryItemUpdate, cu
         await db.inventory.update_one({"id": item_id}, {"$set": update_data})
         item.update(update_data)
     
-    if isinstance(item.get('last_purchase_date'), str):
-        item['last_purchase_date'] = datetime.fromisoformat(item['last_purchase_date'])
-    
     return InventoryItem(**item)
 
 @api_router.delete("/inventory/{item_id}")
@@ -1341,7 +1328,7 @@ async def adjust_stock(
     adjustment: StockAdjustmentRequest, 
     current_user: User = Depends(get_current_user)
 ):
-    item = await db.inventory.find_one({"id": item_id}, {"_id": 0})
+    item = await db.inventory.find_one({"id": item_id}, {"_id": 0, APPLIED_FIELD: 0})
     if not item:
         raise HTTPException(status_code=404, detail="Item not found")
         
@@ -1371,84 +1358,247 @@ async def adjust_stock(
     )
     
     doc = log.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
     await db.inventory_logs.insert_one(doc)
+    dashboard_cache.invalidate()
     
     return {"message": "Stock adjusted successfully", "new_stock": new_stock}
 
 
 # Routes - Transactions
-@api_router.post("/transactions", response_model=Transaction)
-async def create_transaction(transaction_data: TransactionCreate, current_user: User = Depends(get_current_user)):
-    # Get current shift
-    shift = await db.shifts.find_one({"kasir_id": current_user.id, "status": "open"}, {"_id": 0})
-    if not shift:
-        raise HTTPException(status_code=400, detail="No open shift. Please open a shift first.")
-    
-    # Calculate totals
-    subtotal = sum(item['price'] * item['quantity'] for item in transaction_data.items)
-    total = subtotal
-    change_amount = transaction_data.payment_received - total
-    
-    if change_amount < 0:
-        raise HTTPException(status_code=400, detail="Payment received is less than total")
-    
-    # Get customer name if customer_id provided
-    customer_name = None
-    if transaction_data.customer_id:
-        customer = await db.customers.find_one({"id": transaction_data.customer_id}, {"_id": 0})
-        if customer:
-            customer_name = customer['name']
-    
-    # Calculate Commission
+async def allocate_sequence(key: str, count: int = 1, upsert: bool = True) -> Optional[int]:
+    """
+    Atomically reserve `count` numbers from the named counter and return the last one reserved;
+    None when the counter does not exist and `upsert` is False
+    """
+    counter = await db.counters.find_one_and_update(
+        {"_id": key},
+        {"$inc": {"seq": count}},
+        upsert=upsert,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter['seq'] if counter else None
+
+async def seed_invoice_counter(invoice_prefix: str, key: str):
+    """
+    Create a day's invoice counter at the highest number already issued that day
+    (e.g. by the old regex-based numbering), before any number is handed out
+    """
+    legacy = await db.transactions.find_one(
+        {"invoice_number": {"$regex": f"^INV-{invoice_prefix}-"}},
+        {"_id": 0, "invoice_number": 1},
+        sort=[("invoice_number", -1)]
+    )
+    seq = int(legacy['invoice_number'].split('-')[-1]) if legacy else 0
+    try:
+        await db.counters.update_one({"_id": key}, {"$max": {"seq": seq}}, upsert=True)
+    except DuplicateKeyError:
+        # A concurrent caller created it first from the same legacy maximum
+        pass
+
+async def allocate_invoice_numbers(day: datetime, count: int = 1) -> List[str]:
+    """Reserve `count` consecutive invoice numbers for the given day (INV-YYYYMMDD-NNNN)"""
+    invoice_prefix = day.strftime("%Y%m%d")
+    key = f"invoice-{invoice_prefix}"
+    last = await allocate_sequence(key, count, upsert=False)
+    if last is None:
+        await seed_invoice_counter(invoice_prefix, key)
+        last = await allocate_sequence(key, count)
+    
+    return [f"INV-{invoice_prefix}-{str(num).zfill(4)}" for num in range(last - count + 1, last + 1)]
+
+def apply_commission(items: List[dict], services_by_id: dict):
+    """Attach commission_amount to each item from its service's commission_rate; returns (items, total)"""
     total_commission = 0.0
     items_with_commission = []
     
-    for item in transaction_data.items:
+    for item in items:
         commission_amount = 0.0
-        
+    
         # If item has a service_id and a technician_id is provided in the item (needs updatting frontend/transactioncreate model)
         # Assuming frontend sends: {..., "technician_id": "uuid", "technician_name": "Name"} for services
-        
+    
         # Check if service
         if item.get('service_id'):
-            # Fetch service to get commission rate
-            service_item = await db.services.find_one({"id": item['service_id']}, {"_id": 0})
+            service_item = services_by_id.get(item['service_id'])
             if service_item and service_item.get('commission_rate', 0) > 0:
                 # Calculate commission: Price * Rate / 100 * Quantity
                 # Note: Commission should probably be based on Price AFTER discount? 
                 # For now let's base on Item Price * Quantity. 
                 # If transaction has global discount, this might be standardized. 
                 # Let's effectively use item price.
-                
+            
                 commission_amount = (item['price'] * item['quantity']) * (service_item['commission_rate'] / 100)
-        
+    
         # Add commission data to the item dict if valid
         item['commission_amount'] = commission_amount
         if commission_amount > 0:
             total_commission += commission_amount
-            
+        
         items_with_commission.append(item)
     
-    # Generate invoice number
-    today = datetime.now(timezone.utc)
-    invoice_prefix = today.strftime("%Y%m%d")
-    last_invoice = await db.transactions.find_one(
-        {"invoice_number": {"$regex": f"^INV-{invoice_prefix}"}},
-        {"_id": 0},
-        sort=[("created_at", -1)]
+    return items_with_commission, total_commission
+
+# Outbox effects for a stored transaction
+async def stored_sales(payload: dict) -> List[dict]:
+    """Per-sale effects of the event's transactions that were stored; a batch insert may skip some"""
+    sales = payload['sales']
+    if len(sales) == 1:
+        # The outbox only runs an event once its source exists
+        return list(sales.values())
+    stored = await db.transactions.find({"id": {"$in": list(sales)}}, {"_id": 0, "id": 1}).to_list(len(sales))
+    return [sales[t['id']] for t in stored]
+
+async def apply_customer_stats(payload: dict, key: str):
+    customer_stats = {}
+    for sale in await stored_sales(payload):
+        if not sale['customer_id']:
+            continue
+        stats = customer_stats.setdefault(sale['customer_id'], {"visits": 0, "spending": 0, "last_visit": sale['last_visit']})
+        stats['visits'] += 1
+        stats['spending'] += sale['spending']
+        stats['last_visit'] = max(stats['last_visit'], sale['last_visit'])
+    if not customer_stats or await already_applied(db, key, "customers"):
+        return
+    not_applied, mark_applied = apply_once(key)
+    operations = []
+    for customer_id, stats in customer_stats.items():
+        update = {
+            "$inc": {"total_visits": stats['visits'], "total_spending": stats['spending']},
+            "$push": mark_applied
+        }
+        if stats.get('last_visit'):
+            update["$max"] = {"last_visit_at": stats['last_visit']}
+        operations.append(UpdateOne({"id": customer_id, **not_applied}, update))
+    await db.customers.bulk_write(operations, ordered=False)
+    await record_applied(db, key, "customers", {"id": {"$in": list(customer_stats)}})
+
+async def apply_stock_deduction(payload: dict, key: str):
+    stock = defaultdict(float)
+    for sale in await stored_sales(payload):
+        for inventory_id, quantity in sale['stock'].items():
+            stock[inventory_id] += quantity
+    await deduct_inventory(
+        db,
+        stock,
+        reason=payload['stock_reason'],
+        key=key,
+        user_id=payload['user_id'],
+        user_name=payload['user_name']
+    )
+    dashboard_cache.invalidate()
+
+async def enqueue_receipt(transaction: dict, phone: str) -> dict:
+    """Queue the WhatsApp receipt for a stored transaction (once per transaction and phone)"""
+    return await notifications.enqueue(
+        "receipt", phone, await receipts.render(transaction),
+        reference=transaction['id'], dedupe_key=f"receipt:{transaction['id']}:{phone}"
+    )
+
+async def apply_receipt(payload: dict, key: str):
+    # Idempotent through the notification dedupe_key
+    phones = {sale['transaction_id']: sale['receipt_phone'] for sale in await stored_sales(payload) if sale['receipt_phone']}
+    transactions = await db.transactions.find({"id": {"$in": list(phones)}}, {"_id": 0}).to_list(len(phones))
+    for transaction in transactions:
+        await enqueue_receipt(transaction, phones[transaction['id']])
+
+async def apply_daily_sales(payload: dict, key: str):
+    transactions = await db.transactions.find(
+        {"id": {"$in": payload['transaction_ids']}}, {"_id": 0}
+    ).to_list(len(payload['transaction_ids']))
+    await daily_sales.apply_transactions(db, transactions, OUTLET_TIMEZONE, key=key)
+
+outbox.register("customer_stats", apply_customer_stats)
+outbox.register("inventory", apply_stock_deduction)
+outbox.register("receipt", apply_receipt)
+outbox.register("daily_sales", apply_daily_sales)
+
+async def apply_broadcast(payload: dict, key: str):
+    # Idempotent through the per-recipient notification dedupe_key
+    broadcast = await db.broadcasts.find_one({"id": payload['broadcast_id']}, {"_id": 0})
+    promotion = await db.promotions.find_one({"id": broadcast['promotion_id']}, {"_id": 0})
+    await queue_broadcast(db, notifications, broadcast, promotion)
+
+outbox.register("broadcast", apply_broadcast)
+
+def sale_effects(transaction: Transaction, items: List[dict], services_by_id: dict, products_by_id: dict,
+                 receipt_phone: Optional[str] = None) -> dict:
+    """What one sale changes outside the transactions collection"""
+    return {
+        "transaction_id": transaction.id,
+        "customer_id": transaction.customer_id,
+        "spending": transaction.total,
+        "last_visit": transaction.created_at,
+        "stock": stock_quantities(items, services_by_id, products_by_id),
+        "receipt_phone": receipt_phone
+    }
+
+def sales_event(sales: List[dict], current_user: User, stock_reason: str) -> dict:
+    """
+    One outbox event for the sales built with `sale_effects`; handlers merge the effects
+    of the sales that were stored into one bulk write per collection
+    """
+    effects = ["inventory", "daily_sales"]
+    if any(sale['customer_id'] for sale in sales):
+        effects.append("customer_stats")
+    if any(sale['receipt_phone'] for sale in sales):
+        effects.append("receipt")
+    transaction_ids = [sale['transaction_id'] for sale in sales]
+    source_id = transaction_ids[0] if len(transaction_ids) == 1 else transaction_ids
+    return outbox.build_event("transactions", source_id, effects, {
+        "transaction_ids": transaction_ids,
+        "sales": {sale['transaction_id']: sale for sale in sales},
+        "stock_reason": stock_reason,
+        "user_id": current_user.id,
+        "user_name": current_user.full_name
+    })
+
+@api_router.post("/transactions", response_model=Transaction)
+async def create_transaction(
+    transaction_data: TransactionCreate,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    current_user: User = Depends(get_current_user)
+):
+    return await idempotency.run(
+        f"transactions:{current_user.id}", idempotency_key,
+        lambda: _create_transaction(transaction_data, current_user),
+        body=transaction_data
     )
+
+async def _create_transaction(transaction_data: TransactionCreate, current_user: User):
+    # Get current shift
+    shift = await db.shifts.find_one({"kasir_id": current_user.id, "status": "open"}, {"_id": 0})
+    if not shift:
+        raise HTTPException(status_code=400, detail="No open shift. Please open a shift first.")
     
-    if last_invoice:
-        last_num = int(last_invoice['invoice_number'].split('-')[-1])
-        invoice_number = f"INV-{invoice_prefix}-{str(last_num + 1).zfill(4)}"
-    else:
-        invoice_number = f"INV-{invoice_prefix}-0001"
+    # Calculate totals
+    subtotal = sum(item['price'] * item['quantity'] for item in transaction_data.items)
+    total = subtotal
+    change_amount = transaction_data.payment_received - total
+    
+    if change_amount < 0:
+        raise HTTPException(status_code=400, detail="Payment received is less than total")
+    
+    # Get customer name if customer_id provided
+    customer_name = None
+    if transaction_data.customer_id:
+        customer = await db.customers.find_one({"id": transaction_data.customer_id}, {"_id": 0, APPLIED_FIELD: 0})
+        if customer:
+            customer_name = customer['name']
+    
+    # Resolve every referenced service/product once; reused for commission and stock deduction
+    services_by_id, products_by_id = await resolve_catalog(db, transaction_data.items)
+    
+    # Calculate Commission
+    items_with_commission, total_commission = apply_commission(transaction_data.items, services_by_id)
+    
+    # Generate invoice number
+    invoice_number = (await allocate_invoice_numbers(datetime.now(timezone.utc)))[0]
     
     transaction = Transaction(
         invoice_number=invoice_number,
         kasir_id=current_user.id,
         kasir_name=current_user.full_name,
+        outlet_id=current_user.outlet_id,
         customer_id=transaction_data.customer_id,
         customer_name=customer_name,
         shift_id=shift['id'],
@@ -1463,54 +1613,244 @@ async def create_transaction(transaction_data: TransactionCreate, current_user:
     )
     
     doc = transaction.model_dump()
-    doc['created_at'] = doc['created_at'].isoformat()
     
+    # Side effects run in the outbox worker; the event is written first so a stored sale always has one
+    await outbox.enqueue(sales_event(
+        [sale_effects(transaction, transaction_data.items, services_by_id, products_by_id, transaction_data.receipt_phone)],
+        current_user, stock_reason=f"Sale {invoice_number}"
+    ))
     await db.transactions.insert_one(doc)
+    dashboard_cache.invalidate()
     
-    # Update customer stats if customer_id provided
-    if transaction_data.customer_id:
-        await db.customers.update_one(
-            {"id": transaction_data.customer_id},
-            {"$inc": {"total_visits": 1, "total_spending": total}}
-        )
+    return transaction
+
+TRANSACTION_BATCH_LIMIT = 500
+DUPLICATE_KEY = 11000
+
+async def mark_batch_failures(error: BulkWriteError, accepted: list):
+    """
+    Update batch results for the sales an unordered insert_many did not store
+
+    A duplicate client_ref means a concurrent upload stored the sale first; the
+    result points at that transaction. The batch's outbox effects skip rows that
+    were not stored.
+    """
+    for write_error in error.details.get('writeErrors', []):
+        result = accepted[write_error['index']][0]
+        client_ref = result.get('client_ref')
+        duplicate_ref = 'client_ref' in write_error.get('keyPattern', {}) or 'client_ref' in write_error.get('errmsg', '')
+        if write_error.get('code') == DUPLICATE_KEY and client_ref and duplicate_ref:
+            stored = await db.transactions.find_one(
+                {"client_ref": client_ref}, {"_id": 0, "id": 1, "invoice_number": 1}
+            ) or {}
+            result.update(status="duplicate", transaction_id=stored.get('id'), invoice_number=stored.get('invoice_number'))
+        else:
+            logging.error(f"Offline sync insert failed for {client_ref}: {write_error.get('errmsg')}")
+            result.update(status="error", transaction_id=None, invoice_number=None,
+                          detail=write_error.get('errmsg', 'Insert failed'))
+
+@api_router.post("/transactions/batch")
+async def create_transactions_batch(batch: TransactionBatchCreate, current_user: User = Depends(get_current_user)):
+    """Ingest sales queued by an offline POS; reports the outcome of each entry"""
+    entries = batch.transactions
+    if len(entries) > TRANSACTION_BATCH_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Batch is limited to {TRANSACTION_BATCH_LIMIT} transactions")
     
-    # Deduct inventory based on items
-    for item in transaction_data.items:
-        # Check if it's a service with BOM
-        if item.get('service_id'):
-            service = await db.services.find_one({"id": item['service_id']}, {"_id": 0})
-            if service and service.get('bom') and len(service['bom']) > 0:
-                for bom_item in service['bom']:
-                    quantity_to_deduct = bom_item['quantity'] * item['quantity']
-                    await db.inventory.update_one(
-                        {"id": bom_item['inventory_id']},
-                        {"$inc": {"current_stock": -quantity_to_deduct}}
-                    )
+    shift = await db.shifts.find_one({"kasir_id": current_user.id, "status": "open"}, {"_id": 0})
+    if not shift:
+        raise HTTPException(status_code=400, detail="No open shift. Please open a shift first.")
+    
+    # Everything the batch references, fetched once
+    all_items = [item for entry in entries for item in entry.items]
+    customer_ids = list({entry.customer_id for entry in entries if entry.customer_id})
+    client_refs = [entry.client_ref for entry in entries if entry.client_ref]
+    
+    (services_by_id, products_by_id), customers, existing = await asyncio.gather(
+        resolve_catalog(db, all_items),
+        db.customers.find({"id": {"$in": customer_ids}}, {"_id": 0, "id": 1, "name": 1}).to_list(None),
+        db.transactions.find(
+            {"client_ref": {"$in": client_refs}},
+            {"_id": 0, "id": 1, "client_ref": 1, "invoice_number": 1}
+        ).to_list(None)
+    )
+    customer_names = {c['id']: c['name'] for c in customers}
+    already_uploaded = {t['client_ref']: t for t in existing}
+    
+    results = []
+    accepted = []  # (result, entry, created_at, subtotal)
+    seen_refs = {}  # client_ref -> result of the entry in this batch that keeps it
+    in_batch_duplicates = []
+    now = datetime.now(timezone.utc)
+    
+    for index, entry in enumerate(entries):
+        result = {"index": index, "client_ref": entry.client_ref}
+        results.append(result)
+        
+        if entry.client_ref in already_uploaded:
+            previous = already_uploaded[entry.client_ref]
+            result.update(status="duplicate", transaction_id=previous.get('id'), invoice_number=previous.get('invoice_number'))
+            continue
+        if entry.client_ref and entry.client_ref in seen_refs:
+            # Filled in from the kept entry once the batch is stored
+            result.update(status="duplicate")
+            in_batch_duplicates.append(result)
+            continue
+        if not entry.items:
+            result.update(status="error", detail="Transaction has no items")
+            continue
+        subtotal = sum(item['price'] * item['quantity'] for item in entry.items)
+        if entry.payment_received < subtotal:
+            result.update(status="error", detail="Payment received is less than total")
+            continue
         
-        # Check if it's a product linked to inventory
-        elif item.get('product_id'):
-            product = await db.products.find_one({"id": item['product_id']}, {"_id": 0})
-            if product and product.get('inventory_id'):
-                await db.inventory.update_one(
-                    {"id": product['inventory_id']},
-                    {"$inc": {"current_stock": -item['quantity']}}
-                )
+        if entry.client_ref:
+            seen_refs[entry.client_ref] = result
+        created_at = entry.created_at or now
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        accepted.append((result, entry, created_at, subtotal))
+    
+    # One block of invoice numbers per sale day
+    by_day = {}
+    for accepted_entry in accepted:
+        by_day.setdefault(accepted_entry[2].strftime("%Y%m%d"), []).append(accepted_entry)
+    invoice_numbers = {}
+    for day_entries in by_day.values():
+        numbers = await allocate_invoice_numbers(day_entries[0][2], len(day_entries))
+        for accepted_entry, number in zip(day_entries, numbers):
+            invoice_numbers[accepted_entry[0]['index']] = number
+    
+    docs = []
+    sales = []
+    for result, entry, created_at, subtotal in accepted:
+        items_with_commission, total_commission = apply_commission(entry.items, services_by_id)
+        transaction = Transaction(
+            invoice_number=invoice_numbers[result['index']],
+            kasir_id=current_user.id,
+            kasir_name=current_user.full_name,
+            outlet_id=current_user.outlet_id,
+            customer_id=entry.customer_id,
+            customer_name=customer_names.get(entry.customer_id),
+            shift_id=shift['id'],
+            items=items_with_commission,
+            subtotal=subtotal,
+            total=subtotal,
+            payment_method=entry.payment_method,
+            payment_received=entry.payment_received,
+            change_amount=entry.payment_received - subtotal,
+            total_commission=total_commission,
+            notes=entry.notes,
+            client_ref=entry.client_ref,
+            created_at=created_at
+        )
+        docs.append(transaction.model_dump())
+        sales.append(sale_effects(transaction, entry.items, services_by_id, products_by_id, entry.receipt_phone))
+        result.update(status="created", transaction_id=transaction.id, invoice_number=transaction.invoice_number)
+    
+    if docs:
+        # One event for the batch, written first; its effects only count the rows that get stored
+        await outbox.enqueue(sales_event(sales, current_user, stock_reason=f"Offline sync ({len(sales)} sales)"))
+        try:
+            await db.transactions.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            await mark_batch_failures(e, accepted)
+        dashboard_cache.invalidate()
+    
+    for result in in_batch_duplicates:
+        kept = seen_refs[result['client_ref']]
+        if kept['status'] == "error":
+            result.update(status="error", detail=kept.get('detail'))
+        result.update(transaction_id=kept.get('transaction_id'), invoice_number=kept.get('invoice_number'))
     
-    return transaction
+    return {
+        "created": sum(1 for r in results if r['status'] == "created"),
+        "duplicates": sum(1 for r in results if r['status'] == "duplicate"),
+        "failed": sum(1 for r in results if r['status'] == "error"),
+        "results": results
+    }
+
+def encode_cursor(transaction: dict) -> str:
+    """Opaque keyset cursor for a transaction's (created_at, id) position"""
+    created_at = as_datetime(transaction['created_at'])
+    raw = f"{created_at.isoformat() if created_at else transaction['created_at']}|{transaction['id']}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor: str):
+    try:
+        created_at, transaction_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').rsplit('|', 1)
+        return datetime.fromisoformat(created_at), transaction_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
 
 @api_router.get("/transactions")
-async def get_transactions(current_user: User = Depends(get_current_user)):
+async def get_transactions(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    date_from: Optional[datetime] = None,
+    date_to: Optional[datetime] = None,
+    kasir_id: Optional[str] = None,
+    payment_method: Optional[PaymentMethod] = None,
+    customer_id: Optional[str] = None,
+    shift_id: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Newest-first transactions, keyset-paginated on (created_at, id)
+
+    `before` pages towards older sales and `after` towards newer ones; the
+    cursors for the neighbouring pages come back in the X-Next-Cursor (older)
+    and X-Prev-Cursor (newer) headers.
+    """
+    query = {}
     # Kasir only see their own transactions
     if current_user.role == UserRole.KASIR:
-        query = {"kasir_id": current_user.id}
-    else:
+        query["kasir_id"] = current_user.id
+    elif kasir_id:
         # Owner, Manager, Teknisi can see all
-        query = {}
+        query["kasir_id"] = kasir_id
+    if payment_method:
+        query["payment_method"] = payment_method.value
+    if customer_id:
+        query["customer_id"] = customer_id
+    if shift_id:
+        query["shift_id"] = shift_id
+    if date_from or date_to:
+        query["created_at"] = {}
+        if date_from:
+            query["created_at"]["$gte"] = date_from
+        if date_to:
+            query["created_at"]["$lte"] = date_to
+    
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+    
+    direction = -1
+    if before or after:
+        created_at, transaction_id = decode_cursor(before or after)
+        op = "$lt" if before else "$gt"
+        direction = -1 if before else 1
+        query = {"$and": [query, {"$or": [
+            {"created_at": {op: created_at}},
+            {"created_at": created_at, "id": {op: transaction_id}}
+        ]}]}
+    
+    transactions = await db.transactions.find(query, {"_id": 0}).sort(
+        [("created_at", direction), ("id", direction)]
+    ).limit(limit + 1).to_list(limit + 1)
+    
+    has_more = len(transactions) > limit
+    transactions = transactions[:limit]
+    if direction == 1:
+        transactions.reverse()
+    
+    if transactions:
+        if has_more or after:
+            response.headers["X-Next-Cursor"] = encode_cursor(transactions[-1])
+        if before or (after and has_more):
+            response.headers["X-Prev-Cursor"] = encode_cursor(transactions[0])
     
-    transactions = await db.transactions.find(query, {"_id": 0}).sort("created_at", -1).to_list(1000)
-    for transaction in transactions:
-        if isinstance(transaction.get('created_at'), str):
-            transaction['created_at'] = datetime.fromisoformat(transaction['created_at'])
     return transactions
 
 @api_router.get("/transactions/today")
@@ -1519,16 +1859,12 @@ async def get_today_transactions(current_user: User = Depends(get_current_user))
     
     # Kasir only see their own transactions
     if current_user.role == UserRole.KASIR:
-        query = {"created_at": {"$gte": today_start.isoformat()}, "kasir_id": current_user.id}
+        query = {"created_at": {"$gte": today_start}, "kasir_id": current_user.id}
     else:
-        query = {"created_at": {"$gte": today_start.isoformat()}}
+        query = {"created_at": {"$gte": today_start}}
     
     transactions = await db.transactions.find(query, {"_id": 0}).to_list(1000)
     
-    for transaction in transactions:
-        if isinstance(transaction.get('created_at'), str):
-            transaction['created_at'] = datetime.fromisoformat(transaction['created_at'])
-    
     return transactions
 
 @api_router.get("/transactions/{transaction_id}")
@@ -1541,64 +1877,85 @@ async def get_transaction_detail(transaction_id: str, current_user: User = Depen
     if current_user.role == UserRole.KASIR and transaction['kasir_id'] != current_user.id:
         raise HTTPException(status_code=403, detail="Not authorized to view this transaction")
     
-    if isinstance(transaction.get('created_at'), str):
-        transaction['created_at'] = datetime.fromisoformat(transaction['created_at'])
-    
     return transaction
 
 # Routes - Dashboard
 @api_router.get("/dashboard/stats")
 async def get_dashboard_stats(current_user: User = Depends(get_current_user)):
-    today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+    # Every open dashboard polls this; concurrent callers share one computation
+    return await dashboard_cache.get_or_compute("stats", compute_dashboard_stats)
+
+async def compute_dashboard_stats() -> dict:
+    now = datetime.now(timezone.utc)
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
     
-    # Today's transactions
-    today_transactions = await db.transactions.find(
-        {"created_at": {"$gte": today_start.isoformat()}}
-    ).to_list(1000)
+    today, memberships, low_stock = await asyncio.gather(
+        period_sales(db, today_start),
+        membership_counts(db),
+        low_stock_count(db)
+    )
     
-    today_revenue = sum(t.get('total', 0) for t in today_transactions)
-    today_count = len(today_transactions)
+    return {
+        "today_revenue": today['revenue'],
+        "today_transactions": today['count'],
+        "active_memberships": memberships['active'],
+        "expiring_memberships": memberships['expiring'],
+        "low_stock_items": low_stock,
+        "kasir_performance": today['kasir']
+    }
+
+# Routes - Reports
+@api_router.get("/reports/summary")
+async def get_reports_summary(
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to"),
+    outlet: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Final figures for the reports page, aggregated in MongoDB"""
+    if current_user.role not in [UserRole.OWNER, UserRole.MANAGER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
     
-    # Active memberships
-    now = datetime.now(timezone.utc)
-    all_memberships = await db.memberships.find({}, {"_id": 0}).to_list(1000)
-    active_count = 0
-    expiring_count = 0
-    
-    for m in all_memberships:
-        end_date = datetime.fromisoformat(m['end_date']) if isinstance(m['end_date'], str) else m['end_date']
-        if end_date >= now:
-            active_count += 1
-            if (end_date - now).days <= 7:
-                expiring_count += 1
-    
-    # Low stock items
-    low_stock_items = await db.inventory.find({}, {"_id": 0}).to_list(1000)
-    low_stock_count = sum(1 for item in low_stock_items if item['current_stock'] <= item['min_stock'])
-    
-    # Kasir performance today
-    kasir_performance = {}
-    for t in today_transactions:
-        kasir_name = t.get('kasir_name', 'Unknown')
-        if kasir_name not in kasir_performance:
-            kasir_performance[kasir_name] = {'count': 0, 'revenue': 0}
-        kasir_performance[kasir_name]['count'] += 1
-        kasir_performance[kasir_name]['revenue'] += t.get('total', 0)
+    sales, memberships, inventory, customer_count = await asyncio.gather(
+        sales_summary(db, date_from, date_to, outlet, OUTLET_TIMEZONE),
+        membership_counts(db),
+        inventory_summary(db),
+        db.customers.count_documents({})
+    )
     
     return {
-        "today_revenue": today_revenue,
-        "today_transactions": today_count,
-        "active_memberships": active_count,
-        "expiring_memberships": expiring_count,
-        "low_stock_items": low_stock_count,
-        "kasir_performance": kasir_performance
+        **sales,
+        "customer_count": customer_count,
+        "active_memberships": memberships['active'],
+        "expiring_memberships": memberships['expiring'],
+        "inventory_value": inventory['total_value'],
+        "low_stock_count": inventory['low_stock']
     }
 
+@api_router.get("/reports/daily-sales")
+async def get_daily_sales(
+    date_from: str = Query(..., alias="from", pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    date_to: str = Query(..., alias="to", pattern=r"^\d{4}-\d{2}-\d{2}$"),
+    outlet: Optional[str] = None,
+    current_user: User = Depends(get_current_user)
+):
+    """Period totals summed from the daily_sales rollup (local dates, inclusive)"""
+    if current_user.role not in [UserRole.OWNER, UserRole.MANAGER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return await daily_sales.period_totals(db, date_from, date_to, outlet)
+
+@api_router.get("/system/metrics")
+async def get_system_metrics(current_user: User = Depends(get_current_user)):
+    """Runtime counters for operators"""
+    if current_user.role not in [UserRole.OWNER, UserRole.MANAGER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return {"password_hashing": passwords.stats(), "whatsapp_circuit": whatsapp.breaker.snapshot()}
+
 # Public Routes (No Authentication Required)
 @api_router.post("/public/check-membership")
 async def check_membership_public(phone: str):
     """Public endpoint untuk customer cek membership mereka"""
-    customer = await db.customers.find_one({"phone": phone}, {"_id": 0})
+    customer = await db.customers.find_one({"phone": phone}, {"_id": 0, APPLIED_FIELD: 0})
     if not customer:
         raise HTTPException(status_code=404, detail="Nomor telepon tidak ditemukan")
     
@@ -1609,26 +1966,8 @@ async def check_membership_public(phone: str):
     result_memberships = []
     
     for m in memberships:
-        if isinstance(m.get('start_date'), str):
-            m['start_date'] = datetime.fromisoformat(m['start_date'])
-        if isinstance(m.get('end_date'), str):
-            m['end_date'] = datetime.fromisoformat(m['end_date'])
-        if isinstance(m.get('created_at'), str):
-            m['created_at'] = datetime.fromisoformat(m['created_at'])
-        if isinstance(m.get('last_used'), str):
-            m['last_used'] = datetime.fromisoformat(m['last_used'])
-        
-        # Update status
-        if m['end_date'] < now:
-            m['status'] = MembershipStatus.EXPIRED
-        elif (m['end_date'] - now).days <= 7:
-            m['status'] = MembershipStatus.EXPIRING_SOON
-        else:
-            m['status'] = MembershipStatus.ACTIVE
-        
         # Calculate days remaining
-        days_remaining = (m['end_date'] - now).days
-        m['days_remaining'] = days_remaining if days_remaining > 0 else 0
+        m['days_remaining'] = days_left(m['end_date'], now)
         
         result_memberships.append(m)
     
@@ -1647,14 +1986,6 @@ async def get_public_services():
 @api_router.get("/promotions", response_model=List[Promotion])
 async def get_promotions(current_user: User = Depends(get_current_user)):
     promotions = await db.promotions.find({}, {"_id": 0}).to_list(1000)
-    # Convert dates
-    for p in promotions:
-        if isinstance(p.get('start_date'), str):
-            p['start_date'] = datetime.fromisoformat(p['start_date'])
-        if isinstance(p.get('end_date'), str):
-            p['end_date'] = datetime.fromisoformat(p['end_date'])
-        if isinstance(p.get('created_at'), str):
-            p['created_at'] = datetime.fromisoformat(p['created_at'])
     return promotions
 
 @api_router.post("/promotions", response_model=Promotion)
@@ -1670,9 +2001,6 @@ async def create_promotion(promo_data: PromotionCreate, current_user: User = Dep
     promo = Promotion(**promo_data.model_dump())
     
     doc = promo.model_dump()
-    doc['start_date'] = doc['start_date'].isoformat()
-    doc['end_date'] = doc['end_date'].isoformat()
-    doc['created_at'] = doc['created_at'].isoformat()
     
     await db.promotions.insert_one(doc)
     return promo
@@ -1693,11 +2021,6 @@ async def update_promotion(promo_id: str, update_data: PromotionUpdate, current_
         if existing:
             raise HTTPException(status_code=400, detail="Promotion code already in use")
             
-    if 'start_date' in filtered_data:
-        filtered_data['start_date'] = filtered_data['start_date'].isoformat()
-    if 'end_date' in filtered_data:
-        filtered_data['end_date'] = filtered_data['end_date'].isoformat()
-        
     await db.promotions.update_one({"id": promo_id}, {"$set": filtered_data})
     
     return {"message": "Promotion updated successfully"}
@@ -1713,6 +2036,62 @@ async def delete_promotion(promo_id: str, current_user: User = Depends(get_curre
         
     return {"message": "Promotion deleted successfully"}
 
+@api_router.post("/promotions/{promo_id}/broadcast")
+async def broadcast_promotion(promo_id: str, request: BroadcastRequest, current_user: User = Depends(get_current_user)):
+    """
+    Send a promotion to a customer segment over WhatsApp:
+    all, active_members, or lapsed (no visit in `days_inactive` days).
+    Recipients are queued in the background; poll GET /broadcasts/{id} for progress.
+    """
+    if current_user.role not in [UserRole.OWNER, UserRole.MANAGER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    if request.segment not in SEGMENTS:
+        raise HTTPException(status_code=400, detail=f"Unknown segment (use one of: {', '.join(SEGMENTS)})")
+    if request.segment == "lapsed" and not await last_visit_backfilled(db):
+        raise HTTPException(status_code=400, detail="Lapsed segment needs backfill_last_visit.py to have run first")
+    try:
+        compile_template(request.template)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    promo = await db.promotions.find_one({"id": promo_id}, {"_id": 0})
+    if not promo:
+        raise HTTPException(status_code=404, detail="Promotion not found")
+    
+    broadcast = {
+        "id": str(uuid.uuid4()),
+        "promotion_id": promo_id,
+        "promotion_code": promo['code'],
+        "segment": request.segment,
+        "days_inactive": request.days_inactive,
+        "template": request.template,
+        "status": "preparing",
+        "recipients": None,
+        "created_by": current_user.full_name,
+        "created_at": datetime.now(timezone.utc)
+    }
+    # Event first, like transactions: the outbox picks the broadcast up once it exists
+    await outbox.enqueue(outbox.build_event("broadcasts", broadcast['id'], ["broadcast"], {"broadcast_id": broadcast['id']}))
+    await db.broadcasts.insert_one(broadcast)
+    broadcast.pop('_id', None)
+    return broadcast
+
+@api_router.get("/broadcasts")
+async def get_broadcasts(limit: int = Query(50, ge=1, le=500), current_user: User = Depends(get_current_user)):
+    if current_user.role not in [UserRole.OWNER, UserRole.MANAGER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    return await db.broadcasts.find({}, {"_id": 0}).sort("created_at", -1).to_list(limit)
+
+@api_router.get("/broadcasts/{broadcast_id}")
+async def get_broadcast(broadcast_id: str, current_user: User = Depends(get_current_user)):
+    """Broadcast with its messages counted by status (queued / sending / sent / dead)"""
+    if current_user.role not in [UserRole.OWNER, UserRole.MANAGER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    broadcast = await broadcast_progress(db, broadcast_id)
+    if not broadcast:
+        raise HTTPException(status_code=404, detail="Broadcast not found")
+    return broadcast
+
 @api_router.post("/promotions/validate")
 async def validate_promotion(request: ValidatePromoRequest, current_user: User = Depends(get_current_user)):
     code = request.code
@@ -1723,25 +2102,14 @@ async def validate_promotion(request: ValidatePromoRequest, current_user: User =
         raise HTTPException(status_code=404, detail="Invalid promotion code")
         
     # Check expiry
-    start_date = datetime.fromisoformat(promo['start_date']) if isinstance(promo['start_date'], str) else promo['start_date']
-    end_date = datetime.fromisoformat(promo['end_date']) if isinstance(promo['end_date'], str) else promo['end_date']
-    
-    # Fix: Ensure comparison works. 
-    # Use timezone.utc if dates are aware, or naive if naive. 
-    # Since we store as isoformat from datetime.now(timezone.utc), they are offset-aware if parsed correct.
-    # fromisoformat handles offsets.
-    
+    start_date = as_datetime(promo['start_date'])
+    end_date = as_datetime(promo['end_date'])
     now_utc = datetime.now(timezone.utc)
     
-    # Ensure start_date/end_date are aware
-    if start_date.tzinfo is None:
-        start_date = start_date.replace(tzinfo=timezone.utc)
-    if end_date.tzinfo is None:
-        end_date = end_date.replace(tzinfo=timezone.utc)
-    
-    if now_utc < start_date:
+    if start_date and now_utc < start_date:
         raise HTTPException(status_code=400, detail="Promotion has not started yet")
-    if now_utc > end_date:
+    # An unreadable end date counts as expired
+    if end_date is None or now_utc > end_date:
         raise HTTPException(status_code=400, detail="Promotion expired")
         
     # Check limit
@@ -1778,62 +2146,57 @@ async def send_receipt_notification(request: SendReceiptRequest, current_user: U
     if not transaction:
         raise HTTPException(status_code=404, detail="Transaction not found")
     
-    # Format message
-    items_str = "\n".join([f"- {item.get('name', 'Item')} x{item['quantity']}" for item in transaction['items']])
-    message = f"""*OTOPIA Car Wash*
-Invoice: {transaction['invoice_number']}
-Tanggal: {transaction['created_at'].strftime('%d/%m/%Y %H:%M') if isinstance(transaction['created_at'], datetime) else transaction['created_at']}
-
-Detail:
-{items_str}
-
-Total: Rp {transaction['total']:,}
-Metode: {transaction['payment_method']}
-
-Terima kasih atas kunjungan Anda!"""
+    notification = await enqueue_receipt(transaction, request.phone)
+    return {
+        "message": "Receipt queued for WhatsApp",
+        "notification_id": notification['id'],
+        "status": notification['status']
+    }
 
-    await NotificationService.send_whatsapp(request.phone, message)
-    return {"message": "Receipt sent to WhatsApp"}
+@api_router.get("/notifications")
+async def get_notifications(
+    status: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+    current_user: User = Depends(get_current_user)
+):
+    """Recent queued messages, e.g. ?status=dead for the dead-letter list"""
+    if current_user.role not in [UserRole.OWNER, UserRole.MANAGER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    query = {"status": status} if status else {}
+    return await db.notifications.find(query, {"_id": 0}).sort("created_at", -1).to_list(limit)
+
+@api_router.get("/notifications/{notification_id}")
+async def get_notification(notification_id: str, current_user: User = Depends(get_current_user)):
+    notification = await notifications.get(notification_id)
+    if not notification:
+        raise HTTPException(status_code=404, detail="Notification not found")
+    return notification
+
+@api_router.post("/notifications/{notification_id}/retry")
+async def retry_notification(notification_id: str, current_user: User = Depends(get_current_user)):
+    """Requeue a dead-lettered message"""
+    if current_user.role not in [UserRole.OWNER, UserRole.MANAGER]:
+        raise HTTPException(status_code=403, detail="Not authorized")
+    notification = await notifications.retry(notification_id)
+    if not notification:
+        raise HTTPException(status_code=404, detail="No dead-lettered notification with this id")
+    return notification
 
 @api_router.post("/notifications/check-expiring")
 async def check_expiring_memberships_notification(current_user: User = Depends(get_current_user)):
-    # Find memberships expiring in exactly 3 days
-    now = datetime.now(timezone.utc)
-    target_date = now + timedelta(days=3)
-    start_of_day = target_date.replace(hour=0, minute=0, second=0, microsecond=0)
-    end_of_day = target_date.replace(hour=23, minute=59, second=59, microsecond=999)
-    
-    # This query is simplified; in reality stored dates might be strings or objects
-    # Assuming ISO format strings for simplicity based on previous code
-    
-    memberships = await db.memberships.find({
-        "status": "active",
-        "end_date": {"$gte": start_of_day.isoformat(), "$lte": end_of_day.isoformat()}
-    }).to_list(100)
-    
-    count = 0
-    for m in memberships:
-        customer = await db.customers.find_one({"id": m['customer_id']}, {"_id": 0})
-        if customer and customer.get('phone'):
-            msg = f"Halo {customer['name']}, Membership {m['membership_type']} Anda di OTOPIA akan berakhir pada {m['end_date']}. Segera perpanjang!"
-            await NotificationService.send_whatsapp(customer['phone'], msg)
-            count += 1
-            
-    return {"message": f"Sent {count} reminders"}
+    """Queue reminders for memberships ending in 3 days; members already reminded are skipped"""
+    result = await queue_expiry_reminders(db, notifications, days_ahead=3, tz_name=OUTLET_TIMEZONE)
+    return {"message": f"Queued {result['queued']} reminders", **result}
 
 # Expenses Endpoints
 @api_router.get("/expenses", response_model=List[Expense])
 async def get_expenses():
     expenses = await db.expenses.find().sort("date", -1).to_list(1000)
-    for expense in expenses:
-        if isinstance(expense.get('date'), str):
-            expense['date'] = datetime.fromisoformat(expense['date'])
     return expenses
 
 @api_router.post("/expenses", response_model=Expense)
 async def create_expense(expense: Expense, current_user: User = Depends(get_current_user)):
     doc = expense.model_dump()
-    doc['date'] = doc['date'].isoformat()
     doc['created_by'] = current_user.full_name
     await db.expenses.insert_one(doc)
     return expense
@@ -1849,15 +2212,11 @@ async def delete_expense(expense_id: str, current_user: User = Depends(get_curre
 @api_router.get("/payouts", response_model=List[CommissionPayout])
 async def get_payouts():
     payouts = await db.payouts.find().sort("date", -1).to_list(1000)
-    for p in payouts:
-        if isinstance(p.get('date'), str):
-            p['date'] = datetime.fromisoformat(p['date'])
     return payouts
 
 @api_router.post("/payouts", response_model=CommissionPayout)
 async def create_payout(payout: CommissionPayout, current_user: User = Depends(get_current_user)):
     doc = payout.model_dump()
-    doc['date'] = doc['date'].isoformat()
     doc['created_by'] = current_user.full_name
     
     # Store as payout record
@@ -1876,7 +2235,6 @@ async def create_payout(payout: CommissionPayout, current_user: User = Depends(g
         date=payout.date
     )
     exp_doc = expense.model_dump()
-    exp_doc['date'] = exp_doc['date'].isoformat()
     await db.expenses.insert_one(exp_doc)
     
     return payout
@@ -1909,13 +2267,15 @@ async def update_landing_config(config_data: LandingPageConfig, current_user: Us
         raise HTTPException(status_code=403, detail="Not authorized")
     
     config_dict = config_data.model_dump()
-    config_dict['updated_at'] = datetime.now(timezone.utc).isoformat()
+    config_dict['updated_at'] = datetime.now(timezone.utc)
     
     await db.landing_config.update_one(
         {"id": "default"},
         {"$set": config_dict},
         upsert=True
     )
+    # Receipt footers fall back to the landing page contact details
+    receipts.invalidate()
     
     return config_data
 
@@ -1927,7 +2287,7 @@ async def update_landing_config(config_data: LandingPageConfig, current_user: Us
 async def get_whatsapp_status(current_user: User = Depends(get_current_user)):
     """Get WhatsApp service connection status"""
     try:
-        status = whatsapp.get_status()
+        status = await whatsapp.get_status()
         return status
     except Exception as e:
         return {
@@ -1947,7 +2307,7 @@ async def send_test_whatsapp(
         raise HTTPException(status_code=403, detail="Not authorized")
     
     try:
-        result = whatsapp.send_message(phone, message)
+        result = await whatsapp.send_message(phone, message)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -1955,53 +2315,6 @@ async def send_test_whatsapp(
 # Duplicate return statement issue (line 1877), keeping only the latest config_data return
 # Removed: return {"message": f"Sent reminders to {count} customers"}
 
-# ============================================
-# Notifications Endpoints
-# ============================================
-
-class SendReceiptRequest(BaseModel):
-    transaction_id: str
-    phone: str
-
-@api_router.post("/notifications/send-receipt")
-async def send_receipt_notification(
-    request: SendReceiptRequest,
-    current_user: User = Depends(get_current_user)
-):
-    """Send WhatsApp receipt for a transaction"""
-    try:
-        # Get transaction details
-        transaction = await db.transactions.find_one({"id": request.transaction_id}, {"_id": 0})
-        if not transaction:
-            raise HTTPException(status_code=404, detail="Transaction not found")
-        
-        # Prepare items for receipt
-        receipt_items = []
-        for item in transaction.get('items', []):
-            receipt_items.append({
-                'name': item.get('service_name', 'Unknown'),
-                'quantity': item.get('quantity', 1),
-                'price': item.get('price', 0)
-            })
-        
-        # Send via WhatsApp
-        result = whatsapp.send_receipt(
-            phone=request.phone,
-            transaction=transaction,
-            items=receipt_items
-        )
-        
-        if result.get('success'):
-            return {"success": True, "message": f"Receipt sent to {request.phone}"}
-        else:
-            raise HTTPException(status_code=500, detail=result.get('error', 'Failed to send WhatsApp'))
-            
-    except HTTPException:
-        raise
-    except Exception as e:
-        logging.error(f"Failed to send receipt: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
-
 @api_router.get("/shifts/{shift_id}/details")
 async def get_shift_details(shift_id: str, current_user: User = Depends(get_current_user)):
     shift = await db.shifts.find_one({"id": shift_id}, {"_id": 0})
@@ -2009,23 +2322,14 @@ async def get_shift_details(shift_id: str, current_user: User = Depends(get_curr
         raise HTTPException(status_code=404, detail="Shift not found")
     
     # Get time range
-    start_time = shift['opened_at']
-    if isinstance(start_time, str):
-        start_time = datetime.fromisoformat(start_time)
-        
-    end_time = shift.get('closed_at')
-    if end_time:
-        if isinstance(end_time, str):
-            end_time = datetime.fromisoformat(end_time)
-    else:
-        end_time = datetime.now(timezone.utc)
+    start_time = as_datetime(shift['opened_at'])
+    if start_time is None:
+        raise HTTPException(status_code=400, detail="Shift start time is unreadable; run migrate_dates.py")
+    end_time = as_datetime(shift.get('closed_at')) or datetime.now(timezone.utc)
         
     # Query transactions
     transactions = await db.transactions.find({
-        "created_at": {
-            "$gte": start_time.isoformat() if isinstance(start_time, datetime) else start_time,
-            "$lte": end_time.isoformat() if isinstance(end_time, datetime) else end_time
-        }
+        "created_at": {"$gte": start_time, "$lte": end_time}
     }, {"_id": 0}).sort("created_at", -1).to_list(1000)
     
     # Calculate summary from actual transactions
@@ -2033,10 +2337,6 @@ async def get_shift_details(shift_id: str, current_user: User = Depends(get_curr
     payment_methods = {}
     
     for t in transactions:
-        # Convert date for response
-        if isinstance(t.get('created_at'), str):
-            t['created_at'] = datetime.fromisoformat(t['created_at'])
-            
         total_revenue += t.get('total', 0)
         method = t.get('payment_method', 'unknown')
         payment_methods[method] = payment_methods.get(method, 0) + t.get('total', 0)
@@ -2059,8 +2359,31 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def start_background_workers():
+    await ensure_indexes(db)
+    await idempotency.ensure_indexes()
+    await receipts.warm()
+    await membership_statuses.run_once()
+    stale = await unmigrated_collections(db)
+    if stale:
+        logging.warning(f"ISO string dates left in {', '.join(stale)}; run migrate_dates.py, range queries skip them")
+    if not await last_visit_backfilled(db):
+        logging.warning("customers.last_visit_at not backfilled; run backfill_last_visit.py before lapsed broadcasts")
+    if not PASSWORD_HASH_PINNED:
+        await passwords.load_shared_rounds(db, PASSWORD_HASH_TARGET_MS, PASSWORD_HASH_RECALIBRATE)
+    outbox.start()
+    notifications.start()
+    whatsapp.start_health_monitor()
+    membership_statuses.start()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    await outbox.stop()
+    await notifications.stop()
+    await membership_statuses.stop()
+    passwords.shutdown()
+    await whatsapp.aclose()
     client.close()
 
 if __name__ == '__main__':
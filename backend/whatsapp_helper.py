@@ -1,9 +1,11 @@
 """
 WhatsApp Helper Module
-Provides Python interface to Node.js WhatsApp Web.js service
+Provides async Python interface to Node.js WhatsApp Web.js service
 """
 
-import requests
+import asyncio
+import time
+import httpx
 from typing import Optional, Dict
 import os
 from dotenv import load_dotenv
@@ -11,36 +13,165 @@ from dotenv import load_dotenv
 load_dotenv()
 
 WHATSAPP_SERVICE_URL = os.getenv('WHATSAPP_SERVICE_URL', 'http://localhost:3001')
+WHATSAPP_MAX_CONCURRENCY = int(os.getenv('WHATSAPP_MAX_CONCURRENCY', '4'))
+
+WHATSAPP_HEALTH_INTERVAL = float(os.getenv('WHATSAPP_HEALTH_INTERVAL', '15'))
+
+HEALTH_TIMEOUT = httpx.Timeout(2.0)
+SEND_TIMEOUT = httpx.Timeout(10.0, connect=2.0)
+
+OFFLINE_STATUS = {'status': 'offline', 'whatsapp_ready': False}
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the gateway while the circuit is open"""
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+    
+    closed -> open after `failure_threshold` failures in a row; while open, calls
+    fail fast. After `reset_timeout` seconds one probe is let through (half-open):
+    success closes the circuit, failure opens it again. A probe that has not
+    reported back within `reset_timeout` is given up and another one is allowed.
+    """
+    
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = 0.0
+    
+    def allow(self) -> bool:
+        if self.state == 'closed':
+            return True
+        now = time.monotonic()
+        if self.state == 'open' and now - self.opened_at >= self.reset_timeout:
+            self.state = 'half_open'
+            self.probe_started_at = now
+            return True
+        if self.state == 'half_open' and now - self.probe_started_at >= self.reset_timeout:
+            # The previous probe never reported back
+            self.probe_started_at = now
+            return True
+        return False
+    
+    def retry_after(self) -> float:
+        """Seconds until a call may be let through again (0 when it may be now)"""
+        if self.state == 'closed':
+            return 0.0
+        started = self.opened_at if self.state == 'open' else self.probe_started_at
+        return max(self.reset_timeout - (time.monotonic() - started), 0.0)
+    
+    def record_success(self):
+        self.state = 'closed'
+        self.failures = 0
+    
+    def record_failure(self):
+        self.failures += 1
+        if self.state == 'half_open' or self.failures >= self.failure_threshold:
+            self.state = 'open'
+            self.opened_at = time.monotonic()
+    
+    def snapshot(self) -> Dict:
+        return {'state': self.state, 'consecutive_failures': self.failures}
 
 class WhatsAppService:
-    """WhatsApp messaging service wrapper"""
+    """WhatsApp messaging service wrapper on a shared keep-alive HTTP client"""
     
-    def __init__(self):
+    def __init__(self, max_concurrency: int = WHATSAPP_MAX_CONCURRENCY):
         self.base_url = WHATSAPP_SERVICE_URL
+        self._client: Optional[httpx.AsyncClient] = None
+        self._limit = asyncio.Semaphore(max_concurrency)
+        self._max_concurrency = max_concurrency
+        self.breaker = CircuitBreaker(
+            failure_threshold=int(os.getenv('WHATSAPP_BREAKER_FAILURES', '3')),
+            reset_timeout=float(os.getenv('WHATSAPP_BREAKER_RESET_SECONDS', '30'))
+        )
+        self._health: Optional[Dict] = None
+        self._health_checked_at: Optional[float] = None
+        self._monitor: Optional[asyncio.Task] = None
     
-    def is_ready(self) -> bool:
-        """Check if WhatsApp service is ready"""
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=httpx.Limits(
+                    max_connections=self._max_concurrency,
+                    max_keepalive_connections=self._max_concurrency
+                )
+            )
+        return self._client
+    
+    async def aclose(self):
+        """Stop the health monitor and close the pooled connections (call on shutdown)"""
+        if self._monitor is not None:
+            self._monitor.cancel()
+            try:
+                await self._monitor
+            except asyncio.CancelledError:
+                pass
+            self._monitor = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def _request(self, method: str, path: str, timeout: httpx.Timeout, **kwargs) -> httpx.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError('WhatsApp gateway unavailable (circuit open)')
         try:
-            response = requests.get(f'{self.base_url}/health', timeout=2)
-            if response.status_code == 200:
-                data = response.json()
-                return data.get('whatsapp_ready', False)
-            return False
-        except Exception as e:
-            print(f"WhatsApp service check failed: {e}")
-            return False
+            # Bound in-flight gateway calls so a slow gateway cannot pile up requests
+            async with self._limit:
+                response = await self.client.request(method, path, timeout=timeout, **kwargs)
+        except asyncio.CancelledError:
+            # A cancelled caller says nothing about the gateway, but a probe must still resolve
+            if self.breaker.state == 'half_open':
+                self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.record_failure()
+            raise
+        if response.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
     
-    def get_status(self) -> Dict:
-        """Get WhatsApp service status"""
+    async def refresh_health(self) -> Dict:
+        """Call /health now and update the cached status"""
         try:
-            response = requests.get(f'{self.base_url}/health', timeout=2)
-            if response.status_code == 200:
-                return response.json()
-            return {'status': 'offline', 'whatsapp_ready': False}
-        except Exception:
-            return {'status': 'offline', 'whatsapp_ready': False}
+            response = await self._request('GET', '/health', HEALTH_TIMEOUT)
+            health = response.json() if response.status_code == 200 else dict(OFFLINE_STATUS)
+        except Exception as e:
+            health = {**OFFLINE_STATUS, 'error': str(e)}
+        self._health = health
+        self._health_checked_at = time.monotonic()
+        return health
+    
+    async def _monitor_health(self, interval: float):
+        while True:
+            await self.refresh_health()
+            await asyncio.sleep(interval)
+    
+    def start_health_monitor(self, interval: float = WHATSAPP_HEALTH_INTERVAL):
+        """Keep the cached health fresh in the background"""
+        if self._monitor is None:
+            self._monitor = asyncio.create_task(self._monitor_health(interval))
+    
+    async def is_ready(self) -> bool:
+        """Check if WhatsApp service is ready (cached)"""
+        status = await self.get_status()
+        return status.get('whatsapp_ready', False)
     
-    def send_message(self, phone: str, message: str) -> Dict:
+    async def get_status(self) -> Dict:
+        """Get WhatsApp service status from the cache; only the first call goes to the gateway"""
+        health = self._health if self._health is not None else await self.refresh_health()
+        age = time.monotonic() - self._health_checked_at
+        return {**health, 'circuit': self.breaker.snapshot(), 'checked_seconds_ago': round(age, 1)}
+    
+    async def send_message(self, phone: str, message: str) -> Dict:
         """
         Send WhatsApp message
         
@@ -52,10 +183,9 @@ class WhatsAppService:
             dict with success status and details
         """
         try:
-            response = requests.post(
-                f'{self.base_url}/send',
-                json={'phone': phone, 'message': message},
-                timeout=10
+            response = await self._request(
+                'POST', '/send', SEND_TIMEOUT,
+                json={'phone': phone, 'message': message}
             )
             
             if response.status_code == 200:
@@ -66,74 +196,16 @@ class WhatsAppService:
                     'success': False,
                     'error': error_data.get('error', 'Unknown error')
                 }
-        except requests.exceptions.Timeout:
+        except CircuitOpenError as e:
+            # Not sent at all, so callers that retry should not count it as an attempt
+            return {'success': False, 'error': str(e), 'circuit_open': True,
+                    'retry_after': self.breaker.retry_after()}
+        except httpx.TimeoutException:
             return {'success': False, 'error': 'Request timeout'}
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
-    def format_receipt(self, transaction: dict, items: list) -> str:
-        """
-        Format transaction receipt for WhatsApp
-        
-        Args:
-            transaction: Transaction data
-            items: List of cart items
-            
-        Returns:
-            Formatted message string
-        """
-        # Header
-        message = "🧼 *OTOPIA CAR WASH*\n"
-        message += "━━━━━━━━━━━━━━━━━━━━\n\n"
-        
-        # Transaction info
-        from datetime import datetime
-        date_str = datetime.now().strftime("%d/%m/%Y %H:%M")
-        message += f"📅 {date_str}\n"
-        message += f"🎫 Invoice: {transaction.get('invoice_number', 'N/A')}\n\n"
-        
-        # Items
-        message += "*LAYANAN:*\n"
-        for item in items:
-            name = item.get('name', 'Unknown')
-            qty = item.get('quantity', 1)
-            price = item.get('price', 0)
-            total = price * qty
-            message += f"• {name} x{qty}\n"
-            message += f"  Rp {total:,.0f}\n"
-        
-        message += "\n━━━━━━━━━━━━━━━━━━━━\n"
-        
-        # Total
-        total_amount = transaction.get('total', 0)
-        payment_method = transaction.get('payment_method', 'cash').upper()
-        message += f"*TOTAL:* Rp {total_amount:,.0f}\n"
-        message += f"💳 Pembayaran: {payment_method}\n\n"
-        
-        # Footer
-        message += "Terima kasih atas kunjungan Anda!\n"
-        message += "Simpan struk ini sebagai bukti.\n\n"
-        message += "📍 Jl. Sukun Raya No.47C, Semarang\n"
-        message += "📞 0822-2702-5335"
-        
-        return message
-    
-    def send_receipt(self, phone: str, transaction: dict, items: list) -> Dict:
-        """
-        Send formatted receipt via WhatsApp
-        
-        Args:
-            phone: Customer phone number
-            transaction: Transaction data
-            items: Cart items
-            
-        Returns:
-            Send result
-        """
-        message = self.format_receipt(transaction, items)
-        return self.send_message(phone, message)
-    
-    def send_membership_reminder(self, phone: str, customer_name: str, 
+    async def send_membership_reminder(self, phone: str, customer_name: str, 
                                  membership_type: str, days_remaining: int, 
                                  usage_count: int) -> Dict:
         """Send membership reminder"""
@@ -147,7 +219,7 @@ class WhatsAppService:
         message += "OTOPIA Car Wash\n"
         message += "📞 0822-2702-5335"
         
-        return self.send_message(phone, message)
+        return await self.send_message(phone, message)
 
 
 # Global instance
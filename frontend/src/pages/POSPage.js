@@ -1,6 +1,6 @@
 import React, { useState, useEffect, useMemo } from 'react';
 import { Layout } from '../components/Layout';
-import api from '../utils/api';
+import api, { postIdempotent } from '../utils/api';
 import { getCurrentUser } from '../utils/auth';
 import {
   Trash2, CreditCard, Wallet, QrCode, User, Search, ShoppingBag, Wrench, Crown, X,
@@ -266,7 +266,7 @@ export const POSPage = () => {
     }
 
     try {
-      const response = await api.post('/memberships/use', {
+      const response = await postIdempotent('/memberships/use', {
         phone: memberPhone,
         service_id: selectedServiceForMember.id
       });
@@ -330,9 +330,11 @@ export const POSPage = () => {
         payment_method: total === 0 && isMemberTransaction ? 'subscription' : paymentMethod,
         payment_received: total === 0 ? 0 : received,
         notes: notes || null,
+        // Receipt is sent by the backend after the sale is stored
+        receipt_phone: selectedCustomer?.phone || null,
       };
 
-      const response = await api.post('/transactions', transactionData);
+      const response = await postIdempotent('/transactions', transactionData);
 
       setLastTransaction({
         ...response.data,
@@ -344,21 +346,6 @@ export const POSPage = () => {
       });
       setShowSuccessDialog(true);
 
-      // Auto-send WhatsApp if customer has phone
-      if (selectedCustomer && selectedCustomer.phone) {
-        try {
-          await api.post('/notifications/send-receipt', {
-            transaction_id: response.data.id,
-            phone: selectedCustomer.phone
-          });
-          console.log('✅ WhatsApp receipt sent automatically');
-          toast.success('✅ Receipt sent via WhatsApp!', { duration: 2000 });
-        } catch (error) {
-          console.error('WhatsApp auto-send failed:', error);
-          // Don't show error to user, just log it
-        }
-      }
-
       // Reset
       setCart([]);
       setSelectedCustomer(null);
@@ -391,10 +378,10 @@ export const POSPage = () => {
         transaction_id: lastTransaction.id,
         phone: phone
       });
-      toast.success(`✅ Resi terkirim ke WhatsApp ${phone}`);
+      toast.success(`✅ Resi masuk antrean WhatsApp ${phone}`);
     } catch (error) {
-      console.error('WhatsApp send failed:', error);
-      toast.error("WhatsApp tidak terkirim (service mungkin belum siap)");
+      console.error('WhatsApp queue failed:', error);
+      toast.error("Resi WhatsApp gagal dijadwalkan");
     }
   };
 
@@ -30,274 +30,245 @@ import { Textarea } from '../components/ui/textarea';
 export const ReportsPage = () => {
   // State declarations
   const [loading, setLoading] = useState(true);
-  const [transactions, setTransactions] = useState([]);
-  const [customers, setCustomers] = useState([]);
-  const [memberships, setMemberships] = useState([]);
-  const [inventory, setInventory] = useState([]);
-  const [shifts, setShifts] = useState([]);
+  const [summary, setSummary] = useState(null);
   const [dateRange, setDateRange] = useState('today');
   const [startDate, setStartDate] = useState('');
   const [endDate, setEndDate] = useState('');
-  const [expenses, setExpenses] = useState([]);
 
 
   useEffect(() => {
-    fetchAllData();
-  }, []);
+    fetchSummary();
+  }, [dateRange, startDate, endDate]);
 
-  const fetchAllData = async () => {
-    try {
-      const [transRes, custRes, memRes, invRes, shiftRes, expRes] = await Promise.all([
-        api.get('/transactions'),
-        api.get('/customers'),
-        api.get('/memberships'),
-        api.get('/inventory'),
-        api.get('/shifts'),
-        api.get('/expenses'), // Fetch Expenses
-      ]);
-
-      setTransactions(transRes.data);
-      setCustomers(custRes.data);
-      setMemberships(memRes.data);
-      setInventory(invRes.data);
-      setShifts(shiftRes.data);
-      setShifts(shiftRes.data);
-      setExpenses(expRes.data);
-
-
-
-    } catch (error) {
-      toast.error('Gagal memuat data reports');
-    } finally {
-      setLoading(false);
-    }
-  };
-
-  // Filter transactions AND expenses by date range
-  const { filteredTransactions, filteredExpenses } = useMemo(() => {
+  // from/to for the selected range ('all' sends no bounds)
+  const rangeParams = () => {
     const now = new Date();
-    let start, end = now;
-    // ... (date logic same as before) ...
     if (dateRange === 'today') {
-      start = new Date(now.getFullYear(), now.getMonth(), now.getDate());
+      return { from: new Date(now.getFullYear(), now.getMonth(), now.getDate()).toISOString() };
     } else if (dateRange === 'week') {
-      start = new Date(now.getTime() - 7 * 24 * 60 * 60 * 1000);
+      return { from: new Date(now.getTime() - 7 * 24 * 60 * 60 * 1000).toISOString() };
     } else if (dateRange === 'month') {
-      start = new Date(now.getTime() - 30 * 24 * 60 * 60 * 1000);
+      return { from: new Date(now.getTime() - 30 * 24 * 60 * 60 * 1000).toISOString() };
     } else if (dateRange === 'year') {
-      start = new Date(now.getTime() - 365 * 24 * 60 * 60 * 1000);
+      return { from: new Date(now.getTime() - 365 * 24 * 60 * 60 * 1000).toISOString() };
     } else if (dateRange === 'custom' && startDate && endDate) {
-      start = new Date(startDate);
-      end = new Date(endDate);
+      const end = new Date(endDate);
       end.setHours(23, 59, 59, 999);
-    } else {
-      // For 'all', just return everything
-      return {
-        filteredTransactions: transactions,
-        filteredExpenses: expenses
-      };
+      return { from: new Date(startDate).toISOString(), to: end.toISOString() };
     }
+    return {};
+  };
 
-    const ft = transactions.filter(t => {
-      const d = new Date(t.created_at);
-      return d >= start && d <= end;
-    });
+  // All figures are aggregated by the backend; raw collections are only fetched for exports
+  const fetchSummary = async () => {
+    try {
+      const response = await api.get('/reports/summary', { params: rangeParams() });
+      setSummary(response.data);
+    } catch (error) {
+      toast.error('Gagal memuat data reports');
+    } finally {
+      setLoading(false);
+    }
+  };
 
-    const fe = expenses.filter(e => {
-      const d = new Date(e.date);
-      return d >= start && d <= end;
-    });
+  // Page through GET /transactions for exports
+  const fetchTransactionsForExport = async (params = {}) => {
+    const all = [];
+    let cursor = null;
+    do {
+      const response = await api.get('/transactions', {
+        params: { limit: 500, ...params, ...(cursor ? { before: cursor } : {}) }
+      });
+      all.push(...response.data);
+      cursor = response.headers['x-next-cursor'] || null;
+    } while (cursor);
+    return all;
+  };
 
-    return { filteredTransactions: ft, filteredExpenses: fe };
-  }, [transactions, expenses, dateRange, startDate, endDate]);
+  const exportRangeParams = () => {
+    const { from, to } = rangeParams();
+    return { ...(from ? { date_from: from } : {}), ...(to ? { date_to: to } : {}) };
+  };
 
-  // Analytics calculations
   const analytics = useMemo(() => {
-    const totalRevenue = filteredTransactions.reduce((sum, t) => sum + t.total, 0);
-    const totalCount = filteredTransactions.length;
-    const avgTransaction = totalCount > 0 ? totalRevenue / totalCount : 0;
-
-    // Financials
-    const totalExpenses = filteredExpenses.reduce((sum, e) => sum + e.amount, 0);
-    const netProfit = totalRevenue - totalExpenses;
-
-    // ... (rest of analytics) ...
-    const paymentBreakdown = { cash: 0, card: 0, qr: 0, subscription: 0 };
-    filteredTransactions.forEach(t => {
-      paymentBreakdown[t.payment_method] = (paymentBreakdown[t.payment_method] || 0) + t.total;
-    });
-
-    // ... (dailyRevenue logic) ...
-    const dailyRevenue = [];
-    for (let i = 6; i >= 0; i--) {
-      const date = new Date();
-      date.setDate(date.getDate() - i);
-      const dayStart = new Date(date.getFullYear(), date.getMonth(), date.getDate());
-      const dayEnd = new Date(dayStart.getTime() + 24 * 60 * 60 * 1000);
-
-      const dayRevenue = transactions
-        .filter(t => new Date(t.created_at) >= dayStart && new Date(t.created_at) < dayEnd)
-        .reduce((sum, t) => sum + t.total, 0);
-
-      // Also get daily expenses for comparison (optional, but good)
-      // For simplified chart, sticking to revenue
-
-      dailyRevenue.push({
-        day: date.toLocaleDateString('id-ID', { weekday: 'short' }),
-        date: date.toLocaleDateString('id-ID', { day: 'numeric', month: 'short' }),
-        revenue: dayRevenue,
-      });
+    if (!summary) {
+      return {
+        totalRevenue: 0, totalExpenses: 0, netProfit: 0, totalCount: 0, avgTransaction: 0,
+        paymentBreakdown: {}, dailyRevenue: [], topServices: [], hourlyDistribution: Array(24).fill(0),
+        peakHour: 0, topCustomers: [],
+      };
     }
-
-    // Top Services, Hourly, Customers... (same as before)
-    const serviceCount = {};
-    filteredTransactions.forEach(t => {
-      t.items?.forEach(item => {
-        const name = item.service_name || item.product_name || 'Unknown';
-        serviceCount[name] = (serviceCount[name] || 0) + item.quantity;
-      });
-    });
-    const topServices = Object.entries(serviceCount).sort((a, b) => b[1] - a[1]).slice(0, 5);
-
-    const hourlyDistribution = Array(24).fill(0);
-    filteredTransactions.forEach(t => {
-      const hour = new Date(t.created_at).getHours();
-      hourlyDistribution[hour]++;
-    });
-    const peakHour = hourlyDistribution.indexOf(Math.max(...hourlyDistribution));
-
-    const customerSpending = {};
-    filteredTransactions.forEach(t => {
-      if (t.customer_name) customerSpending[t.customer_name] = (customerSpending[t.customer_name] || 0) + t.total;
-    });
-    const topCustomers = Object.entries(customerSpending).sort((a, b) => b[1] - a[1]).slice(0, 5);
-
     return {
-      totalRevenue,
-      totalExpenses,
-      netProfit,
-      totalCount,
-      avgTransaction,
-      paymentBreakdown,
-      dailyRevenue,
-      topServices,
-      hourlyDistribution,
-      peakHour,
-      topCustomers,
+      totalRevenue: summary.total_revenue,
+      totalExpenses: summary.total_expenses,
+      netProfit: summary.net_profit,
+      totalCount: summary.transaction_count,
+      avgTransaction: summary.avg_transaction,
+      paymentBreakdown: summary.payment_breakdown,
+      dailyRevenue: summary.daily_revenue.map(d => {
+        const date = new Date(`${d.date}T00:00:00`);
+        return {
+          day: date.toLocaleDateString('id-ID', { weekday: 'short' }),
+          date: date.toLocaleDateString('id-ID', { day: 'numeric', month: 'short' }),
+          revenue: d.revenue,
+        };
+      }),
+      topServices: summary.top_services,
+      hourlyDistribution: summary.hourly_distribution,
+      peakHour: summary.peak_hour,
+      topCustomers: summary.top_customers,
     };
-  }, [filteredTransactions, filteredExpenses, transactions]); // Added filteredExpenses dependency
+  }, [summary]);
 
-  // ... (Commission, UsersMap, Inventory, Membership, Export handlers same as before) ...
-
-
-
-
-
-
-
-
-
-  // Inventory analytics
-  const inventoryAnalytics = useMemo(() => {
-    const totalValue = inventory.reduce((sum, item) => sum + (item.current_stock * item.unit_cost), 0);
-    const lowStock = inventory.filter(item => item.current_stock <= item.min_stock);
-    const totalItems = inventory.reduce((sum, item) => sum + item.current_stock, 0);
+  const inventoryAnalytics = {
+    totalValue: summary?.inventory_value || 0,
+    lowStockCount: summary?.low_stock_count || 0,
+  };
 
-    return { totalValue, lowStock, totalItems };
-  }, [inventory]);
+  const membershipAnalytics = {
+    active: summary?.active_memberships || 0,
+    expiringSoon: summary?.expiring_memberships || 0,
+  };
 
-  // Membership analytics
-  const membershipAnalytics = useMemo(() => {
-    const active = memberships.filter(m => m.status === 'active');
-    const expiringSoon = active.filter(m => m.days_remaining <= 7);
-    const totalRevenue = memberships.reduce((sum, m) => sum + (m.price || 0), 0);
+  // Export handlers
+  const handleExportSales = async () => {
+    try {
+      const transactions = await fetchTransactionsForExport(exportRangeParams());
+      const salesData = transactions.map(t => ({
+        'Invoice': t.invoice_number,
+        'Tanggal': new Date(t.created_at).toLocaleDateString('id-ID'),
+        'Waktu': new Date(t.created_at).toLocaleTimeString('id-ID', { hour: '2-digit', minute: '2-digit' }),
+        'Kasir': t.kasir_name,
+        'Customer': t.customer_name || 'Walk-in',
+        'Items': t.items?.map(i => i.service_name).join(', ') || '-',
+        'Total': t.total,
+        'Payment Method': t.payment_method,
+      }));
+
+      const success = exportToExcel(salesData, `sales-report-${new Date().toISOString().split('T')[0]}`, 'Sales Report');
+      if (success) toast.success('Sales report berhasil di-export');
+      else toast.error('Gagal export report');
+    } catch (error) {
+      toast.error('Gagal export report');
+    }
+  };
 
-    return { active: active.length, expiringSoon: expiringSoon.length, totalRevenue };
-  }, [memberships]);
+  const handleExportInventory = async () => {
+    try {
+      const response = await api.get('/inventory');
+      const inventoryData = response.data.map(item => ({
+        'SKU': item.sku,
+        'Nama Produk': item.name,
+        'Kategori': item.category,
+        'Stok': item.current_stock,
+        'Unit': item.unit,
+        'Min Stock': item.min_stock,
+        'Max Stock': item.max_stock,
+        'HPP per Unit': item.unit_cost,
+        'Total Nilai': item.current_stock * item.unit_cost,
+        'Supplier': item.supplier || '-',
+      }));
+
+      const success = exportToExcel(inventoryData, `inventory-report-${new Date().toISOString().split('T')[0]}`, 'Inventory Report');
+      if (success) toast.success('Inventory report berhasil di-export');
+      else toast.error('Gagal export report');
+    } catch (error) {
+      toast.error('Gagal export report');
+    }
+  };
 
-  // Export handlers
-  const handleExportSales = () => {
-    const salesData = filteredTransactions.map(t => ({
-      'Invoice': t.invoice_number,
-      'Tanggal': new Date(t.created_at).toLocaleDateString('id-ID'),
-      'Waktu': new Date(t.created_at).toLocaleTimeString('id-ID', { hour: '2-digit', minute: '2-digit' }),
-      'Kasir': t.kasir_name,
-      'Customer': t.customer_name || 'Walk-in',
-      'Items': t.items?.map(i => i.service_name).join(', ') || '-',
-      'Total': t.total,
-      'Payment Method': t.payment_method,
-    }));
-
-    const success = exportToExcel(salesData, `sales-report-${new Date().toISOString().split('T')[0]}`, 'Sales Report');
-    if (success) toast.success('Sales report berhasil di-export');
-    else toast.error('Gagal export report');
+  const handleExportCustomers = async () => {
+    try {
+      const response = await api.get('/customers');
+      const customerData = response.data.map(c => ({
+        'Nama': c.name,
+        'Telepon': c.phone,
+        'Email': c.email || '-',
+        'Total Kunjungan': c.total_visits,
+        'Total Belanja': c.total_spending,
+      }));
+      if (exportToExcel(customerData, `customers-${new Date().toISOString().split('T')[0]}`, 'Customers')) {
+        toast.success('Customer report exported');
+      }
+    } catch (error) {
+      toast.error('Gagal export report');
+    }
   };
 
-  const handleExportInventory = () => {
-    const inventoryData = inventory.map(item => ({
-      'SKU': item.sku,
-      'Nama Produk': item.name,
-      'Kategori': item.category,
-      'Stok': item.current_stock,
-      'Unit': item.unit,
-      'Min Stock': item.min_stock,
-      'Max Stock': item.max_stock,
-      'HPP per Unit': item.unit_cost,
-      'Total Nilai': item.current_stock * item.unit_cost,
-      'Supplier': item.supplier || '-',
-    }));
-
-    const success = exportToExcel(inventoryData, `inventory-report-${new Date().toISOString().split('T')[0]}`, 'Inventory Report');
-    if (success) toast.success('Inventory report berhasil di-export');
-    else toast.error('Gagal export report');
+  const handleExportMemberships = async () => {
+    try {
+      const response = await api.get('/memberships');
+      const membershipData = response.data.map(m => ({
+        'Customer': m.customer_name,
+        'Tipe': m.membership_type,
+        'Status': m.status,
+        'Sisa Hari': m.days_remaining,
+        'Harga': m.price,
+      }));
+      if (exportToExcel(membershipData, `memberships-${new Date().toISOString().split('T')[0]}`, 'Memberships')) {
+        toast.success('Membership report exported');
+      }
+    } catch (error) {
+      toast.error('Gagal export report');
+    }
   };
 
-  const handleExportAll = () => {
-    const sheets = [
-      {
-        data: transactions.map(t => ({
-          'Invoice': t.invoice_number,
-          'Tanggal': new Date(t.created_at).toLocaleString('id-ID'),
-          'Kasir': t.kasir_name,
-          'Customer': t.customer_name || 'Walk-in',
-          'Total': t.total,
-          'Payment': t.payment_method,
-        })),
-        sheetName: 'Sales',
-      },
-      {
-        data: inventory.map(item => ({
-          'SKU': item.sku,
-          'Produk': item.name,
-          'Stok': item.current_stock,
-          'HPP': item.unit_cost,
-          'Total Nilai': item.current_stock * item.unit_cost,
-        })),
-        sheetName: 'Inventory',
-      },
-      {
-        data: customers.map(c => ({
-          'Nama': c.name,
-          'Telepon': c.phone,
-          'Total Kunjungan': c.total_visits,
-          'Total Belanja': c.total_spending,
-        })),
-        sheetName: 'Customers',
-      },
-      {
-        data: memberships.map(m => ({
-          'Customer': m.customer_name,
-          'Tipe': m.membership_type,
-          'Status': m.status,
-          'Harga': m.price,
-        })),
-        sheetName: 'Memberships',
-      },
-    ];
-
-    const success = exportMultipleSheets(sheets, `complete-report-${new Date().toISOString().split('T')[0]}`);
-    if (success) toast.success('Complete report berhasil di-export');
-    else toast.error('Gagal export report');
+  const handleExportAll = async () => {
+    try {
+      const [transactions, invRes, custRes, memRes] = await Promise.all([
+        fetchTransactionsForExport(),
+        api.get('/inventory'),
+        api.get('/customers'),
+        api.get('/memberships'),
+      ]);
+      const sheets = [
+        {
+          data: transactions.map(t => ({
+            'Invoice': t.invoice_number,
+            'Tanggal': new Date(t.created_at).toLocaleString('id-ID'),
+            'Kasir': t.kasir_name,
+            'Customer': t.customer_name || 'Walk-in',
+            'Total': t.total,
+            'Payment': t.payment_method,
+          })),
+          sheetName: 'Sales',
+        },
+        {
+          data: invRes.data.map(item => ({
+            'SKU': item.sku,
+            'Produk': item.name,
+            'Stok': item.current_stock,
+            'HPP': item.unit_cost,
+            'Total Nilai': item.current_stock * item.unit_cost,
+          })),
+          sheetName: 'Inventory',
+        },
+        {
+          data: custRes.data.map(c => ({
+            'Nama': c.name,
+            'Telepon': c.phone,
+            'Total Kunjungan': c.total_visits,
+            'Total Belanja': c.total_spending,
+          })),
+          sheetName: 'Customers',
+        },
+        {
+          data: memRes.data.map(m => ({
+            'Customer': m.customer_name,
+            'Tipe': m.membership_type,
+            'Status': m.status,
+            'Harga': m.price,
+          })),
+          sheetName: 'Memberships',
+        },
+      ];
+
+      const success = exportMultipleSheets(sheets, `complete-report-${new Date().toISOString().split('T')[0]}`);
+      if (success) toast.success('Complete report berhasil di-export');
+      else toast.error('Gagal export report');
+    } catch (error) {
+      toast.error('Gagal export report');
+    }
   };
 
   // Simple bar chart component
@@ -418,7 +389,7 @@ export const ReportsPage = () => {
                   <Users className="w-5 h-5 text-green-400" />
                 </div>
                 <p className="text-zinc-500 text-sm">Total Customers</p>
-                <p className="text-2xl font-bold text-white">{customers.length}</p>
+                <p className="text-2xl font-bold text-white">{summary?.customer_count || 0}</p>
               </div>
 
               <div className="bg-[#18181b] border border-zinc-800 rounded-xl p-5">
@@ -551,10 +522,10 @@ export const ReportsPage = () => {
                     <p className="text-zinc-500 text-xs mb-1">Inventory Value</p>
                     <p className="text-white font-semibold">Rp {inventoryAnalytics.totalValue.toLocaleString('id-ID')}</p>
                   </div>
-                  {inventoryAnalytics.lowStock.length > 0 && (
+                  {inventoryAnalytics.lowStockCount > 0 && (
                     <div className="bg-red-500/10 border border-red-500/30 rounded-lg p-3">
                       <p className="text-red-400 text-xs mb-1">⚠️ Low Stock Alert</p>
-                      <p className="text-white text-sm">{inventoryAnalytics.lowStock.length} items need restock</p>
+                      <p className="text-white text-sm">{inventoryAnalytics.lowStockCount} items need restock</p>
                     </div>
                   )}
                 </div>
@@ -573,7 +544,7 @@ export const ReportsPage = () => {
                 >
                   <Download className="w-5 h-5 text-[#D4AF37] mb-2" />
                   <h3 className="font-medium text-white text-sm group-hover:text-[#D4AF37]">Sales Report</h3>
-                  <p className="text-xs text-zinc-500">{filteredTransactions.length} transaksi</p>
+                  <p className="text-xs text-zinc-500">{analytics.totalCount} transaksi</p>
                 </button>
 
                 <button
@@ -583,49 +554,27 @@ export const ReportsPage = () => {
                 >
                   <Package className="w-5 h-5 text-[#D4AF37] mb-2" />
                   <h3 className="font-medium text-white text-sm group-hover:text-[#D4AF37]">Inventory</h3>
-                  <p className="text-xs text-zinc-500">{inventory.length} items</p>
+                  <p className="text-xs text-zinc-500">Stok & nilai HPP</p>
                 </button>
 
                 <button
-                  onClick={() => {
-                    const customerData = customers.map(c => ({
-                      'Nama': c.name,
-                      'Telepon': c.phone,
-                      'Email': c.email || '-',
-                      'Total Kunjungan': c.total_visits,
-                      'Total Belanja': c.total_spending,
-                    }));
-                    if (exportToExcel(customerData, `customers-${new Date().toISOString().split('T')[0]}`, 'Customers')) {
-                      toast.success('Customer report exported');
-                    }
-                  }}
+                  onClick={handleExportCustomers}
                   data-testid="export-customers-report"
                   className="bg-zinc-900 border border-zinc-800 rounded-lg p-4 text-left hover:border-[#D4AF37]/50 transition-all group"
                 >
                   <Users className="w-5 h-5 text-[#D4AF37] mb-2" />
                   <h3 className="font-medium text-white text-sm group-hover:text-[#D4AF37]">Customers</h3>
-                  <p className="text-xs text-zinc-500">{customers.length} customers</p>
+                  <p className="text-xs text-zinc-500">{summary?.customer_count || 0} customers</p>
                 </button>
 
                 <button
-                  onClick={() => {
-                    const membershipData = memberships.map(m => ({
-                      'Customer': m.customer_name,
-                      'Tipe': m.membership_type,
-                      'Status': m.status,
-                      'Sisa Hari': m.days_remaining,
-                      'Harga': m.price,
-                    }));
-                    if (exportToExcel(membershipData, `memberships-${new Date().toISOString().split('T')[0]}`, 'Memberships')) {
-                      toast.success('Membership report exported');
-                    }
-                  }}
+                  onClick={handleExportMemberships}
                   data-testid="export-memberships-report"
                   className="bg-zinc-900 border border-zinc-800 rounded-lg p-4 text-left hover:border-[#D4AF37]/50 transition-all group"
                 >
                   <Crown className="w-5 h-5 text-[#D4AF37] mb-2" />
                   <h3 className="font-medium text-white text-sm group-hover:text-[#D4AF37]">Memberships</h3>
-                  <p className="text-xs text-zinc-500">{memberships.length} members</p>
+                  <p className="text-xs text-zinc-500">{membershipAnalytics.active} active members</p>
                 </button>
               </div>
             </div>
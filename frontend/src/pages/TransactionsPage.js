@@ -42,20 +42,51 @@ export const TransactionsPage = () => {
   const [currentPage, setCurrentPage] = useState(1);
   const [itemsPerPage, setItemsPerPage] = useState(25);
 
+  // Server-side paging (older history is loaded on demand)
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+
   const currentUser = getCurrentUser();
 
   useEffect(() => {
     fetchTransactions();
-  }, []);
+  }, [dateFilter, paymentFilter, startDate, endDate]);
 
   useEffect(() => {
     setCurrentPage(1);
   }, [searchTerm, dateFilter, paymentFilter, startDate, endDate]);
 
-  const fetchTransactions = async () => {
+  // Date and payment filters are applied by the backend
+  const buildServerFilters = () => {
+    const params = {};
+    if (paymentFilter !== 'all') {
+      params.payment_method = paymentFilter;
+    }
+    const now = new Date();
+    if (dateFilter === 'today') {
+      params.date_from = new Date(now.getFullYear(), now.getMonth(), now.getDate()).toISOString();
+    } else if (dateFilter === 'week') {
+      params.date_from = new Date(now.getTime() - 7 * 24 * 60 * 60 * 1000).toISOString();
+    } else if (dateFilter === 'month') {
+      params.date_from = new Date(now.getTime() - 30 * 24 * 60 * 60 * 1000).toISOString();
+    } else if (dateFilter === 'custom' && startDate && endDate) {
+      const end = new Date(endDate);
+      end.setHours(23, 59, 59, 999);
+      params.date_from = new Date(startDate).toISOString();
+      params.date_to = end.toISOString();
+    }
+    return params;
+  };
+
+  const fetchTransactions = async (cursor = null) => {
     try {
-      const response = await api.get('/transactions');
-      setTransactions(response.data);
+      const params = { limit: 500, ...buildServerFilters() };
+      if (cursor) {
+        params.before = cursor;
+      }
+      const response = await api.get('/transactions', { params });
+      setTransactions(prev => (cursor ? [...prev, ...response.data] : response.data));
+      setNextCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       toast.error('Gagal memuat data transaksi');
     } finally {
@@ -63,6 +94,13 @@ export const TransactionsPage = () => {
     }
   };
 
+  const handleLoadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    await fetchTransactions(nextCursor);
+    setLoadingMore(false);
+  };
+
   // Filtered transactions
   const filteredTransactions = useMemo(() => {
     let result = [...transactions];
@@ -402,8 +440,19 @@ export const TransactionsPage = () => {
             <div className="flex items-center justify-between px-4 py-3 border-t border-zinc-800">
               <div className="flex items-center gap-4 text-sm text-zinc-500">
                 <span>
-                  {startIndex + 1}-{Math.min(endIndex, filteredTransactions.length)} dari {filteredTransactions.length}
+                  {startIndex + 1}-{Math.min(endIndex, filteredTransactions.length)} dari {filteredTransactions.length}{nextCursor ? '+' : ''}
                 </span>
+                {nextCursor && (
+                  <Button
+                    onClick={handleLoadMore}
+                    disabled={loadingMore}
+                    variant="ghost"
+                    size="sm"
+                    className="h-8 text-zinc-400"
+                  >
+                    {loadingMore ? 'Memuat...' : 'Muat lebih banyak'}
+                  </Button>
+                )}
                 <div className="flex items-center gap-2">
                   <span>Show:</span>
                   <Select value={itemsPerPage.toString()} onValueChange={(v) => { setItemsPerPage(parseInt(v)); setCurrentPage(1); }}>
@@ -33,4 +33,26 @@ api.interceptors.response.use(
   }
 );
 
+const newIdempotencyKey = () =>
+  (window.crypto && window.crypto.randomUUID)
+    ? window.crypto.randomUUID()
+    : `${Date.now()}-${Math.random().toString(16).slice(2)}`;
+
+// POST with an Idempotency-Key; retries on network errors/timeouts are safe
+// because the backend replays the first response for the same key
+export const postIdempotent = async (url, data, retries = 2) => {
+  const headers = { 'Idempotency-Key': newIdempotencyKey() };
+  for (let attempt = 0; ; attempt++) {
+    try {
+      return await api.post(url, data, { headers });
+    } catch (error) {
+      const retryable = !error.response || error.response.status === 409;
+      if (!retryable || attempt >= retries) {
+        throw error;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 500 * (attempt + 1)));
+    }
+  }
+};
+
 export default api;
\ No newline at end of file
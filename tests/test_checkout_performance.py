@@ -0,0 +1,339 @@
+"""
+Test suite for checkout/reporting performance features:
+1. Idempotency-Key replay for POST /transactions
+2. Offline POS batch upload (POST /transactions/batch)
+3. Keyset pagination for GET /transactions
+4. Aggregated reports summary (GET /reports/summary)
+5. Daily sales rollup (GET /reports/daily-sales)
+6. Cached dashboard stats invalidated by writes (GET /dashboard/stats)
+7. Queued WhatsApp receipts (POST /notifications/send-receipt, GET /notifications/{id})
+8. Cached WhatsApp gateway health behind a circuit breaker (GET /whatsapp/status)
+9. Idempotent expiring-membership reminders (POST /notifications/check-expiring)
+10. Promotion broadcasts with queryable progress (POST /promotions/{id}/broadcast, GET /broadcasts/{id})
+11. Stored membership status filter (GET /memberships?status=)
+12. Once-per-day membership usage under concurrent taps (POST /memberships/use)
+"""
+import pytest
+import requests
+import uuid
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_URL = os.environ.get('REACT_APP_BACKEND_URL', '').rstrip('/')
+
+
+@pytest.fixture(scope="module")
+def auth_headers():
+    """Get auth headers"""
+    response = requests.post(f"{BASE_URL}/api/auth/login", json={
+        "username": "admin",
+        "password": "admin123"
+    })
+    token = response.json()["token"]
+    return {"Authorization": f"Bearer {token}"}
+
+
+@pytest.fixture(scope="module")
+def open_shift(auth_headers):
+    """Make sure the admin user has an open shift"""
+    user = requests.get(f"{BASE_URL}/api/auth/me", headers=auth_headers).json()
+    shift_response = requests.get(f"{BASE_URL}/api/shifts/current/{user['id']}", headers=auth_headers)
+    if shift_response.status_code != 200 or shift_response.json() is None:
+        open_response = requests.post(f"{BASE_URL}/api/shifts/open", json={
+            "kasir_id": user['id'],
+            "opening_balance": 500000
+        }, headers=auth_headers)
+        if open_response.status_code != 200:
+            pytest.skip("Cannot open shift for transaction test")
+    return user
+
+
+@pytest.fixture(scope="module")
+def service(auth_headers):
+    services = requests.get(f"{BASE_URL}/api/services", headers=auth_headers).json()
+    if len(services) == 0:
+        pytest.skip("No services available")
+    return services[0]
+
+
+def cash_sale(service):
+    return {
+        "customer_id": None,
+        "items": [{
+            "service_id": service['id'],
+            "service_name": service['name'],
+            "price": service['price'],
+            "quantity": 1
+        }],
+        "payment_method": "cash",
+        "payment_received": service['price'],
+        "notes": "TEST_checkout_performance"
+    }
+
+
+class TestIdempotencyKeys:
+    """Retried writes with the same Idempotency-Key return the original result"""
+
+    def test_transaction_retry_is_replayed(self, auth_headers, open_shift, service):
+        headers = {**auth_headers, "Idempotency-Key": str(uuid.uuid4())}
+        first = requests.post(f"{BASE_URL}/api/transactions", json=cash_sale(service), headers=headers)
+        assert first.status_code == 200
+        retry = requests.post(f"{BASE_URL}/api/transactions", json=cash_sale(service), headers=headers)
+        assert retry.status_code == 200
+        assert retry.json()["id"] == first.json()["id"]
+        assert retry.json()["invoice_number"] == first.json()["invoice_number"]
+
+    def test_key_reused_for_other_body(self, auth_headers, open_shift, service):
+        headers = {**auth_headers, "Idempotency-Key": str(uuid.uuid4())}
+        first = requests.post(f"{BASE_URL}/api/transactions", json=cash_sale(service), headers=headers)
+        assert first.status_code == 200
+        other = {**cash_sale(service), "notes": "TEST_checkout_performance other"}
+        reused = requests.post(f"{BASE_URL}/api/transactions", json=other, headers=headers)
+        assert reused.status_code == 422
+        print(f"✓ Retry replayed {first.json()['invoice_number']}")
+
+    def test_transactions_without_key_are_distinct(self, auth_headers, open_shift, service):
+        first = requests.post(f"{BASE_URL}/api/transactions", json=cash_sale(service), headers=auth_headers)
+        second = requests.post(f"{BASE_URL}/api/transactions", json=cash_sale(service), headers=auth_headers)
+        assert first.status_code == 200 and second.status_code == 200
+        assert first.json()["invoice_number"] != second.json()["invoice_number"]
+
+
+class TestTransactionBatch:
+    """Offline POS sync uploads many sales in one request"""
+
+    def test_batch_reports_each_outcome(self, auth_headers, open_shift, service):
+        client_ref = f"TEST_{uuid.uuid4()}"
+        underpaid = {**cash_sale(service), "payment_received": 0}
+        batch = {"transactions": [
+            {**cash_sale(service), "client_ref": client_ref},
+            {**cash_sale(service), "client_ref": f"TEST_{uuid.uuid4()}"},
+            underpaid
+        ]}
+        response = requests.post(f"{BASE_URL}/api/transactions/batch", json=batch, headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        statuses = [r["status"] for r in data["results"]]
+        if service['price'] > 0:
+            assert statuses == ["created", "created", "error"]
+        assert data["created"] == statuses.count("created")
+        numbers = [r["invoice_number"] for r in data["results"] if r["status"] == "created"]
+        assert len(set(numbers)) == len(numbers)
+        print(f"✓ Batch created {data['created']} sales: {numbers}")
+
+        # Re-uploading the same sale is reported as a duplicate, not stored again
+        retry = requests.post(f"{BASE_URL}/api/transactions/batch", json={"transactions": [batch["transactions"][0]]}, headers=auth_headers)
+        assert retry.status_code == 200
+        assert retry.json()["results"][0]["status"] == "duplicate"
+        assert retry.json()["results"][0]["invoice_number"] == numbers[0]
+
+    def test_repeat_within_batch_points_at_kept_sale(self, auth_headers, open_shift, service):
+        sale = {**cash_sale(service), "client_ref": f"TEST_{uuid.uuid4()}"}
+        response = requests.post(f"{BASE_URL}/api/transactions/batch", json={"transactions": [sale, sale]}, headers=auth_headers)
+        assert response.status_code == 200
+        kept, repeat = response.json()["results"]
+        assert kept["status"] == "created" and repeat["status"] == "duplicate"
+        assert repeat["transaction_id"] == kept["transaction_id"]
+        assert repeat["invoice_number"] == kept["invoice_number"]
+        print(f"✓ Repeated client_ref reported against {kept['invoice_number']}")
+
+
+class TestTransactionPagination:
+    """GET /transactions honours limit and walks history with cursors"""
+
+    def test_limit_is_respected(self, auth_headers):
+        response = requests.get(f"{BASE_URL}/api/transactions?limit=5", headers=auth_headers)
+        assert response.status_code == 200
+        assert len(response.json()) <= 5
+
+    def test_cursor_pages_do_not_overlap(self, auth_headers):
+        first = requests.get(f"{BASE_URL}/api/transactions", params={"limit": 2}, headers=auth_headers)
+        assert first.status_code == 200
+        cursor = first.headers.get("X-Next-Cursor")
+        if not cursor:
+            pytest.skip("Not enough transactions for a second page")
+        second = requests.get(f"{BASE_URL}/api/transactions", params={"limit": 2, "before": cursor}, headers=auth_headers)
+        assert second.status_code == 200
+        first_ids = {t["id"] for t in first.json()}
+        assert not first_ids & {t["id"] for t in second.json()}
+        assert second.json()[0]["created_at"] <= first.json()[-1]["created_at"]
+        print(f"✓ Second page starts at {second.json()[0]['invoice_number']}")
+
+    def test_payment_method_filter(self, auth_headers):
+        response = requests.get(f"{BASE_URL}/api/transactions", params={"payment_method": "cash", "limit": 50}, headers=auth_headers)
+        assert response.status_code == 200
+        assert all(t["payment_method"] == "cash" for t in response.json())
+
+    def test_invalid_cursor_rejected(self, auth_headers):
+        response = requests.get(f"{BASE_URL}/api/transactions", params={"before": "not-a-cursor"}, headers=auth_headers)
+        assert response.status_code == 400
+
+
+class TestReportsSummary:
+    """GET /reports/summary returns the reports page figures in one call"""
+
+    def test_summary_shape(self, auth_headers):
+        response = requests.get(f"{BASE_URL}/api/reports/summary", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        for key in ["total_revenue", "transaction_count", "total_expenses", "net_profit", "payment_breakdown",
+                    "daily_revenue", "top_services", "hourly_distribution", "top_customers", "customer_count"]:
+            assert key in data
+        assert len(data["daily_revenue"]) == 7
+        assert len(data["hourly_distribution"]) == 24
+        assert sum(data["payment_breakdown"].values()) == pytest.approx(data["total_revenue"])
+        print(f"✓ Reports summary: {data['transaction_count']} transactions, Rp {data['total_revenue']}")
+
+    def test_summary_range_is_subset(self, auth_headers):
+        everything = requests.get(f"{BASE_URL}/api/reports/summary", headers=auth_headers).json()
+        recent = requests.get(f"{BASE_URL}/api/reports/summary", params={"from": "2100-01-01T00:00:00Z"}, headers=auth_headers).json()
+        assert recent["transaction_count"] == 0
+        assert everything["transaction_count"] >= recent["transaction_count"]
+
+
+class TestDailySalesRollup:
+    """GET /reports/daily-sales sums the per-day rollup"""
+
+    def test_rollup_shape(self, auth_headers):
+        response = requests.get(f"{BASE_URL}/api/reports/daily-sales",
+                                params={"from": "2000-01-01", "to": "2100-12-31"}, headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        for key in ["revenue", "count", "commission", "payments", "services", "kasir", "hours", "days"]:
+            assert key in data
+        assert sum(day["revenue"] for day in data["days"]) == pytest.approx(data["revenue"])
+        print(f"✓ Rollup covers {len(data['days'])} outlet-days, Rp {data['revenue']}")
+
+    def test_rejects_bad_dates(self, auth_headers):
+        response = requests.get(f"{BASE_URL}/api/reports/daily-sales",
+                                params={"from": "yesterday", "to": "2100-12-31"}, headers=auth_headers)
+        assert response.status_code == 422
+
+
+class TestDashboardStatsCache:
+    """Cached dashboard stats still reflect a sale made right after a read"""
+
+    def test_sale_invalidates_cached_stats(self, auth_headers, open_shift, service):
+        before = requests.get(f"{BASE_URL}/api/dashboard/stats", headers=auth_headers)
+        assert before.status_code == 200
+        sale = requests.post(f"{BASE_URL}/api/transactions", json=cash_sale(service), headers=auth_headers)
+        assert sale.status_code == 200
+        after = requests.get(f"{BASE_URL}/api/dashboard/stats", headers=auth_headers).json()
+        assert after["today_transactions"] == before.json()["today_transactions"] + 1
+        print(f"✓ Dashboard shows {after['today_transactions']} transactions today")
+
+
+class TestNotificationQueue:
+    """Receipts are queued instead of sent inline, and their status can be looked up"""
+
+    def test_receipt_is_queued_once(self, auth_headers, open_shift, service):
+        sale = requests.post(f"{BASE_URL}/api/transactions", json=cash_sale(service), headers=auth_headers)
+        assert sale.status_code == 200
+        request = {"transaction_id": sale.json()["id"], "phone": "080000000000"}
+        first = requests.post(f"{BASE_URL}/api/notifications/send-receipt", json=request, headers=auth_headers)
+        assert first.status_code == 200
+        again = requests.post(f"{BASE_URL}/api/notifications/send-receipt", json=request, headers=auth_headers)
+        assert again.json()["notification_id"] == first.json()["notification_id"]
+
+        status = requests.get(f"{BASE_URL}/api/notifications/{first.json()['notification_id']}", headers=auth_headers)
+        assert status.status_code == 200
+        assert status.json()["status"] in ["queued", "sending", "sent", "dead"]
+        print(f"✓ Receipt notification is {status.json()['status']}")
+
+    def test_receipt_text(self, auth_headers, open_shift, service):
+        sale = requests.post(f"{BASE_URL}/api/transactions", json=cash_sale(service), headers=auth_headers).json()
+        queued = requests.post(f"{BASE_URL}/api/notifications/send-receipt",
+                               json={"transaction_id": sale["id"], "phone": "080000000000"}, headers=auth_headers).json()
+        notification = requests.get(f"{BASE_URL}/api/notifications/{queued['notification_id']}", headers=auth_headers).json()
+        assert sale["invoice_number"] in notification["message"]
+        assert service["name"] in notification["message"]
+
+    def test_unknown_notification(self, auth_headers):
+        response = requests.get(f"{BASE_URL}/api/notifications/{uuid.uuid4()}", headers=auth_headers)
+        assert response.status_code == 404
+
+
+class TestWhatsAppStatus:
+    """Gateway status is served from the background health check"""
+
+    def test_status_is_cached(self, auth_headers):
+        response = requests.get(f"{BASE_URL}/api/whatsapp/status", headers=auth_headers)
+        assert response.status_code == 200
+        data = response.json()
+        assert data["circuit"]["state"] in ["closed", "open", "half_open"]
+        assert "checked_seconds_ago" in data
+        assert response.elapsed.total_seconds() < 1
+        print(f"✓ WhatsApp status {data.get('status')} (circuit {data['circuit']['state']})")
+
+
+class TestExpiryReminders:
+    """Reminder runs are idempotent"""
+
+    def test_second_run_queues_nothing(self, auth_headers):
+        first = requests.post(f"{BASE_URL}/api/notifications/check-expiring", headers=auth_headers)
+        assert first.status_code == 200
+        again = requests.post(f"{BASE_URL}/api/notifications/check-expiring", headers=auth_headers)
+        assert again.status_code == 200
+        assert again.json()["queued"] == 0
+        print(f"✓ {first.json()['queued']} reminders queued for {first.json()['target_date']}, none on re-run")
+
+
+class TestPromotionBroadcast:
+    """Broadcasts return immediately and report progress"""
+
+    def test_broadcast_progress(self, auth_headers):
+        promotions = requests.get(f"{BASE_URL}/api/promotions", headers=auth_headers).json()
+        if len(promotions) == 0:
+            pytest.skip("No promotions available")
+        response = requests.post(f"{BASE_URL}/api/promotions/{promotions[0]['id']}/broadcast",
+                                 json={"segment": "lapsed", "days_inactive": 60}, headers=auth_headers)
+        assert response.status_code == 200
+        broadcast = response.json()
+        assert broadcast["status"] == "preparing"
+
+        progress = requests.get(f"{BASE_URL}/api/broadcasts/{broadcast['id']}", headers=auth_headers)
+        assert progress.status_code == 200
+        assert "delivery" in progress.json()
+        print(f"✓ Broadcast {progress.json()['status']}: {progress.json()['delivery']}")
+
+    def test_rejects_unknown_placeholder(self, auth_headers):
+        promotions = requests.get(f"{BASE_URL}/api/promotions", headers=auth_headers).json()
+        if len(promotions) == 0:
+            pytest.skip("No promotions available")
+        response = requests.post(f"{BASE_URL}/api/promotions/{promotions[0]['id']}/broadcast",
+                                 json={"template": "Halo $nama"}, headers=auth_headers)
+        assert response.status_code == 400
+
+
+class TestMembershipStatus:
+    """Membership status is stored and filterable"""
+
+    def test_filter_by_status(self, auth_headers):
+        for status in ["active", "expiring_soon", "expired"]:
+            response = requests.get(f"{BASE_URL}/api/memberships", params={"status": status}, headers=auth_headers)
+            assert response.status_code == 200
+            assert all(m["status"] == status for m in response.json())
+            print(f"✓ {len(response.json())} {status} memberships")
+
+
+class TestMembershipUsageOncePerDay:
+    """Concurrent taps for the same membership record at most one usage per day"""
+
+    def test_concurrent_taps(self, auth_headers, service):
+        memberships = requests.get(f"{BASE_URL}/api/memberships", params={"status": "active"}, headers=auth_headers).json()
+        members = [m for m in memberships if m["membership_type"] != "regular"]
+        if not members:
+            pytest.skip("No active All You Can Wash membership")
+        customer = requests.get(f"{BASE_URL}/api/customers/{members[0]['customer_id']}", headers=auth_headers)
+        if customer.status_code != 200:
+            pytest.skip("Membership customer not found")
+
+        usage = {"phone": customer.json()["phone"], "service_id": service["id"]}
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            responses = list(pool.map(
+                lambda _: requests.post(f"{BASE_URL}/api/memberships/use", json=usage, headers=auth_headers), range(4)
+            ))
+        codes = [r.status_code for r in responses]
+        assert codes.count(200) <= 1
+        assert all(code in [200, 400] for code in codes)
+        print(f"✓ Concurrent taps: {codes}")
@@ -0,0 +1,88 @@
+"""
+Notification queue ordering against a local mongod (MONGO_URL):
+1. A receipt queued after a broadcast message is claimed first
+2. Messages queued before priorities existed are backfilled
+3. An open WhatsApp circuit defers messages without using up attempts
+"""
+import asyncio
+import os
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+motor_asyncio = pytest.importorskip("motor.motor_asyncio")
+pymongo = pytest.importorskip("pymongo")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+from notification_queue import NotificationQueue, PRIORITIES, QUEUED  # noqa: E402
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+
+
+async def no_send(phone, message):
+    return {"success": True}
+
+
+async def circuit_open(phone, message):
+    return {"success": False, "error": "circuit open", "circuit_open": True, "retry_after": 30}
+
+
+def run_with_queue(test, sender=no_send):
+    """Run `test(queue)` against a throwaway database"""
+    async def main():
+        client = motor_asyncio.AsyncIOMotorClient(MONGO_URL, serverSelectionTimeoutMS=2000, tz_aware=True)
+        try:
+            await client.admin.command("ping")
+        except pymongo.errors.PyMongoError:
+            pytest.skip(f"No mongod reachable at {MONGO_URL}")
+        name = f"test_notifications_{uuid.uuid4().hex[:8]}"
+        try:
+            return await test(NotificationQueue(client[name], sender, rate_per_minute=0))
+        finally:
+            await client.drop_database(name)
+            client.close()
+    return asyncio.run(main())
+
+
+class TestClaimOrder:
+    """Receipts are not stuck behind a large broadcast"""
+
+    def test_receipt_claimed_before_earlier_broadcast(self):
+        async def test(queue):
+            broadcast = queue.build("promotion", "081100000001", "Promo")
+            broadcast['available_at'] -= timedelta(minutes=5)
+            await queue.enqueue_many([broadcast])
+            receipt = await queue.enqueue("receipt", "081100000002", "Struk")
+            claimed = await queue._claim()
+            assert claimed['id'] == receipt['id']
+            assert (await queue._claim())['id'] == broadcast['id']
+        run_with_queue(test)
+        print("✓ Receipt claimed ahead of an earlier broadcast")
+
+    def test_legacy_messages_get_priority(self):
+        async def test(queue):
+            legacy = queue.build("promotion", "081100000003", "Promo")
+            legacy.pop('priority')
+            await queue.db.notifications.insert_one(legacy)
+            assert await queue.backfill_priorities() == 1
+            stored = await queue.get(legacy['id'])
+            assert stored['priority'] == PRIORITIES["promotion"]
+        run_with_queue(test)
+        print("✓ Legacy queued message backfilled with its priority")
+
+
+class TestCircuitOpen:
+    """A gateway outage does not dead-letter queued receipts"""
+
+    def test_open_circuit_defers_without_attempt(self):
+        async def test(queue):
+            first = await queue.enqueue("receipt", "081100000004", "Struk 1")
+            second = await queue.enqueue("receipt", "081100000005", "Struk 2")
+            assert await queue.drain() == 1
+            for message in (first, second):
+                stored = await queue.get(message['id'])
+                assert stored['status'] == QUEUED and stored['attempts'] == 0
+        run_with_queue(test, sender=circuit_open)
+        print("✓ Open circuit pauses the queue without counting attempts")
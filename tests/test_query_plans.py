@@ -0,0 +1,235 @@
+"""
+Query-plan regression tests for the backend's hot queries.
+
+Runs each query against a local mongod (MONGO_URL / DB_NAME, seeded with
+backend/seed_data.py) and checks with explain() that it is answered from an
+index with a bounded number of documents examined:
+1. Open shift lookup by kasir
+2. Invoice number allocation (counter + legacy invoice scan)
+3. Customer by phone
+4. Membership usage today (day key and pre-backfill fallback)
+5. Transactions list (first page, filters, keyset cursor)
+6. Promotion by code
+7. Dashboard facets (today's sales, membership counts)
+8. Lapsed-customer broadcast segment
+"""
+import os
+import sys
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+pymongo = pytest.importorskip("pymongo")
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'backend'))
+from indexes import INDEXES  # noqa: E402
+from membership_usage import legacy_usage_filter, usage_day  # noqa: E402
+
+MONGO_URL = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
+DB_NAME = os.environ.get('DB_NAME', 'carwash_db')
+OUTLET_TIMEZONE = os.environ.get('OUTLET_TIMEZONE', 'Asia/Jakarta')
+
+INDEX_STAGES = {"IXSCAN", "IDHACK", "EXPRESS_IXSCAN", "EXPRESS_CLUSTERED_IXSCAN", "COUNT_SCAN", "DISTINCT_SCAN"}
+
+
+@pytest.fixture(scope="module")
+def db():
+    client = pymongo.MongoClient(MONGO_URL, serverSelectionTimeoutMS=2000, tz_aware=True)
+    try:
+        client.admin.command("ping")
+    except pymongo.errors.PyMongoError:
+        pytest.skip(f"No mongod reachable at {MONGO_URL}")
+    database = client[DB_NAME]
+    for collection, models in INDEXES.items():
+        try:
+            database[collection].create_indexes(models)
+        except pymongo.errors.OperationFailure:
+            # Same keys under another name; the plan assertions still apply
+            pass
+    yield database
+    client.close()
+
+
+@pytest.fixture(scope="module")
+def sample(db):
+    """Real ids from the seeded data, with placeholders when a collection is empty"""
+    kasir = db.users.find_one({"role": "kasir"}) or {}
+    customer = db.customers.find_one({"phone": {"$exists": True}}) or {}
+    membership = db.memberships.find_one() or {}
+    promo = db.promotions.find_one() or {}
+    return {
+        "kasir_id": kasir.get('id', 'missing-kasir'),
+        "phone": customer.get('phone', '080000000000'),
+        "customer_id": customer.get('id', 'missing-customer'),
+        "membership_id": membership.get('id', 'missing-membership'),
+        "promo_code": promo.get('code', 'MISSING'),
+    }
+
+
+def collect(node, key):
+    """All values of `key` anywhere in an explain document"""
+    found = []
+    if isinstance(node, dict):
+        for k, v in node.items():
+            if k == key:
+                found.append(v)
+            found.extend(collect(v, key))
+    elif isinstance(node, list):
+        for item in node:
+            found.extend(collect(item, key))
+    return found
+
+
+def explain(db, command: dict) -> dict:
+    return db.command("explain", command, verbosity="executionStats")
+
+
+def assert_indexed(plan: dict, max_docs: int):
+    stages = set(collect(plan, "stage"))
+    assert "COLLSCAN" not in stages, f"Collection scan in plan: {sorted(stages)}"
+    assert stages & INDEX_STAGES, f"No index stage in plan: {sorted(stages)}"
+    docs_examined = max(collect(plan, "totalDocsExamined") or [0])
+    assert docs_examined <= max_docs, f"Examined {docs_examined} documents (limit {max_docs})"
+    return stages, docs_examined
+
+
+class TestShiftAndCheckoutQueries:
+    """Lookups done on every checkout"""
+
+    def test_open_shift_by_kasir(self, db, sample):
+        plan = explain(db, {"find": "shifts", "filter": {"kasir_id": sample['kasir_id'], "status": "open"}, "limit": 1})
+        stages, docs = assert_indexed(plan, max_docs=1)
+        print(f"✓ Open shift lookup: {sorted(stages)}, {docs} docs")
+
+    def test_invoice_counter(self, db):
+        key = f"invoice-{datetime.now(timezone.utc).strftime('%Y%m%d')}"
+        plan = explain(db, {
+            "findAndModify": "counters",
+            "query": {"_id": key},
+            "update": {"$inc": {"seq": 1}},
+            "upsert": True,
+            "new": True
+        })
+        assert_indexed(plan, max_docs=1)
+
+    def test_legacy_invoice_scan(self, db):
+        prefix = datetime.now(timezone.utc).strftime('%Y%m%d')
+        plan = explain(db, {
+            "find": "transactions",
+            "filter": {"invoice_number": {"$regex": f"^INV-{prefix}-"}},
+            "sort": {"invoice_number": -1},
+            "limit": 1
+        })
+        assert_indexed(plan, max_docs=1)
+
+
+class TestCustomerAndMembershipQueries:
+    """Customer and membership lookups used by POS and the public check"""
+
+    def test_customer_by_phone(self, db, sample):
+        plan = explain(db, {"find": "customers", "filter": {"phone": sample['phone']}, "limit": 1})
+        assert_indexed(plan, max_docs=1)
+
+    def test_memberships_by_customer(self, db, sample):
+        plan = explain(db, {"find": "memberships", "filter": {"customer_id": sample['customer_id']}})
+        assert_indexed(plan, max_docs=db.memberships.count_documents({"customer_id": sample['customer_id']}))
+
+    def test_membership_usage_today(self, db, sample):
+        today = usage_day(datetime.now(timezone.utc), OUTLET_TIMEZONE)
+        plan = explain(db, {
+            "find": "membership_usage",
+            "filter": {"membership_id": sample['membership_id'], "day": today},
+            "limit": 1
+        })
+        assert_indexed(plan, max_docs=1)
+
+    def test_legacy_membership_usage_today(self, db, sample):
+        query = legacy_usage_filter(sample['membership_id'], datetime.now(timezone.utc), OUTLET_TIMEZONE)
+        plan = explain(db, {"find": "membership_usage", "filter": query, "limit": 1})
+        assert_indexed(plan, max_docs=db.membership_usage.count_documents(
+            {"membership_id": sample['membership_id'], "used_at": query['used_at']}
+        ))
+
+    def test_promo_by_code(self, db, sample):
+        plan = explain(db, {"find": "promotions", "filter": {"code": sample['promo_code'], "is_active": True}, "limit": 1})
+        assert_indexed(plan, max_docs=1)
+
+
+class TestTransactionListQueries:
+    """GET /transactions pages and filters"""
+
+    SORT = {"created_at": -1, "id": -1}
+
+    def test_first_page(self, db):
+        plan = explain(db, {"find": "transactions", "filter": {}, "sort": self.SORT, "limit": 101})
+        assert_indexed(plan, max_docs=101)
+
+    def test_kasir_filter(self, db, sample):
+        plan = explain(db, {"find": "transactions", "filter": {"kasir_id": sample['kasir_id']}, "sort": self.SORT, "limit": 101})
+        assert_indexed(plan, max_docs=101)
+
+    def test_date_range(self, db):
+        since = datetime.now(timezone.utc) - timedelta(days=7)
+        plan = explain(db, {"find": "transactions", "filter": {"created_at": {"$gte": since}}, "sort": self.SORT, "limit": 101})
+        assert_indexed(plan, max_docs=101)
+
+    def test_keyset_cursor(self, db):
+        newest = db.transactions.find_one(sort=[("created_at", -1), ("id", -1)])
+        if not newest:
+            pytest.skip("No transactions seeded")
+        query = {"$or": [
+            {"created_at": {"$lt": newest['created_at']}},
+            {"created_at": newest['created_at'], "id": {"$lt": newest['id']}}
+        ]}
+        plan = explain(db, {"find": "transactions", "filter": query, "sort": self.SORT, "limit": 101})
+        # The two $or branches may each be scanned up to the limit
+        stages, docs = assert_indexed(plan, max_docs=2 * 101)
+        print(f"✓ Keyset page: {sorted(stages)}, {docs} docs")
+
+
+class TestDashboardQueries:
+    """Initial $match of the dashboard $facet aggregations"""
+
+    def test_today_sales_facet(self, db):
+        today_start = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        plan = explain(db, {
+            "aggregate": "transactions",
+            "pipeline": [
+                {"$match": {"created_at": {"$gte": today_start}}},
+                {"$facet": {"totals": [{"$group": {"_id": None, "revenue": {"$sum": "$total"}}}]}}
+            ],
+            "cursor": {}
+        })
+        assert_indexed(plan, max_docs=db.transactions.count_documents({"created_at": {"$gte": today_start}}))
+
+    def test_membership_counts_facet(self, db):
+        current = {"status": {"$in": ["active", "expiring_soon"]}}
+        plan = explain(db, {
+            "aggregate": "memberships",
+            "pipeline": [
+                {"$match": current},
+                {"$facet": {"active": [{"$count": "n"}]}}
+            ],
+            "cursor": {}
+        })
+        assert_indexed(plan, max_docs=db.memberships.count_documents(current))
+
+    def test_status_refresh_range(self, db):
+        """Scheduler updates select memberships by end_date range"""
+        now = datetime.now(timezone.utc)
+        query = {"end_date": {"$gte": now, "$lt": now + timedelta(days=8)}, "status": {"$ne": "expiring_soon"}}
+        plan = explain(db, {"find": "memberships", "filter": query})
+        assert_indexed(plan, max_docs=db.memberships.count_documents({"end_date": query["end_date"]}))
+
+
+class TestBroadcastQueries:
+    """Recipient selection for promotion broadcasts"""
+
+    def test_lapsed_segment(self, db):
+        cutoff = datetime.now(timezone.utc) - timedelta(days=60)
+        query = {"$or": [
+            {"last_visit_at": {"$lt": cutoff}},
+            {"last_visit_at": None, "join_date": {"$lt": cutoff}},
+        ]}
+        plan = explain(db, {"find": "customers", "filter": query})
+        assert_indexed(plan, max_docs=db.customers.count_documents(query))